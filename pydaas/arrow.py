@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 16:05
+# @Last Modified by: wqshen
+
+import os
+import numpy as np
+import pandas as pd
+from logzero import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as pds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pds = pq = None
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _require():
+    if pa is None:
+        raise ImportError("arrow output requires pyarrow, install it by `pip install pyarrow`")
+
+
+def column_type(name: str):
+    """arrow type of a MUSIC element by its name
+
+    Elements with `_C` suffix (character, e.g. Station_Id_C), names and ids are strings, elements ending
+    with `time` (Datetime, Validtime ...) are timestamps, other elements are float64.
+    """
+    _require()
+    lower = name.lower()
+    if name.endswith('_C') or 'name' in lower or lower.endswith('_id') or 'code' in lower:
+        return pa.string()
+    if lower.endswith('time'):
+        return pa.timestamp('s')
+    return pa.float64()
+
+
+def _cast(name: str, column, type_, strict: bool = False):
+    """cast a string column into type, empty strings are null, fall back to string if not castable
+
+    With `strict`, the type is fixed by the schema of a stream, values not castable are null instead.
+    """
+    if type_ == pa.string():
+        return column
+    column = pc.if_else(pc.equal(column, ''), pa.scalar(None, pa.string()), column)
+    try:
+        if pa.types.is_timestamp(type_):
+            return pc.strptime(column, format=TIME_FORMAT, unit=type_.unit)
+        return pc.cast(column, type_)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        if not strict:
+            logger.debug(f"element {name} is not {type_}, keep string")
+            return column
+    if pa.types.is_timestamp(type_):
+        casted = pc.strptime(column, format=TIME_FORMAT, unit=type_.unit, error_is_null=True)
+    else:
+        casted = pa.array(pd.to_numeric(column.to_pandas(), errors='coerce'), type=pa.float64()).cast(type_)
+    logger.warning(f"{pc.sum(pc.is_null(casted)).as_py() - column.null_count} values of element {name} are "
+                   f"not {type_}, set to null")
+    return casted
+
+
+def array2d_to_table(ret, schema=None, index_col: str = None):
+    """decode RetArray2D into a typed arrow table
+
+    Parameters
+    ----------
+    ret: RetArray2D
+        result of `callAPI_to_array2D`
+    schema: pa.Schema
+        schema of the table, default typed by `column_type`. Pass the schema of the first table when
+        decoding a stream of requests so that all tables share one schema
+    index_col: str
+        comma separated elements placed as leading columns, arrow tables have no index
+
+    Returns
+    -------
+    pa.Table: one column for each element
+    """
+    _require()
+    names = list(ret.elementNames)
+    values = np.asarray(ret.data, dtype=object).reshape(-1, len(names)) if len(ret.data) else \
+        np.empty((0, len(names)), dtype=object)
+    # elements requested twice (in varname and index_col) are kept once
+    keep = {}
+    for k, name in enumerate(names):
+        keep.setdefault(name, k)
+    if index_col is not None:
+        keep = {name: keep[name] for name in [*index_col.split(','), *keep] if name in keep}
+    columns = [pa.array(values[:, k], type=pa.string()) for k in keep.values()]
+    if schema is not None:
+        return conform(pa.table(columns, names=list(keep)), schema)
+    return pa.table([_cast(name, c, column_type(name)) for name, c in zip(keep, columns)], names=list(keep))
+
+
+def frame_to_table(data: pd.DataFrame, schema=None):
+    """typed arrow table of a DataFrame of station observations (strings, as returned by `sel`)
+
+    Index levels become leading columns, string columns are typed by `column_type` like `array2d_to_table`.
+    """
+    _require()
+    if not isinstance(data.index, pd.RangeIndex) or data.index.name is not None:
+        data = data.reset_index()
+    columns = []
+    for name in data.columns:
+        column = data[name]
+        if column.dtype == object or pd.api.types.is_string_dtype(column.dtype):
+            column = pa.array(column.astype(object), type=pa.string(), from_pandas=True)
+            columns.append(_cast(str(name), column, column_type(str(name))))
+        else:
+            columns.append(pa.array(column, from_pandas=True))
+    table = pa.table(columns, names=[str(n) for n in data.columns])
+    return table if schema is None else conform(table, schema)
+
+
+def conform(table, schema):
+    """cast table into schema of a stream, missing columns are null, columns not in schema raise ValueError
+
+    Columns of strings (decoded or fallen back from `column_type`) are cast by `_cast`, so that types
+    inferred from values of each request do not change the schema of the stream.
+    """
+    _require()
+    extra = [n for n in table.column_names if n not in schema.names]
+    if extra:
+        raise ValueError(f"columns {extra} are not in schema {schema.names} of the stream")
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(table.num_rows, field.type))
+            continue
+        column = table[field.name].combine_chunks()
+        if column.type == field.type:
+            columns.append(column)
+        elif pa.types.is_string(column.type):
+            columns.append(_cast(field.name, column, field.type, strict=True))
+        else:
+            columns.append(pc.cast(column, field.type))
+    return pa.table(columns, schema=schema)
+
+
+def unify(schemas: list):
+    """schema of all columns of tables in order of appearance, columns of conflicting types are strings"""
+    _require()
+    fields = {}
+    for schema in schemas:
+        for field in schema:
+            if field.name not in fields:
+                fields[field.name] = field.type
+            elif fields[field.name] != field.type:
+                fields[field.name] = pa.string()
+    return pa.schema(list(fields.items()))
+
+
+def is_table(data) -> bool:
+    return pa is not None and isinstance(data, pa.Table)
+
+
+def concat_tables(tables: list):
+    """concatenate tables of requests, without copying if they share one schema
+
+    Tables of different elements are aligned to the union of their columns, missing columns are null.
+    """
+    _require()
+    tables = [t for t in tables if t is not None]
+    schema = unify([t.schema for t in tables])
+    return pa.concat_tables([t if t.schema == schema else conform(t, schema) for t in tables])
+
+
+class ArrowStreamWriter(object):
+    """Write arrow tables of requests into parquet or arrow (IPC) output one by one as they arrive
+
+    Without partition, tables are appended as row groups (parquet) or record batches (arrow) of a single
+    file. With partition, tables are written into a hive partitioned directory, `date=YYYY-MM-DD` by the
+    date of Datetime or `station=<Station_Id_C>`, each request adds its own files under the partitions.
+    The schema of the stream is fixed by the first table, columns missing in later tables are null.
+    """
+    partitions = ('date', 'station')
+
+    def __init__(self, path: str, format: str = 'parquet', partition: str = None, compression: str = 'zstd'):
+        """ArrowStreamWriter
+
+        Parameters
+        ----------
+        path: str
+            output file, or root directory for partitioned output
+        format: str
+            parquet or arrow
+        partition: str
+            None, date or station
+        compression: str
+            parquet compression codec
+        """
+        _require()
+        if partition is not None and partition not in self.partitions:
+            raise NotImplementedError(f"partition {partition}, only support {self.partitions}")
+        self.path = path
+        self.format = format
+        self.partition = partition
+        self.compression = compression
+        self.schema = None
+        self.rows = 0
+        self.batches = 0
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        logger.debug(f"write {self.rows} rows in {self.batches} batches into {self.path}")
+
+    def _partition_column(self, table):
+        if self.partition == 'date':
+            times = [n for n in table.column_names if pa.types.is_timestamp(table.schema.field(n).type)]
+            if not times:
+                raise ValueError("partition by date requires a Datetime element")
+            return pc.strftime(table[times[0]], format='%Y-%m-%d')
+        stations = [n for n in table.column_names if n.startswith('Station_Id')]
+        if not stations:
+            raise ValueError("partition by station requires a Station_Id_C element")
+        return pc.cast(table[stations[0]], pa.string())
+
+    def write(self, table):
+        """append an arrow table (or DataFrame of station observations, typed by `frame_to_table`) of one request"""
+        if not isinstance(table, pa.Table):
+            table = frame_to_table(table)
+        if self.schema is None:
+            self.schema = table.schema
+        elif table.schema != self.schema:
+            table = conform(table, self.schema)
+
+        if self.partition is not None:
+            table = table.append_column(self.partition, self._partition_column(table))
+            extension = 'parquet' if self.format == 'parquet' else 'arrow'
+            pds.write_dataset(table, self.path, format='parquet' if self.format == 'parquet' else 'ipc',
+                              partitioning=[self.partition], partitioning_flavor='hive',
+                              basename_template=f"part-{self.batches:06d}-{{i}}.{extension}",
+                              existing_data_behavior='overwrite_or_ignore')
+        else:
+            if self._writer is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                if self.format == 'parquet':
+                    self._writer = pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+                else:
+                    self._writer = pa.ipc.new_file(self.path, self.schema)
+            self._writer.write_table(table)
+        self.rows += table.num_rows
+        self.batches += 1
+
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 13:40
+# @Last Modified by: wqshen
+
+import numpy as np
+import xarray as xr
+from typing import Union
+from functools import partial
+from itertools import product
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from xarray.core import indexing
+from xarray.backends import BackendArray, BackendEntrypoint
+from pydaas.cache import TileCache
+from pydaas.client import DaasClient
+
+
+def level_type(level: int, default: int = None) -> int:
+    """levelType of a level, `default` if it's given, otherwise 1 (surface) for level 0 and 100 (pressure)"""
+    if default is not None:
+        return default
+    return 1 if level == 0 else 100
+
+
+class DaasBackendArray(BackendArray):
+    """Virtual (inittime, fh, level, lat, lon) array of a nafp variable
+
+    Indexing is translated into the smallest `getNafpEle...GridInRect...` requests, one request for each
+    selected (inittime, fh, level) covering only the selected latitude and longitude range.
+    """
+
+    def __init__(self, client: DaasClient, datasource: str, varname: str, inittime: list, fh: list,
+                 level: list, lat: np.ndarray, lon: np.ndarray, dtype: np.dtype, level_type: int = None):
+        self.client = client
+        self.datasource = datasource
+        self.varname = varname
+        self.inittime, self.fh, self.level = inittime, fh, level
+        self.lat, self.lon = lat, lon
+        self.level_type = level_type
+        self.shape = (len(inittime), len(fh), len(level), lat.size, lon.size)
+        self.dtype = np.dtype(dtype)
+
+    def __getitem__(self, key: indexing.ExplicitIndexer) -> np.ndarray:
+        return indexing.explicit_indexing_adapter(key, self.shape, indexing.IndexingSupport.BASIC,
+                                                  self._raw_indexing_method)
+
+    def _fetch(self, inittime: datetime, fh: int, level: int, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """request rect covering lat/lon of one field, and pick the exact grid points"""
+        build = partial(self.client._nafp_interface, self.datasource, inittime, fh, self.varname, level,
+                        level_type(level, self.level_type))
+        rect = self.client._get_grid(build, slice(lat.min(), lat.max()), slice(lon.min(), lon.max()))
+        rect = TileCache.normalize(rect)
+        return rect.sel(lat=lat, lon=lon, method='nearest').values
+
+    def _raw_indexing_method(self, key: tuple) -> np.ndarray:
+        indexes = [np.arange(n)[k] for n, k in zip(self.shape, key)]
+        squeeze = tuple(i for i, k in enumerate(key) if not isinstance(k, slice))
+        indexes = [np.atleast_1d(i) for i in indexes]
+        out = np.full([i.size for i in indexes], np.nan, dtype=self.dtype)
+        if out.size == 0:
+            return out.squeeze(axis=squeeze)
+
+        lat, lon = self.lat[indexes[3]], self.lon[indexes[4]]
+        slots = list(product(*[enumerate(i) for i in indexes[:3]]))
+
+        def fetch(slot):
+            (a, i), (b, j), (c, k) = slot
+            out[a, b, c] = self._fetch(self.inittime[i], self.fh[j], self.level[k], lat, lon)
+
+        with ThreadPoolExecutor(max_workers=self.client.n_jobs) as executor:
+            list(executor.map(fetch, slots))
+        return out.squeeze(axis=squeeze)
+
+
+class DaasBackendEntrypoint(BackendEntrypoint):
+    """open MUSIC nafp datasource as a virtual dataset
+
+    Examples
+    --------
+    >>> ds = xr.open_dataset('ECMWF_P', engine='pydaas', inittime=datetime(2023, 2, 19, 12),
+    ...                      fh=list(range(0, 73, 3)), varname=['RHU', 'TEM'], level=[500, 850])
+    >>> ds.sel(lat=slice(20, 40), lon=slice(110, 130)).isel(fh=0).load()
+    """
+    description = "Open MUSIC nafp datasource of Daas as a lazily fetched dataset"
+    url = "https://github.com/zjobsdev/PyDaas"
+    open_dataset_parameters = ('filename_or_obj', 'drop_variables', 'inittime', 'fh', 'varname', 'level',
+                               'levelType', 'lat', 'lon', 'client')
+
+    def open_dataset(self, filename_or_obj: str, *, drop_variables=None,
+                     inittime: Union[datetime, list] = None, fh: Union[int, list] = 0,
+                     varname: Union[str, list] = None, level: Union[int, list] = 0, levelType: int = None,
+                     lat: slice = None, lon: slice = None, client: DaasClient = None) -> xr.Dataset:
+        """open dataset
+
+        Parameters
+        ----------
+        filename_or_obj: str
+            data source name from Daas, also alias from config/alias.yaml
+        inittime: datetime, list
+            model initial datetimes
+        fh: int, list
+            forecast hours
+        varname: str, list
+            variable names
+        level: int, list
+            forecast levels
+        levelType: int
+            level type of all levels, default 1 for level 0 otherwise 100 of each level
+        lat, lon: slice
+            domain of the dataset, default the full grid of datasource
+        client: DaasClient
+            client used to request data, default DaasClient()
+
+        Returns
+        -------
+        xr.Dataset: dataset with (inittime, fh, level, lat, lon) dimensions
+        """
+        client = DaasClient() if client is None else client
+        datasource = client.alias.get(filename_or_obj, filename_or_obj)
+        inittime = [inittime] if isinstance(inittime, datetime) else list(inittime)
+        fh = [fh] if isinstance(fh, int) else list(fh)
+        level = [level] if isinstance(level, int) else list(level)
+        varname = [varname] if isinstance(varname, str) else list(varname)
+        varname = [v for v in varname if v not in (drop_variables or [])]
+
+        build = partial(client._nafp_interface, datasource, inittime[0], fh[0], varname[0], level[0],
+                        level_type(level[0], levelType))
+        probe = TileCache.normalize(client._get_grid(build, lat, lon))
+        lats, lons = probe.lat.values, probe.lon.values
+
+        variables = {}
+        for v in varname:
+            array = DaasBackendArray(client, datasource, v, inittime, fh, level, lats, lons, probe.dtype,
+                                     levelType)
+            variables[v] = xr.Variable(('inittime', 'fh', 'level', 'lat', 'lon'),
+                                       indexing.LazilyIndexedArray(array))
+        coords = {'inittime': inittime, 'fh': np.asarray(fh, dtype='i4'), 'level': level, 'lat': lats, 'lon': lons}
+        return xr.Dataset(variables, coords=coords, attrs={'datasource': datasource})
+
+    def guess_can_open(self, filename_or_obj) -> bool:
+        return False
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 18:30
+# @Last Modified by: wqshen
+
+import os
+import fnmatch
+import numpy as np
+import xarray as xr
+from typing import Union, Callable
+from logzero import logger
+
+
+class BlockDescriptor(object):
+    """Layout of a binary data block: dtype, shape and byte order of the array after an optional header
+
+    Parameters
+    ----------
+    dtype: str, np.dtype
+        element type, e.g. 'u1', 'i2', 'f4'
+    shape: tuple
+        shape of array, -1 in one axis is inferred from the block size
+    endian: str
+        '<' little, '>' big or '=' native byte order
+    offset: int
+        bytes of header before the array
+    dims: tuple
+        dimension names, default dim_0, dim_1 ...
+    coords: dict, Callable
+        coordinates of DataArray, or function of the header bytes (memoryview) returning coordinates
+    name: str
+        name of DataArray, default dataName of the block
+    attrs: dict
+        attributes of DataArray
+    """
+
+    def __init__(self, dtype: Union[str, np.dtype], shape: tuple, endian: str = '<', offset: int = 0,
+                 dims: tuple = None, coords: Union[dict, Callable] = None, name: str = None, attrs: dict = None):
+        self.dtype = np.dtype(dtype).newbyteorder(endian)
+        self.shape = tuple(shape)
+        self.offset = offset
+        self.dims = tuple(dims) if dims is not None else tuple(f"dim_{k}" for k in range(len(self.shape)))
+        self.coords = coords
+        self.name = name
+        self.attrs = attrs or {}
+        if len(self.dims) != len(self.shape):
+            raise ValueError(f"dims {self.dims} does not match shape {self.shape}")
+
+    def resolve(self, nbytes: int) -> tuple:
+        """shape of the array in a block of `nbytes`, with inferred -1 axis"""
+        count = (nbytes - self.offset) // self.dtype.itemsize
+        known = int(np.prod([n for n in self.shape if n != -1]))
+        shape = tuple(count // known if n == -1 else n for n in self.shape)
+        if int(np.prod(shape)) * self.dtype.itemsize > nbytes - self.offset:
+            raise ValueError(f"block of {nbytes} bytes is smaller than {shape} of {self.dtype} after "
+                             f"{self.offset} bytes header")
+        return shape
+
+
+# descriptors of dataName (fnmatch pattern) registered by `register_block`
+DESCRIPTORS = {}
+
+
+def register_block(pattern: str, descriptor: BlockDescriptor):
+    """register descriptor for data blocks whose dataName matches the fnmatch pattern"""
+    DESCRIPTORS[pattern] = descriptor
+
+
+def find_descriptor(name: str) -> BlockDescriptor:
+    """descriptor of dataName, exact name first then patterns in order of registration"""
+    if name in DESCRIPTORS:
+        return DESCRIPTORS[name]
+    for pattern, descriptor in DESCRIPTORS.items():
+        if isinstance(name, str) and fnmatch.fnmatch(name, pattern):
+            return descriptor
+    raise KeyError(f"no block descriptor for {name}, register one by `register_block`")
+
+
+def decode_block(data: Union[bytes, memoryview, str], descriptor: BlockDescriptor = None,
+                 name: str = None) -> xr.DataArray:
+    """decode a data block into DataArray without copying
+
+    Bytes are viewed by `np.frombuffer` (read-only, sharing memory with the block), a path of spooled block
+    is memory-mapped by `np.memmap`, so that only touched pages are read.
+
+    Parameters
+    ----------
+    data: bytes, memoryview, str
+        byteArray of RetDataBlock or path of block spooled to disk
+    descriptor: BlockDescriptor
+        layout of block, default found by `name` in registered descriptors
+    name: str
+        dataName of block
+
+    Returns
+    -------
+    xr.DataArray: array of block with coordinates of descriptor
+    """
+    descriptor = descriptor if descriptor is not None else find_descriptor(name)
+    if isinstance(data, (str, os.PathLike)):
+        nbytes = os.path.getsize(data)
+        shape = descriptor.resolve(nbytes)
+        values = np.memmap(data, dtype=descriptor.dtype, mode='r', offset=descriptor.offset, shape=shape)
+        with open(data, 'rb') as f:
+            header = memoryview(f.read(descriptor.offset))
+    else:
+        buffer = memoryview(data)
+        shape = descriptor.resolve(buffer.nbytes)
+        values = np.frombuffer(buffer, dtype=descriptor.dtype, count=int(np.prod(shape)),
+                               offset=descriptor.offset).reshape(shape)
+        header = buffer[:descriptor.offset]
+    coords = descriptor.coords(header) if callable(descriptor.coords) else (descriptor.coords or {})
+    return xr.DataArray(values, dims=descriptor.dims, coords=coords, name=descriptor.name or name,
+                        attrs=descriptor.attrs)
+
+
+def spool_block(data: bytes, path: str) -> str:
+    """write block to disk atomically, so that it can be memory-mapped and the bytes released"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    logger.debug(f"spool block of {len(data)} bytes into {path}")
+    return path
@@ -0,0 +1,526 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 9:12
+# @Last Modified by: wqshen
+
+import os
+import re
+import math
+import time
+import pickle
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+import xarray as xr
+from typing import Callable, Hashable, Union
+from logzero import logger
+from datetime import datetime
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pydaas')
+
+
+class TileCache(object):
+    """In-memory cache of grid fields split into fixed lat/lon aligned tiles
+
+    Tile (i, j) covers the closed box [i * tile_size, (i + 1) * tile_size] in latitude and
+    [j * tile_size, (j + 1) * tile_size] in longitude, so overlapping rectangle requests of
+    the same field share tiles and only missing tiles are requested from the server. Tiles are
+    stored ascending, stitched rectangles are returned in the lat/lon order of the server.
+    """
+    eps = 1e-6
+
+    def __init__(self, tile_size: float = 5., maxsize: int = 1024):
+        """TileCache
+
+        Parameters
+        ----------
+        tile_size: float
+            tile size in degrees
+        maxsize: int
+            max number of tiles kept in memory, least recently used tiles are evicted first
+        """
+        self.tile_size = tile_size
+        self.maxsize = maxsize
+        self._tiles = OrderedDict()
+        self._descending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def clear(self):
+        with self._lock:
+            self._tiles.clear()
+            self._descending.clear()
+
+    def tile_range(self, start: float, stop: float) -> range:
+        """indexes of tiles covering the closed interval [start, stop]"""
+        start, stop = min(start, stop), max(start, stop)
+        lo = math.floor(start / self.tile_size + self.eps)
+        hi = max(lo, math.ceil(stop / self.tile_size - self.eps) - 1)
+        return range(lo, hi + 1)
+
+    def _get(self, key: Hashable, i: int, j: int) -> Union[xr.DataArray, None]:
+        with self._lock:
+            tile = self._tiles.get((key, i, j))
+            if tile is not None:
+                self._tiles.move_to_end((key, i, j))
+            return tile
+
+    def _put(self, key: Hashable, i: int, j: int, tile: xr.DataArray):
+        with self._lock:
+            self._tiles[(key, i, j)] = tile
+            self._tiles.move_to_end((key, i, j))
+            while len(self._tiles) > self.maxsize:
+                self._tiles.popitem(last=False)
+
+    @staticmethod
+    def merge_rects(missing: list) -> list:
+        """merge missing tiles into a minimal set of rectangles
+
+        Parameters
+        ----------
+        missing: list
+            (i, j) index of missing tiles
+
+        Returns
+        -------
+        list: (i0, i1, j0, j1) closed index range of each rectangle
+        """
+        rows = {}
+        for i, j in sorted(missing):
+            runs = rows.setdefault(i, [])
+            if runs and runs[-1][1] == j - 1:
+                runs[-1][1] = j
+            else:
+                runs.append([j, j])
+
+        rects, opened = [], {}
+        for i in sorted(rows):
+            current = {}
+            for j0, j1 in rows[i]:
+                i0 = opened[(j0, j1)][0] if (j0, j1) in opened and opened[(j0, j1)][1] == i - 1 else i
+                current[(j0, j1)] = (i0, i)
+            for (j0, j1), (i0, i1) in opened.items():
+                if current.get((j0, j1), (None,))[0] != i0:
+                    rects.append((i0, i1, j0, j1))
+            opened = current
+        rects.extend((i0, i1, j0, j1) for (j0, j1), (i0, i1) in opened.items())
+        return rects
+
+    def _split(self, key: Hashable, data: xr.DataArray, i0: int, i1: int, j0: int, j1: int):
+        """split a fetched rectangle into tiles and store them"""
+        ts, eps = self.tile_size, self.eps
+        tiles = {}
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                tiles[(i, j)] = data.sel(lat=slice(i * ts - eps, (i + 1) * ts + eps),
+                                         lon=slice(j * ts - eps, (j + 1) * ts + eps))
+                self._put(key, i, j, tiles[(i, j)])
+        return tiles
+
+    @staticmethod
+    def normalize(data: xr.DataArray) -> xr.DataArray:
+        """sort lat/lon ascending and round coordinates so that adjacent tiles stitch exactly"""
+        data = data.assign_coords(lat=np.round(data.lat.values, 6), lon=np.round(data.lon.values, 6))
+        for dim in ('lat', 'lon'):
+            if data[dim].size > 1 and data[dim].values[0] > data[dim].values[-1]:
+                data = data.isel({dim: slice(None, None, -1)})
+        return data
+
+    @staticmethod
+    def descending(data: xr.DataArray) -> tuple:
+        """dimensions of lat/lon in descending order"""
+        return tuple(dim for dim in ('lat', 'lon') if data[dim].size > 1 and data[dim].values[0] > data[dim].values[-1])
+
+    def get_rect(self, key: Hashable, lat: slice, lon: slice,
+                 fetch: Callable[[slice, slice], xr.DataArray]) -> xr.DataArray:
+        """get a lat/lon rectangle of a field, fetching missing tiles only
+
+        Parameters
+        ----------
+        key: Hashable
+            identify of the field (interface and parameters except the extent)
+        lat: slice
+            latitude range
+        lon: slice
+            longitude range
+        fetch: Callable
+            function to request a 2D (lat, lon) field in given lat/lon slice
+
+        Returns
+        -------
+        xr.DataArray: requested 2D field, lat/lon in the same order as a direct request
+        """
+        ts, eps = self.tile_size, self.eps
+        irange, jrange = self.tile_range(lat.start, lat.stop), self.tile_range(lon.start, lon.stop)
+        tiles = {(i, j): self._get(key, i, j) for i in irange for j in jrange}
+        missing = [ij for ij, t in tiles.items() if t is None]
+        with self._lock:
+            self.hits += len(tiles) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            rects = self.merge_rects(missing)
+            logger.debug(f"tile cache: {len(missing)}/{len(tiles)} tiles missing, fetch {len(rects)} rects")
+            try:
+                for i0, i1, j0, j1 in rects:
+                    data = fetch(slice(i0 * ts, (i1 + 1) * ts), slice(j0 * ts, (j1 + 1) * ts))
+                    with self._lock:
+                        self._descending[key] = self.descending(data)
+                    tiles.update(self._split(key, self.normalize(data), i0, i1, j0, j1))
+            except Exception as e:
+                # tiles may exceed the domain of datasource, request the rect directly
+                logger.debug(f"tile cache: fetch tiles failed ({e}), request rect directly")
+                return fetch(lat, lon)
+
+        rows = [xr.concat([tiles[(i, j)] for j in jrange], dim='lon').drop_duplicates('lon') for i in irange]
+        data = xr.concat(rows, dim='lat').drop_duplicates('lat')
+        data = data.sel(lat=slice(min(lat.start, lat.stop) - eps, max(lat.start, lat.stop) + eps),
+                        lon=slice(min(lon.start, lon.stop) - eps, max(lon.start, lon.stop) + eps))
+        with self._lock:
+            descending = self._descending.get(key, ())
+        return data.isel({dim: slice(None, None, -1) for dim in descending})
+
+
+class StationCache(object):
+    """Cache of static station attributes (name, location ...) of observation datasources
+
+    Metadata of a datasource is fetched once, kept in memory and pickled under `<cache_dir>/stations`, and
+    refreshed after `ttl` seconds. Observation queries then only request `Station_Id_C`, time and value
+    elements, static attributes are joined locally by station ids. A failed fetch raises, nothing is saved.
+    """
+    key = 'Station_Id_C'
+    static = ('Station_Name', 'Lat', 'Lon', 'Alti', 'Province', 'City', 'Cnty', 'Town', 'Station_levl',
+              'Admin_Code_CHN', 'Station_Id_d', 'Country', 'Town_code')
+
+    def __init__(self, ttl: float = 86400., cache_dir: str = None):
+        """StationCache
+
+        Parameters
+        ----------
+        ttl: float
+            seconds before metadata of a datasource is refreshed, default one day
+        cache_dir: str
+            directory of local caches, default ~/.cache/pydaas
+        """
+        self.ttl = ttl
+        self.cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'stations')
+        self._meta = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _path(self, datasource: str) -> str:
+        return os.path.join(self.cache_dir, f"{datasource}.pkl")
+
+    def _load(self, datasource: str) -> Union[pd.DataFrame, None]:
+        """fresh metadata from memory or disk, None if not cached or expired"""
+        fetched, meta = self._meta.get(datasource, (0., None))
+        if meta is None and os.path.isfile(self._path(datasource)):
+            fetched, meta = os.path.getmtime(self._path(datasource)), pd.read_pickle(self._path(datasource))
+        if meta is None or time.time() - fetched > self.ttl:
+            return
+        self._meta[datasource] = (fetched, meta)
+        return meta
+
+    def _save(self, datasource: str, meta: pd.DataFrame, fetched: float = None):
+        """save metadata, `fetched` is the time of the full fetch it was built from, default now"""
+        fetched = fetched or time.time()
+        self._meta[datasource] = (fetched, meta)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{self._path(datasource)}.{os.getpid()}.tmp"
+        meta.to_pickle(tmp)
+        os.utime(tmp, (fetched, fetched))
+        os.replace(tmp, self._path(datasource))
+
+    def get(self, datasource: str, columns: list, ids: Union[list, np.ndarray],
+            fetch: Callable[[list, Union[list, None]], pd.DataFrame]) -> pd.DataFrame:
+        """metadata of stations, fetching it if not cached, expired, lacking columns or stations
+
+        Parameters
+        ----------
+        datasource: str
+            data source name from Daas
+        columns: list
+            static attributes required
+        ids: list, np.ndarray
+            Station_Id_C of stations required
+        fetch: Callable
+            function to request metadata, called with (columns, ids), ids is None for all stations of
+            datasource, returns DataFrame with Station_Id_C and columns, raises if the request failed
+
+        Returns
+        -------
+        pd.DataFrame: metadata indexed by Station_Id_C
+        """
+        with self._lock:
+            meta = self._load(datasource)
+            fetched = None if meta is None else self._meta[datasource][0]
+            if meta is None or not set(columns) <= set(meta.columns):
+                columns = list(dict.fromkeys([*([] if meta is None else meta.columns), *columns]))
+                logger.debug(f"station cache: fetch {columns} of {datasource}")
+                meta = fetch(columns, None).drop_duplicates(self.key).set_index(self.key)
+                fetched = None
+            missing = pd.Index(pd.unique(np.asarray(ids))).difference(meta.index)
+            if len(missing):
+                logger.debug(f"station cache: fetch {len(missing)} stations of {datasource}")
+                extra = fetch(list(meta.columns), list(missing)).drop_duplicates(self.key).set_index(self.key)
+                # stations without metadata are kept as empty rows to avoid fetching them again
+                meta = pd.concat([meta, extra.reindex(missing)[meta.columns]])
+            if fetched is None or len(missing):
+                self._save(datasource, meta, fetched)
+            return meta
+
+    @classmethod
+    def join(cls, data: pd.DataFrame, meta: pd.DataFrame, columns: list) -> pd.DataFrame:
+        """join static attributes to observations by Station_Id_C, with the dtypes of attributes from server"""
+        stations = data[cls.key].values
+        for c in columns:
+            data[c] = meta[c].reindex(stations).values
+        return data
+
+
+class AvailabilityIndex(object):
+    """Index of published runs and lead times of model datasources built from file listings
+
+    The listing of a run (`get<Type>FileByTime` of its initial time) is kept in memory and pickled under
+    `<cache_dir>/availability` for `ttl` seconds, lead times are parsed from file names. Requests answered
+    with "no data" are negatively cached for `negative_ttl` seconds, so that they are skipped without
+    requests to the server until the run is listed again. Refused listings (no permission ...) are cached as
+    unknown, requests of unknown runs are not skipped.
+    """
+    # lead time in file names: ECMWF dissemination (init/valid MMDDHHMM), `_024.grb2` style suffix
+    patterns = (re.compile(r'_P_\w{3}(\d{8})(\d{8})\d'),
+                re.compile(r'[_.-](\d{3,4})(?:\.[A-Za-z]\w*)+$'))
+
+    def __init__(self, ttl: float = 300., negative_ttl: float = 300., cache_dir: str = None):
+        """AvailabilityIndex
+
+        Parameters
+        ----------
+        ttl: float
+            seconds before the listing of a run is refreshed
+        negative_ttl: float
+            seconds to skip a request after a "no data" response
+        cache_dir: str
+            directory of local caches, default ~/.cache/pydaas
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'availability')
+        self._runs = {}
+        self._negative = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse_fh(cls, name: str, inittime: datetime) -> Union[int, None]:
+        """lead time (hours) of a model file name, None if it is not recognized"""
+        match = cls.patterns[0].search(name)
+        if match is not None:
+            init, valid = (datetime.strptime(f"{inittime.year}{m}", '%Y%m%d%H%M') for m in match.groups())
+            if valid < init:
+                valid = valid.replace(year=valid.year + 1)
+            return int((valid - init).total_seconds() // 3600)
+        match = cls.patterns[1].search(name)
+        return int(match.group(1)) if match is not None else None
+
+    def _path(self, datasource: str) -> str:
+        return os.path.join(self.cache_dir, f"{datasource}.pkl")
+
+    def _datasource(self, datasource: str) -> dict:
+        """runs of datasource {inittime: (fetched, fhs)}, loaded from disk at first access"""
+        if datasource not in self._runs:
+            runs = {}
+            if os.path.isfile(self._path(datasource)):
+                runs = pd.read_pickle(self._path(datasource))
+            self._runs[datasource] = runs
+        return self._runs[datasource]
+
+    def _save(self, datasource: str):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{self._path(datasource)}.{os.getpid()}.tmp"
+        pd.to_pickle(self._runs[datasource], tmp)
+        os.replace(tmp, self._path(datasource))
+
+    def run(self, datasource: str, inittime: datetime, fetch: Callable[[datetime], list],
+            refresh: bool = False) -> Union[frozenset, None]:
+        """lead times published for a run, listing it if not cached or expired
+
+        Parameters
+        ----------
+        datasource: str
+            data source name from Daas
+        inittime: datetime
+            model initial datetime
+        fetch: Callable
+            function to list file names of the run, called with inittime, None if the listing is refused
+        refresh: bool
+            list the run even if the cached listing is fresh
+
+        Returns
+        -------
+        frozenset: lead times of files, empty if the run is not published, None in it for unrecognized names.
+            None if the listing is refused
+        """
+        with self._lock:
+            runs = self._datasource(datasource)
+            if inittime in runs and not refresh and time.time() - runs[inittime][0] <= self.ttl:
+                return runs[inittime][1]
+        names = fetch(inittime)
+        fhs = None if names is None else frozenset(self.parse_fh(n, inittime) for n in names)
+        logger.debug(f"availability: {datasource} {inittime:%Y%m%d%H} has "
+                     f"{'unknown' if names is None else len(names)} files")
+        with self._lock:
+            self._datasource(datasource)[inittime] = (time.time(), fhs)
+            self._save(datasource)
+        return fhs
+
+    def missing(self, key: Hashable) -> bool:
+        """request is negatively cached"""
+        with self._lock:
+            marked = self._negative.get(key)
+            if marked is not None and time.time() - marked > self.negative_ttl:
+                del self._negative[key]
+                marked = None
+            return marked is not None
+
+    def mark_missing(self, key: Hashable):
+        """negatively cache a request answered with no data"""
+        with self._lock:
+            self._negative[key] = time.time()
+
+
+class ResponseCache(object):
+    """Disk cache of `sel` results keyed by canonical request, bounded by a byte budget
+
+    Results are pickled under `<cache_dir>/responses` and expire after `ttl` seconds. When the cache grows
+    beyond `max_bytes`, least recently used results are removed, so that consumers of a pre-warmed cache
+    (`daas_dump warm`) read results without requests to the server.
+    """
+
+    def __init__(self, max_bytes: int = 2 << 30, ttl: float = 6 * 3600., cache_dir: str = None):
+        """ResponseCache
+
+        Parameters
+        ----------
+        max_bytes: int
+            byte budget of cached results on disk, default 2 GiB
+        ttl: float
+            seconds before a cached result expires, default 6 hours
+        cache_dir: str
+            directory of local caches, default ~/.cache/pydaas
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'responses')
+        self._size = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{hashlib.md5(key.encode()).hexdigest()}.pkl")
+
+    def _files(self) -> list:
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [e for e in os.scandir(self.cache_dir) if e.name.endswith('.pkl')]
+
+    @property
+    def size(self) -> int:
+        """bytes of cached results"""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(e.stat().st_size for e in self._files())
+            return self._size
+
+    def __contains__(self, key: str) -> bool:
+        path = self._path(key)
+        return os.path.isfile(path) and time.time() - os.path.getmtime(path) <= self.ttl
+
+    def get(self, key: str):
+        """cached result of request, None if not cached or expired"""
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return
+            data = pd.read_pickle(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return
+        # access time marks recently used results
+        os.utime(path, (time.time(), os.path.getmtime(path)))
+        logger.debug(f"response cache: hit {key}")
+        return data
+
+    def put(self, key: str, data) -> int:
+        """cache result of request, returns bytes written"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pd.to_pickle(data, tmp)
+        nbytes = os.path.getsize(tmp)
+        # size is shared by the threads of `n_jobs`, update and evict under the lock
+        with self._lock:
+            if self._size is None:
+                self._size = sum(e.stat().st_size for e in self._files())
+            replaced = os.path.getsize(path) if os.path.isfile(path) else 0
+            os.replace(tmp, path)
+            self._size += nbytes - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+        return nbytes
+
+    def evict(self):
+        """remove expired and least recently used results until cache is within byte budget"""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        entries = sorted(self._files(), key=lambda e: e.stat().st_atime)
+        size = sum(e.stat().st_size for e in entries)
+        now = time.time()
+        for e in entries:
+            if size <= self.max_bytes and now - e.stat().st_mtime <= self.ttl:
+                continue
+            size -= e.stat().st_size
+            os.remove(e.path)
+        self._size = size
+        logger.debug(f"response cache: {size} bytes after eviction")
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 21:50
+# @Last Modified by: wqshen
+
+import os
+import re
+import glob
+import json
+import pickle
+import hashlib
+import threading
+from datetime import datetime
+from logzero import logger
+
+
+class Checkpoint(object):
+    """Journal and results of completed `sel` requests in a directory, so that an interrupted job resumes
+
+    Each completed request is pickled into `<path>/<md5 of request>.pkl` (written to a temporary file, synced
+    and renamed), then a line `{"key": ..., "file": ..., "ok": true}` is appended to `<path>/journal.jsonl`
+    and synced. Failed requests are journaled with `"ok": false` and requested again on restart. A request
+    is completed only if both its journal line and result file exist, so a crash at any point loses at most
+    the requests in flight.
+
+    Processes sharing a checkpoint (workers of `pydaas.workqueue.WorkQueue` on many nodes) append to their own
+    journal `<path>/journal.<name>.jsonl`, and read journals of all.
+    """
+
+    JOURNAL = 'journal.jsonl'
+
+    def __init__(self, path: str, name: str = None):
+        """Checkpoint
+
+        Parameters
+        ----------
+        path: str
+            directory of journal and results, created if not exists
+        name: str
+            name of process writing its own journal, default None for the single journal
+        """
+        self.path = path
+        self.name = name
+        self.journal = os.path.join(path, self.JOURNAL if name is None else
+                                    f"journal.{re.sub(r'[^0-9A-Za-z_.-]', '_', name)}.jsonl")
+        self._lock = threading.Lock()
+        self._done, self._failed = {}, set()
+        os.makedirs(path, exist_ok=True)
+        for journal in sorted(glob.glob(os.path.join(path, 'journal*.jsonl'))):
+            with open(journal, 'rb+' if journal == self.journal else 'rb') as f:
+                lines = f.read().split(b'\n')
+                # drop line torn by crash while appending, so that new lines are not appended to it
+                if journal == self.journal:
+                    f.truncate(sum(len(line) + 1 for line in lines[:-1]))
+            for line in lines[:-1]:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry['ok']:
+                    self._done[entry['key']] = entry['file']
+                    self._failed.discard(entry['key'])
+                elif entry['key'] not in self._done:
+                    self._failed.add(entry['key'])
+        logger.debug(f"checkpoint {path}: {self.summary}")
+
+    def __getstate__(self):
+        return {'path': self.path, 'name': self.name}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def summary(self) -> dict:
+        """number of completed and failed requests in journal"""
+        return dict(completed=len(self._done), failed=len(self._failed))
+
+    def completed(self, key: str) -> bool:
+        """request of `key` is journaled and its result exists"""
+        file = self._done.get(key)
+        return file is not None and os.path.isfile(os.path.join(self.path, file))
+
+    def file(self, key: str) -> str:
+        """file of completed request, None if not completed"""
+        return os.path.join(self.path, self._done[key]) if self.completed(key) else None
+
+    def _journal(self, entry: dict):
+        entry['time'] = datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            with open(self.journal, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def save(self, key: str, data) -> str:
+        """write result of request durably and journal it
+
+        Parameters
+        ----------
+        key: str
+            canonical request, see `pydaas.recorder.canonical`
+        data:
+            result of request
+
+        Returns
+        -------
+        str: file of result
+        """
+        file = f"{hashlib.md5(key.encode()).hexdigest()}.pkl"
+        path = os.path.join(self.path, file)
+        tmp = f"{path}.tmp{threading.get_ident()}"
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self._journal(dict(key=key, file=file, ok=True))
+        with self._lock:
+            self._done[key] = file
+            self._failed.discard(key)
+        return path
+
+    def fail(self, key: str, reason: str = None):
+        """journal failed request, it is requested again on restart"""
+        self._journal(dict(key=key, ok=False, reason=reason))
+        with self._lock:
+            self._failed.add(key)
+
+    def load(self, key: str):
+        """result of completed request, None if `key` is None or not completed"""
+        file = self.file(key) if key is not None else None
+        if file is None:
+            return None
+        with open(file, 'rb') as f:
+            return pickle.load(f)
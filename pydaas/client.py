@@ -5,21 +5,56 @@
 # @Last Modified by: wqshen
 
 import os
+import time
 import yaml
+import hashlib
+import threading
 import numpy as np
 import configparser
 import pandas as pd
 import xarray as xr
-from typing import Union
+from typing import Union, Callable
 from logzero import logger
-from itertools import product
+from functools import partial
+from contextlib import nullcontext
+from itertools import product, islice
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from pydaas.regrid import regrid
+from pydaas.arrow import array2d_to_table, concat_tables, is_table
+from pydaas.cube import to_cube, STATION, TIME
+from pydaas.query import Query
+from pydaas.store import SlotStore
+from pydaas.block import BlockDescriptor, decode_block, spool_block
+from pydaas.recorder import WorkloadRecorder, canonical, nbytes
+from pydaas.prefetch import Prefetcher
+from pydaas.checkpoint import Checkpoint
+from pydaas.workqueue import WorkQueue, worker_name
+from pydaas.metrics import MetricsRegistry
+from pydaas.split import splittable, plan_ranges, bisect_range, row_limit, format_time_range, MAX_CELLS, \
+    MAX_DEPTH, RETRIES, BACKOFF
+from pydaas.interp import interp_points
+from pydaas.cache import TileCache, StationCache, AvailabilityIndex, ResponseCache, DEFAULT_CACHE_DIR
 from pydaas.music.DataQueryClient import DataQueryClient
 
+try:
+    import dask
+    import dask.array as da
+except ImportError:
+    dask = da = None
+
+# u and v elements of vector varname
+VECTORS = {'WIND': ('WIU', 'WIV'), 'WIND10': ('WIU10', 'WIV10')}
+
 
 class DaasClient(DataQueryClient):
-    def __init__(self, user: str = None, password: str = None, **kwargs):
+    def __init__(self, user: str = None, password: str = None, tile_cache: Union[bool, float, TileCache] = None,
+                 cache_dir: str = None, station_cache: Union[bool, StationCache] = None,
+                 availability: Union[bool, AvailabilityIndex] = None,
+                 response_cache: Union[bool, ResponseCache] = None,
+                 recorder: Union[bool, str, WorkloadRecorder] = None,
+                 prefetch: Union[bool, Prefetcher] = None,
+                 metrics: Union[bool, MetricsRegistry] = None, **kwargs):
         """Daas
 
         Parameters
@@ -28,9 +63,67 @@ class DaasClient(DataQueryClient):
             user name
         password: str
             password
+        tile_cache: bool, float, TileCache
+            cache grid fields in lat/lon aligned tiles, so that overlapping rect (`lat`/`lon` slice)
+            requests only fetch missing tiles, point requests are always sent to the server.
+            True for default 5 degree tile, float for tile size in degrees. Default None, disabled
+        cache_dir: str
+            directory of local caches (e.g. regrid weights), default ~/.cache/pydaas
+        station_cache: bool, StationCache
+            cache static station attributes (Station_Name, Lat, Lon, Alti ...) of surface datasources for one day,
+            `getSurfEle` queries only request Station_Id_C, time and value elements and join the attributes
+            locally. True for default StationCache. Default None, disabled
+        availability: bool, AvailabilityIndex
+            index published runs and lead times of model datasources from file listings, `sel` skips slots
+            not published yet and requests answered with no data recently, without requests. True for default
+            AvailabilityIndex (5 minutes TTL). Default None, disabled
+        response_cache: bool, ResponseCache
+            cache results of requests on disk under <cache_dir>/responses, bounded by a byte budget, results are
+            read from it before requesting the server. True for default ResponseCache (2 GiB, 6 hours TTL).
+            Default None, disabled
+        recorder: bool, str, WorkloadRecorder
+            record requests with timings and result sizes into a SQLite file (True for
+            <cache_dir>/workload.sqlite), patterns of requests are replayed by `warm`. Default None, disabled
+        prefetch: bool, Prefetcher
+            speculatively request the next steps of single `sel` requests stepping fh, inittime or leadtime
+            by a constant step (loops over lead times or observation hours), results are served from the
+            speculative requests (and kept in the response cache if enabled). True for default Prefetcher
+            (2 to 8 steps ahead, 2 threads). Default None, disabled
+        metrics: bool, MetricsRegistry
+            record each MUSIC call (pycurl namelookup/connect/starttransfer/total seconds and downloaded bytes,
+            server takeTime and rowCount, client parse seconds) into histograms by interface and dataCode, and
+            decode seconds of results, `sel` seconds by datasource and assemble seconds of `sel`. Exported by
+            `metrics.to_prometheus()`/`metrics.to_json()`, records are passed to `metrics.add_hook` callbacks.
+            True for default MetricsRegistry. Default None, disabled
         kwargs:
             other parameters passed into DataQueryClient
         """
+        if tile_cache is True:
+            tile_cache = TileCache()
+        elif isinstance(tile_cache, (int, float)) and not isinstance(tile_cache, bool):
+            tile_cache = TileCache(tile_size=tile_cache)
+        self.tile_cache = tile_cache if isinstance(tile_cache, TileCache) else None
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        if station_cache is True:
+            station_cache = StationCache(cache_dir=self.cache_dir)
+        self.station_cache = station_cache if isinstance(station_cache, StationCache) else None
+        if availability is True:
+            availability = AvailabilityIndex(cache_dir=self.cache_dir)
+        self.availability = availability if isinstance(availability, AvailabilityIndex) else None
+        if response_cache is True:
+            response_cache = ResponseCache(cache_dir=self.cache_dir)
+        self.response_cache = response_cache if isinstance(response_cache, ResponseCache) else None
+        if recorder is True:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            recorder = os.path.join(self.cache_dir, 'workload.sqlite')
+        self.recorder = WorkloadRecorder(recorder) if isinstance(recorder, str) else recorder
+        if prefetch is True:
+            prefetch = Prefetcher()
+        self.prefetcher = prefetch if isinstance(prefetch, Prefetcher) else None
+        if metrics is True:
+            metrics = MetricsRegistry()
+        self.metrics = metrics if isinstance(metrics, MetricsRegistry) else None
+
         conf_dir = fr'{os.path.dirname(__file__)}/config'
         default_config = fr'{conf_dir}/client.config'
         kwargs['config_file'] = kwargs.get('config_file', default_config)
@@ -64,6 +157,8 @@ class DaasClient(DataQueryClient):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.prefetcher is not None:
+            self.prefetcher.close()
         del self
 
     @staticmethod
@@ -122,56 +217,794 @@ class DaasClient(DataQueryClient):
         fh (int, list): forecast hour
         varname (str, list): variable name
         kwargs (dict): other k/v arguments passed to `sel` method of specific reader
+            interp (str): 'nearest' or 'bilinear', fetch the grid enclosing `lat`/`lon` points (padded by
+                `interp_pad` degrees, default 1) and interpolate points locally instead of `AtPoint` requests
+            regrid (xr.DataArray, xr.Dataset, dict, tuple): target grid (object with lat/lon coordinates,
+                dict(lat=, lon=) or (lat, lon)), grid fields are regridded onto it before merge
+            regrid_method (str): 'bilinear' (default) or 'conservative'
+            lazy (bool): return dask-backed grid fields, each chunk is one planned request fetched on compute,
+                chunk shape and dtype are taken from the first request of each datasource and variable,
+                `regrid` and `interp` are applied to each chunk
+            vector (bool, tuple): fetch u and v components of model grid in one `callAPI_to_gridVector2D` request
+                as a two-variable Dataset, True for `varname` of 'U,V' pair or (u, v) elements; varname 'WIND'
+                or 'WIND10' is vector by default
+            wind (bool): add wind_speed and wind_direction (meteorological, from which wind blows) of vector
+            arrow (bool): return station observations as typed pyarrow.Table (numeric elements float64, time
+                elements timestamp, `_C`/name/id elements string) instead of DataFrame of strings, `index_col`
+                elements are leading columns, `merge` concatenates tables of requests (aligned to the union of
+                their columns)
+            checkpoint (str, Checkpoint): directory of checkpoint journal, each completed request is written
+                into it durably, so that running the same `sel` again after interruption only requests the
+                missing and failed ones, results are assembled from the checkpoint
 
         Returns
         -------
         (pd.DataFrame, xarray.DataArray, list[xarray.DataArray]): Readed variable
         """
+        interp = kwargs.pop('interp', None)
+        if interp is not None:
+            if any(isinstance(kwargs.get(k), slice) or kwargs.get(k) is None for k in ('lat', 'lon')):
+                raise ValueError(f"interp needs point lat/lon (number or list), got lat={kwargs.get('lat')}, "
+                                 f"lon={kwargs.get('lon')}")
+            points = np.atleast_1d(kwargs.pop('lat')), np.atleast_1d(kwargs.pop('lon'))
+            pad = kwargs.pop('interp_pad', 1.)
+            kwargs['lat'] = slice(float(points[0].min()) - pad, float(points[0].max()) + pad)
+            kwargs['lon'] = slice(float(points[1].min()) - pad, float(points[1].max()) + pad)
+        target = kwargs.pop('regrid', None)
+        regrid_method = kwargs.pop('regrid_method', 'bilinear')
+        checkpoint = kwargs.pop('checkpoint', None)
+
+        requests = self._requests(datasource, inittime, fh, varname, leadtime)
+        inittime = [inittime] if isinstance(inittime, (datetime, slice, str)) or inittime is None else inittime
+        if kwargs.pop('lazy', False):
+            return self._sel_lazy(requests, merge=merge, target=target, regrid_method=regrid_method,
+                                  interp=interp, points=points if interp is not None else None, **kwargs)
+
+        with ThreadPoolExecutor(max_workers=self._n_jobs) as executor:
+            if checkpoint is not None:
+                checkpoint = checkpoint if isinstance(checkpoint, Checkpoint) else Checkpoint(checkpoint)
+                keys = list(executor.map(lambda r: self._sel_checkpoint(r, checkpoint, **kwargs), requests))
+                logger.info(f"checkpoint {checkpoint.path}: {checkpoint.summary}")
+                datas = [checkpoint.load(k) for k in keys]
+            elif self.prefetcher is not None and len(requests) == 1:
+                datas = [self._sel_prefetch(requests[0], **kwargs)]
+            else:
+                datas = list(executor.map(lambda r: self._sel(r, **kwargs), requests))
+            if all([i is None for i in datas]):
+                logger.exception(f"all requests failed.")
+                raise Exception(f"all requests failed.")
+            with self._timer('assemble_seconds'):
+                if target is not None:
+                    datas = regrid(datas, target, regrid_method, self.cache_dir)
+                if merge:
+                    if isinstance(datas, list):
+                        if isinstance(datas[0], (xr.DataArray, xr.Dataset)):
+                            if len(inittime) > 1 and all([d.time == datas[0].time for d in datas]):
+                                leadtime = xr.DataArray(datas[0].time.values, dims='time')
+                                datas = [d.set_index(time='inittime').assign_coords(leadtime=leadtime) for d in datas]
+                            datas = xr.merge(datas)
+                        elif isinstance(datas[0], pd.DataFrame):
+                            datas = pd.concat(datas)
+                        elif is_table(datas[0]):
+                            datas = concat_tables(datas)
+                    elif isinstance(datas, xr.DataArray):
+                        datas = datas.to_datas()
+                    elif isinstance(datas, (list, xr.Dataset, pd.DataFrame, pd.Series)):
+                        pass
+                    else:
+                        raise NotImplementedError(datas)
+                elif len(requests) == 1:
+                    datas = datas[0]
+
+        if interp is not None:
+            datas = interp_points(datas, *points, method=interp)
+        return datas
+
+    def query(self, datasource: str, inittime: Union[datetime, slice, str], **kwargs) -> Query:
+        """build station observation query with server side filter and aggregation pushdown
+
+        Parameters
+        ----------
+        datasource: str
+            data source name from Daas, also alias from config/alias.yaml
+        inittime: datetime, slice, str
+            observation time or time range
+        kwargs:
+            other parameters passed into `sel`, e.g. adminCodes, lat/lon, staLevels
+
+        Returns
+        -------
+        Query: query builder, see `pydaas.query.Query`
+        """
+        return Query(self, datasource, inittime, **kwargs)
+
+    def sel_block(self, interface: str, parameters: dict, descriptor: BlockDescriptor = None,
+                  spool: Union[bool, int] = None) -> xr.DataArray:
+        """request binary data block (radar, satellite ...) by callAPI_to_dataBlock and decode it without copying
+
+        Parameters
+        ----------
+        interface: str
+            interface of MUSIC
+        parameters: dict
+            parameters of interface
+        descriptor: BlockDescriptor
+            dtype, shape, byte order and coordinates of block, default registered one of dataName by
+            `pydaas.block.register_block`
+        spool: bool, int
+            write blocks not smaller than `spool` bytes (all blocks for True) into <cache_dir>/blocks and
+            memory-map them, so that the payload is released from memory. Default None, view the bytes
+
+        Returns
+        -------
+        xr.DataArray: read-only array over the block
+        """
+        ret = self.callAPI_to_dataBlock(self._user, self._password, interface, parameters)
+        if ret.request.errorCode != 0:
+            logger.debug(ret.request)
+            raise Exception(ret.request.errorCode, ret.request.errorMessage)
+        name, data = ret.dataName, ret.byteArray
+        if spool is not None and spool is not False and len(data) >= (0 if spool is True else spool):
+            key = os.path.basename(name) if name else \
+                hashlib.md5(repr(self._cache_key(interface, parameters)).encode()).hexdigest()
+            data = spool_block(data, os.path.join(self.cache_dir, 'blocks', key))
+            del ret
+        return decode_block(data, descriptor, name)
+
+    def _requests(self, datasource: Union[str, list], inittime: Union[datetime, slice, list, str] = None,
+                  fh: Union[int, slice, list] = None, varname: Union[str, list] = None,
+                  leadtime: Union[datetime, slice, list, str] = None) -> list:
+        """plan (datasource, inittime, fh, varname, leadtime) requests of `sel`"""
         datasource = [datasource] if isinstance(datasource, str) else datasource
         datasource = [self.alias.get(d, d) for d in datasource]
         inittime = [inittime] if isinstance(inittime, (datetime, slice, str)) or inittime is None else inittime
         leadtime = [leadtime] if isinstance(leadtime, (datetime, slice, str)) or leadtime is None else leadtime
         fh = [fh] if isinstance(fh, (int, slice, str)) or fh is None else fh
         varname = [varname] if isinstance(varname, str) or varname is None else varname
-        requests = list(product(datasource, inittime, fh, varname, leadtime))
+        return list(product(datasource, inittime, fh, varname, leadtime))
+
+    def sel_iter(self, datasource: Union[str, list], inittime: Union[datetime, slice, list, str] = None,
+                 fh: Union[int, slice, list] = None, varname: Union[str, list] = None,
+                 leadtime: Union[datetime, slice, list, str] = None, ordered: bool = False, **kwargs):
+        """iterate results of `sel` requests as they arrive
+
+        At most 2 * n_jobs requests are in flight or waiting to be yielded, so the memory held by results does
+        not grow with the number of requests. Results are yielded in completion order, or in request order if
+        `ordered`, failed requests are skipped.
 
+        Parameters
+        ----------
+        datasource, inittime, fh, varname, leadtime:
+            same as `sel`
+        ordered: bool
+            yield results in order of requests, a slow request holds back later results
+        kwargs:
+            same as `sel`, except `merge` and `lazy`; `interp` and `regrid` are applied to each result
+
+        Yields
+        ------
+        (tuple, (xr.DataArray, pd.DataFrame)): request (datasource, inittime, fh, varname, leadtime) and its result
+        """
+        interp = kwargs.pop('interp', None)
+        if interp is not None:
+            if any(isinstance(kwargs.get(k), slice) or kwargs.get(k) is None for k in ('lat', 'lon')):
+                raise ValueError(f"interp needs point lat/lon (number or list), got lat={kwargs.get('lat')}, "
+                                 f"lon={kwargs.get('lon')}")
+            points = np.atleast_1d(kwargs.pop('lat')), np.atleast_1d(kwargs.pop('lon'))
+            pad = kwargs.pop('interp_pad', 1.)
+            kwargs['lat'] = slice(float(points[0].min()) - pad, float(points[0].max()) + pad)
+            kwargs['lon'] = slice(float(points[1].min()) - pad, float(points[1].max()) + pad)
+        target = kwargs.pop('regrid', None)
+        regrid_method = kwargs.pop('regrid_method', 'bilinear')
+        checkpoint = kwargs.pop('checkpoint', None)
+        if checkpoint is not None:
+            checkpoint = checkpoint if isinstance(checkpoint, Checkpoint) else Checkpoint(checkpoint)
+
+        def fetch(r):
+            if checkpoint is None:
+                return self._sel(r, **kwargs)
+            return checkpoint.load(self._sel_checkpoint(r, checkpoint, **kwargs))
+
+        requests = enumerate(self._requests(datasource, inittime, fh, varname, leadtime))
+        succeed, position, finished = 0, 0, {}
         with ThreadPoolExecutor(max_workers=self._n_jobs) as executor:
-            datas = list(executor.map(lambda r: self._sel(r, **kwargs), requests))
-            if all([i is None for i in datas]):
-                logger.exception(f"all requests failed.")
-                raise Exception(f"all requests failed.")
-            if merge:
-                if isinstance(datas, list):
-                    if isinstance(datas[0], (xr.DataArray, xr.Dataset)):
-                        if len(inittime) > 1 and all([d.time == datas[0].time for d in datas]):
-                            leadtime = xr.DataArray(datas[0].time.values, dims='time')
-                            datas = [d.set_index(time='inittime').assign_coords(leadtime=leadtime) for d in datas]
-                        datas = xr.merge(datas)
-                    elif isinstance(datas[0], pd.DataFrame):
-                        datas = pd.concat(datas)
-                elif isinstance(datas, xr.DataArray):
-                    datas = datas.to_datas()
-                elif isinstance(datas, (list, xr.Dataset, pd.DataFrame, pd.Series)):
-                    pass
+            pending = {executor.submit(fetch, r): (k, r) for k, r in islice(requests, 2 * self._n_jobs)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    k, request = pending.pop(future)
+                    finished[k] = (request, future.result())
+                ready = [] if ordered else sorted(finished)
+                while ordered and position in finished:
+                    ready.append(position)
+                    position += 1
+                for k in ready:
+                    request, data = finished.pop(k)
+                    if data is None:
+                        continue
+                    if target is not None:
+                        data = regrid(data, target, regrid_method, self.cache_dir)
+                    if interp is not None:
+                        data = interp_points(data, *points, method=interp)
+                    succeed += 1
+                    yield request, data
+                for k, r in islice(requests, max(2 * self._n_jobs - len(pending) - len(finished), 0)):
+                    pending[executor.submit(fetch, r)] = (k, r)
+        if succeed == 0:
+            logger.exception(f"all requests failed.")
+            raise Exception(f"all requests failed.")
+
+    def _sel_lazy(self, requests: list, merge: bool = False, target=None, regrid_method: str = 'bilinear',
+                  interp: str = None, points: tuple = None, **kwargs) -> Union[xr.DataArray, xr.Dataset, list]:
+        """build dask-backed grid fields, one chunk per request
+
+        The first request of each datasource and variable is fetched to get the grid metadata (shape, dtype
+        and coordinates) of its group (the next one if it fails, up to 3), other requests are wrapped as dask
+        delayed tasks and only fetched when the result is computed, a request failing then raises at compute.
+        `regrid` and `interp` are applied to each chunk as it is fetched.
+
+        Parameters
+        ----------
+        requests: list
+            (datasource, inittime, fh, varname, leadtime) of each request
+        merge: bool
+            merge fields of different variables into xr.Dataset
+        target, regrid_method:
+            target grid and method of `regrid`
+        interp: str
+            method of interpolation to `points`
+        points: tuple
+            (lat, lon) of points
+        kwargs: dict
+            other k/v arguments passed to `sel` method of specific reader
+
+        Returns
+        -------
+        (xr.DataArray, xr.Dataset, list): lazy fields concatenated along time for each datasource and variable
+        """
+        if da is None:
+            raise ImportError("lazy sel requires dask, install it by `pip install dask`")
+        post = dict(target=target, regrid_method=regrid_method, interp=interp, points=points)
+
+        groups = {}
+        for request in requests:
+            inittime, fh = self.decode_leadtime(*[request[i] for i in (1, 2, 4)])
+            if isinstance(fh, slice) or not isinstance(inittime, datetime):
+                raise NotImplementedError("lazy sel only supports datetime inittime and integer fh")
+            time = inittime if fh is None else inittime + timedelta(hours=fh)
+            groups.setdefault((request[0], request[3]), []).append((request, time, inittime))
+
+        datas = []
+        for (datasource, varname), members in groups.items():
+            # probe the next request if one fails, a few failures in a row mean the group can't be fetched
+            for index, (request, _, _) in enumerate(members[:3]):
+                probe = self._post(self._sel(request, **kwargs), **post)
+                if probe is not None:
+                    break
+            else:
+                raise Exception(f"lazy sel of {datasource} {varname} failed, first {index + 1} requests failed")
+            if not isinstance(probe, xr.DataArray) or 'time' not in probe.dims:
+                raise NotImplementedError(f"lazy sel only supports grid data with single forecast hour, "
+                                          f"got {type(probe)} of {request}")
+            chunks = []
+            for k, (request, _, _) in enumerate(members):
+                if k == index:
+                    chunks.append(da.from_array(probe.values, chunks=probe.shape))
+                    continue
+                task = dask.delayed(self._sel_values, pure=True)(request, probe.shape, probe.dtype, post, **kwargs)
+                chunks.append(da.from_delayed(task, shape=probe.shape, dtype=probe.dtype))
+            coords = {k: v for k, v in probe.coords.items() if 'time' not in v.dims}
+            coords.update({'time': [m[1] for m in members], 'inittime': ('time', [m[2] for m in members])})
+            datas.append(xr.DataArray(da.concatenate(chunks, axis=probe.dims.index('time')),
+                                      dims=probe.dims, coords=coords, name=varname or probe.name))
+        if merge:
+            return xr.merge(datas)
+        return datas if len(datas) > 1 else datas[0]
+
+    def _post(self, data, target=None, regrid_method: str = 'bilinear', interp: str = None, points: tuple = None):
+        """regrid and interpolate result of one request in lazy sel"""
+        if data is not None and target is not None:
+            data = regrid(data, target, regrid_method, self.cache_dir)
+        if data is not None and interp is not None:
+            data = interp_points(data, *points, method=interp)
+        return data
+
+    def _sel_values(self, request: Union[list, tuple], shape: tuple, dtype: np.dtype, post: dict = None,
+                    **kwargs) -> np.ndarray:
+        """fetch values of one request in lazy sel, a failed request raises instead of looking like missing values"""
+        data = self._post(self._sel(request, **kwargs), **(post or {}))
+        if data is None:
+            raise Exception(f"request {request} of lazy sel failed")
+        if data.shape != shape:
+            raise ValueError(f"shape of {request} is {data.shape}, but {shape} is expected")
+        return data.values
+
+    def sync(self, datasource: str, store: str, inittime: Union[datetime, list], fh: Union[int, list] = None,
+             varname: Union[str, list] = None, level: Union[int, list] = 0, **kwargs) -> dict:
+        """incrementally sync grid fields of a datasource into a local store
+
+        Only (inittime, fh, level, varname) slots missing in the store are fetched, concurrently by `n_jobs`
+        threads, and each slot is written atomically, so an interrupted sync can simply be run again.
+
+        Parameters
+        ----------
+        datasource: str
+            data source name from Daas, also alias from config/alias.yaml
+        store: str
+            root directory of local stores, fields are saved in `<store>/<datasource>`
+        inittime: datetime, list
+            model initial datetime
+        fh: int, list
+            forecast hour
+        varname: str, list
+            variable name
+        level: int, list
+            forecast level, None for data without level
+        kwargs: dict
+            other k/v arguments passed to `sel` method of specific reader, e.g. lat/lon slice
+
+        Returns
+        -------
+        dict: number of total, skipped, fetched and failed slots
+        """
+        store = SlotStore(store, datasource)
+        inittime = [inittime] if isinstance(inittime, datetime) else inittime
+        fh = [fh] if isinstance(fh, int) or fh is None else fh
+        varname = [varname] if isinstance(varname, str) else varname
+        level = [level] if isinstance(level, int) or level is None else level
+        slots = list(product(inittime, varname, level, fh))
+        missing = store.missing(slots)
+        logger.info(f"sync {datasource}: {len(missing)}/{len(slots)} slots missing")
+
+        def fetch(slot):
+            it, v, lv, f = slot
+            data = self._sel((self.alias.get(datasource, datasource), it, f, v, None), level=lv, **kwargs)
+            if isinstance(data, xr.DataArray):
+                store.write(it, v, lv, f, data)
+                return True
+            return False
+
+        with ThreadPoolExecutor(max_workers=self._n_jobs) as executor:
+            fetched = sum(executor.map(fetch, missing))
+        summary = dict(total=len(slots), skipped=len(slots) - len(missing), fetched=fetched,
+                       failed=len(missing) - fetched)
+        logger.info(f"sync {datasource}: {summary}")
+        return summary
+
+    def watch(self, datasource: str, varname: Union[str, list], store: str, inittime: datetime = None,
+              fh: Union[int, list] = None, level: Union[int, list] = 0, callback: Callable = None,
+              interval: float = 60., max_interval: float = 900., timeout: float = 3 * 3600., cycle: int = 6,
+              stop: threading.Event = None, max_attempts: int = 3, **kwargs) -> dict:
+        """watch a model run and fetch each lead time into the local store as soon as it is published
+
+        The listing of the run is polled (one request per poll). While lead times keep arriving, the next
+        poll is scheduled at half of the median gap between arrivals, bounded by `interval` and
+        `max_interval`. When nothing arrives, the interval doubles up to `max_interval`. New lead times
+        are fetched concurrently by `n_jobs` threads and written into the store like `sync`. Slots already in
+        the store are not fetched again, and failed slots are retried at the next poll, until a lead time has
+        failed `max_attempts` times. Only stored lead times reset the backoff and the `timeout`.
+
+        Parameters
+        ----------
+        datasource: str
+            data source name from Daas, also alias from config/alias.yaml
+        varname: str, list
+            variable name
+        store: str
+            root directory of local stores, fields are saved in `<store>/<datasource>`
+        inittime: datetime
+            model initial datetime, default latest published run
+        fh: int, list
+            forecast hours to watch, the watch ends when all of them are stored. Default all published ones,
+            the watch ends after `timeout` seconds without new lead time
+        level: int, list
+            forecast level, None for data without level
+        callback: Callable
+            called with (inittime, fh, varname, level, data) for each fetched slot
+        interval: float
+            minimum seconds between polls
+        max_interval: float
+            maximum seconds between polls
+        timeout: float
+            seconds without new lead time before the watch ends
+        cycle: int
+            hours between runs to find the latest run
+        stop: threading.Event
+            event to end the watch from other threads
+        max_attempts: int
+            fetches of a published lead time before it is given up and reported as missing
+        kwargs: dict
+            other k/v arguments passed to `sel` method of specific reader, e.g. lat/lon slice
+
+        Returns
+        -------
+        dict: inittime, stored and missing (not published or given up) lead times, number of polls
+        """
+        slot_store = SlotStore(store, datasource)
+        datasource = self.alias.get(datasource, datasource)
+        inittime = inittime or self.latest_run(datasource, cycle)
+        if inittime is None:
+            raise Exception(f"no published run of {datasource} found")
+        varname = [varname] if isinstance(varname, str) else varname
+        level = [level] if isinstance(level, int) or level is None else level
+        wanted = None if fh is None else set([fh] if isinstance(fh, int) else fh)
+        stop = stop or threading.Event()
+
+        def fetch(slot):
+            it, v, lv, f = slot
+            data = self._sel((datasource, it, f, v, None), level=lv, **kwargs)
+            if not isinstance(data, xr.DataArray):
+                return False
+            slot_store.write(it, v, lv, f, data)
+            if callback is not None:
+                callback(it, f, v, lv, data)
+            return True
+
+        stored, attempts, arrivals, polls, wait_ = set(), {}, [], 0, interval
+        idle_since = time.time()
+        with ThreadPoolExecutor(max_workers=self._n_jobs) as executor:
+            while not stop.is_set():
+                polls += 1
+                try:
+                    published = self._run_fhs(datasource, inittime, refresh=True)
+                    if published is None:
+                        raise Exception("availability is unknown")
+                except Exception as e:
+                    logger.warning(f"watch {datasource}: list run failed, {e}")
+                    published = frozenset()
+                new = sorted(f for f in published if f is not None and f not in stored
+                             and attempts.get(f, 0) < max_attempts and (wanted is None or f in wanted))
+                fetched = []
+                if new:
+                    missing = slot_store.missing(list(product([inittime], varname, level, new)))
+                    failed = {s[3] for s, ok in zip(missing, executor.map(fetch, missing)) if not ok}
+                    fetched = [f for f in new if f not in failed]
+                    stored.update(fetched)
+                    for f in failed:
+                        attempts[f] = attempts.get(f, 0) + 1
+                        if attempts[f] >= max_attempts:
+                            logger.warning(f"watch {datasource} {inittime:%Y%m%d%H}: fh {f} failed "
+                                           f"{max_attempts} times, give up")
+                if fetched:
+                    logger.info(f"watch {datasource} {inittime:%Y%m%d%H}: stored fh {fetched}")
+                    arrivals.append(time.time())
+                    idle_since = time.time()
+                    gaps = np.diff(arrivals)
+                    wait_ = min(max(float(np.median(gaps)) / 2, interval), max_interval) if len(gaps) else interval
                 else:
-                    raise NotImplementedError(datas)
-                return datas
-            return datas if len(requests) > 1 else datas[0]
+                    wait_ = min(wait_ * 2, max_interval)
+                given_up = {f for f, n in attempts.items() if n >= max_attempts and f not in stored}
+                if wanted is not None and wanted <= stored | given_up:
+                    break
+                if time.time() - idle_since > timeout:
+                    logger.warning(f"watch {datasource} {inittime:%Y%m%d%H}: no new lead time in {timeout}s, end")
+                    break
+                logger.debug(f"watch {datasource}: next poll in {wait_:.0f}s")
+                stop.wait(wait_)
+        given_up = {f for f, n in attempts.items() if n >= max_attempts and f not in stored}
+        summary = dict(inittime=inittime, stored=sorted(stored),
+                       missing=sorted((wanted - stored) if wanted is not None else given_up), polls=polls)
+        logger.info(f"watch {datasource}: {summary}")
+        return summary
+
+    def warm(self, datasource: str = None, inittime: datetime = None, top: int = 100, order: str = 'frequent',
+             budget: int = None, since: float = 7 * 86400., cycle: int = 6) -> dict:
+        """replay recorded request patterns for the newest run into the response cache
+
+        Patterns (requests without inittime) of model runs are taken from the recorder, the newest published
+        run of each datasource is requested by `n_jobs` threads, requests already cached are skipped. No more
+        requests are issued once results of `budget` bytes are fetched.
+
+        Parameters
+        ----------
+        datasource: str
+            only warm patterns of datasource, default all
+        inittime: datetime
+            model initial datetime, default latest published run of each datasource
+        top: int
+            number of patterns
+        order: str
+            'frequent' (most requested first) or 'recent' (latest requested first)
+        budget: int
+            bytes of results to fetch, default unlimited (the byte budget of response cache still applies)
+        since: float
+            seconds of records to look back
+        cycle: int
+            hours between runs to find the latest run
+
+        Returns
+        -------
+        dict: number of patterns, cached, fetched and failed requests, fetched bytes
+        """
+        if self.recorder is None or self.response_cache is None:
+            raise Exception("warm requires recorder and response_cache of DaasClient")
+        datasource = self.alias.get(datasource, datasource) if datasource is not None else None
+        patterns = self.recorder.patterns(datasource, order, top, since)
+        runs, requests, cached = {}, [], 0
+        for request, kwargs, _, _ in patterns:
+            name = request['datasource']
+            if name not in runs:
+                runs[name] = inittime or self.latest_run(name, cycle)
+            if runs[name] is None:
+                logger.warning(f"warm: no published run of {name}")
+                continue
+            request = (name, runs[name], request['fh'], request['varname'], request['leadtime'])
+            if canonical(request, kwargs) in self.response_cache:
+                cached += 1
+            else:
+                requests.append((request, kwargs))
+        logger.info(f"warm: {len(patterns)} patterns, {cached} cached, {len(requests)} to fetch")
+
+        fetched, failed, size = 0, 0, 0
+        requests = iter(requests)
+        with ThreadPoolExecutor(max_workers=self._n_jobs) as executor:
+            pending = {executor.submit(self._sel, r, False, **k) for r, k in islice(requests, self._n_jobs)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    data = future.result()
+                    if data is None:
+                        failed += 1
+                        continue
+                    fetched += 1
+                    size += nbytes(data)
+                if budget is not None and size >= budget:
+                    logger.info(f"warm: byte budget {budget} reached")
+                    continue
+                for r, k in islice(requests, len(done)):
+                    pending.add(executor.submit(self._sel, r, False, **k))
+        summary = dict(patterns=len(patterns), cached=cached, fetched=fetched, failed=failed, nbytes=size)
+        logger.info(f"warm: {summary}")
+        return summary
+
+    def submit(self, queue: Union[str, WorkQueue], datasource: Union[str, list],
+               inittime: Union[datetime, slice, list, str] = None, fh: Union[int, slice, list] = None,
+               varname: Union[str, list] = None, leadtime: Union[datetime, slice, list, str] = None,
+               **kwargs) -> int:
+        """write the requests planned by `sel` into a work queue shared by workers on many nodes
+
+        Workers run `work` on the queue and write results into a shared checkpoint directory, the results are
+        then assembled by `sel` of the same arguments with `checkpoint` of that directory.
+
+        Parameters
+        ----------
+        queue: str, WorkQueue
+            SQLite file of queue on a shared filesystem
+        datasource, inittime, fh, varname, leadtime:
+            same as `sel`
+        kwargs:
+            same as `sel`, except `merge`, `lazy`, `interp`, `regrid` and `checkpoint`
+
+        Returns
+        -------
+        int: number of requests added
+        """
+        unsupported = [k for k in ('merge', 'lazy', 'interp', 'regrid', 'checkpoint') if k in kwargs]
+        if unsupported:
+            raise NotImplementedError(f"{unsupported} is not supported by work queue")
+        queue = queue if isinstance(queue, WorkQueue) else WorkQueue(queue)
+        return queue.submit(self._requests(datasource, inittime, fh, varname, leadtime), kwargs)
+
+    def work(self, queue: Union[str, WorkQueue], checkpoint: Union[str, Checkpoint], worker: str = None,
+             batch: int = None, poll: float = 30., stop: threading.Event = None) -> dict:
+        """claim requests from a work queue, fetch them by `n_jobs` threads and write results into checkpoint
+
+        Leases of requests in hand are renewed as each request completes and every third of the lease, a
+        request raising (e.g. checkpoint on a full disk) is failed in the queue. The worker ends when no request is
+        pending, leased by others or left to retry, requests leased by other workers are waited for every
+        `poll` seconds, as their leases expire if those workers crashed.
+
+        Parameters
+        ----------
+        queue: str, WorkQueue
+            SQLite file of queue written by `submit`
+        checkpoint: str, Checkpoint
+            directory of results shared by workers
+        worker: str
+            name of worker, default host:pid
+        batch: int
+            requests claimed at once, default 2 * n_jobs
+        poll: float
+            seconds between claims when nothing is claimable
+        stop: threading.Event
+            event to stop working after requests in hand
 
-    def _sel(self, request: Union[list, tuple], **kwargs):
+        Returns
+        -------
+        dict: number of done and failed requests, bytes of results, elapsed seconds
+        """
+        queue = queue if isinstance(queue, WorkQueue) else WorkQueue(queue)
+        worker = worker or worker_name()
+        checkpoint = checkpoint if isinstance(checkpoint, Checkpoint) else Checkpoint(checkpoint, name=worker)
+        batch = batch or 2 * self._n_jobs
+        summary = dict(done=0, failed=0, nbytes=0, elapsed=0.)
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=self._n_jobs) as executor:
+            while stop is None or not stop.is_set():
+                tasks = queue.claim(worker, batch)
+                if not tasks:
+                    if queue.finished():
+                        break
+                    logger.info(f"worker {worker}: nothing claimable, wait {poll}s for leases of other workers")
+                    if stop is not None:
+                        stop.wait(poll)
+                    else:
+                        time.sleep(poll)
+                    continue
+                futures = {executor.submit(self._sel_checkpoint, r, checkpoint, **k): task for task, r, k in tasks}
+                pending = set(futures)
+                while pending:
+                    # leases are renewed on a timer, a request may run longer than the lease
+                    finished, pending = wait(pending, timeout=queue.lease / 3, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        task = futures[future]
+                        try:
+                            key = future.result()
+                            size = None if key is None else os.path.getsize(checkpoint.file(key))
+                        except Exception as e:
+                            logger.exception(f"worker {worker}: task {task} failed - {e}")
+                            key, error = None, str(e)
+                        else:
+                            error = 'request failed'
+                        if key is None:
+                            queue.fail(task, worker, error)
+                            summary['failed'] += 1
+                            continue
+                        if not queue.done(task, worker, size):
+                            logger.warning(f"worker {worker}: lease of task {task} was lost to another worker")
+                        summary['done'] += 1
+                        summary['nbytes'] += size
+                    queue.renew([futures[f] for f in pending], worker)
+        summary['elapsed'] = time.time() - started
+        logger.info(f"worker {worker}: {summary}")
+        return summary
+
+    def _sel(self, request: Union[list, tuple], record: bool = True, **kwargs):
         logger.debug(request)
+        key = canonical(request, kwargs)
         request = dict(zip(('datasource', 'inittime', 'fh', 'varname', 'leadtime'), request))
         request['inittime'], request['fh'] = self.decode_leadtime(request['inittime'], request['fh'],
                                                                   request['leadtime'])
 
         logger.debug(request)
         interface_method = getattr(self, f"_sel_{request['datasource'].split('_')[0].lower()}")
+        if self._unavailable(request, key):
+            logger.info(f"{request} is not available, skipped")
+            return
 
+        started = time.time()
+        data = self.response_cache.get(key) if self.response_cache is not None else None
+        if data is None:
+            try:
+                with self._timer('sel_seconds', datasource=request['datasource']):
+                    data = interface_method(**request, **kwargs)
+            except Exception as e:
+                logger.exception("{} - {}".format(request, e))
+                # server side errors (no data ...) are negatively cached, transport errors are retried
+                if self.availability is not None and e.args and isinstance(e.args[0], int) \
+                        and e.args[0] != self.OTHER_ERROR:
+                    self.availability.mark_missing(key)
+            if data is not None and self.response_cache is not None:
+                self.response_cache.put(key, data)
+        if self.recorder is not None and record:
+            self.recorder.record(tuple(request.values()), kwargs, started, time.time() - started, data)
+        return data
+
+    def _sel_checkpoint(self, request: Union[list, tuple], checkpoint: Checkpoint, **kwargs) -> Union[str, None]:
+        """`_sel` of request not completed in checkpoint, key of request if completed, None if failed"""
+        key = canonical(request, kwargs)
+        if checkpoint.completed(key):
+            logger.debug(f"{request} completed in checkpoint, skipped")
+            return key
+        data = self._sel(request, **kwargs)
+        if data is None:
+            checkpoint.fail(key)
+            return None
+        checkpoint.save(key, data)
+        return key
+
+    def _sel_prefetch(self, request: Union[list, tuple], **kwargs):
+        """`_sel` of single request, served by the speculative request of prefetcher if issued earlier"""
+        started = time.time()
+        future = self.prefetcher.observe(request, kwargs, lambda r: self._sel(r, False, **kwargs))
+        data = future.result() if future is not None else None
+        if data is None:
+            # not prefetched, or speculative request failed (e.g. lead time not published yet then)
+            return self._sel(request, **kwargs)
+        logger.debug(f"{request} served by prefetch in {time.time() - started:.3f}s")
+        if self.recorder is not None:
+            self.recorder.record(request, kwargs, started, time.time() - started, data)
+        return data
+
+    def _unavailable(self, request: dict, key: str) -> bool:
+        """request of known missing slot by availability index"""
+        if self.availability is None:
+            return False
+        if self.availability.missing(key):
+            return True
+        if not request['datasource'].startswith('NAFP') or not isinstance(request['inittime'], datetime):
+            return False
         try:
-            return interface_method(**request, **kwargs)
+            fhs = self._run_fhs(request['datasource'], request['inittime'])
         except Exception as e:
-            logger.exception("{} - {}".format(request, e))
-            return
+            logger.warning(f"list run of {request['datasource']} failed: {e}")
+            return False
+        if fhs is None:
+            return False
+        if not fhs:
+            return True
+        return isinstance(request['fh'], int) and None not in fhs and request['fh'] not in fhs
+
+    def _list_run(self, datasource: str, inittime: datetime) -> Union[list, None]:
+        """file names of a model run, empty if it is not published, None if the listing is refused (no file
+        listing permission, datasource without files ...)"""
+        ret = self.callAPI_to_fileList(self._user, self._password, 'getNafpFileByTime',
+                                       {'dataCode': self.alias.get(datasource, datasource),
+                                        'time': f"{inittime:%Y%m%d%H%M%S}"})
+        if ret.request.errorCode == self.OTHER_ERROR:
+            raise Exception(ret.request.errorCode, ret.request.errorMessage)
+        if ret.request.errorCode != 0:
+            logger.warning(f"list run {datasource} {inittime:%Y%m%d%H} failed: {ret.request.errorMessage}, "
+                           f"availability is unknown")
+            return None
+        return [f.fileName for f in ret.fileInfos]
+
+    def available_fh(self, datasource: str, inittime: datetime) -> list:
+        """lead times published for a model run
+
+        Parameters
+        ----------
+        datasource: str
+            data source name from Daas, also alias from config/alias.yaml
+        inittime: datetime
+            model initial datetime
+
+        Returns
+        -------
+        list: sorted lead hours of files of the run, empty if the run is not published
+        """
+        fhs = self._run_fhs(datasource, inittime)
+        if fhs is None:
+            raise Exception(f"list run {datasource} {inittime:%Y%m%d%H} failed, availability is unknown")
+        return sorted(fh for fh in fhs if fh is not None)
+
+    def _run_fhs(self, datasource: str, inittime: datetime, refresh: bool = False) -> Union[frozenset, None]:
+        """lead times of a run from availability index, listed without caching if the index is disabled, None
+        if the listing is refused"""
+        datasource = self.alias.get(datasource, datasource)
+        if self.availability is None:
+            names = self._list_run(datasource, inittime)
+            return None if names is None else frozenset(AvailabilityIndex.parse_fh(n, inittime) for n in names)
+        return self.availability.run(datasource, inittime, partial(self._list_run, datasource), refresh)
+
+    def latest_run(self, datasource: str, cycle: int = 6, lookback: int = 48, fh: int = None) -> Union[datetime, None]:
+        """latest published run of a model datasource
+
+        Runs at every `cycle` hours are listed backward from now, each listing is cached by the availability
+        index, so repeated calls cost at most one request per expired run.
+
+        Parameters
+        ----------
+        datasource: str
+            data source name from Daas, also alias from config/alias.yaml
+        cycle: int
+            hours between runs
+        lookback: int
+            hours to look back from now
+        fh: int
+            lead hour the run must have published, default any file
+
+        Returns
+        -------
+        datetime: initial time of latest run, None if no run is published in `lookback` hours
+        """
+        now = datetime.utcnow()
+        inittime = datetime(now.year, now.month, now.day, now.hour - now.hour % cycle)
+        for _ in range(lookback // cycle + 1):
+            published = self._run_fhs(datasource, inittime)
+            if published and (fh is None or None in published or fh in published):
+                return inittime
+            inittime -= timedelta(hours=cycle)
 
     def decode_leadtime(self, inittime=None, fh=None, leadtime=None):
         """Decode inittime, fh and leadtime
@@ -236,38 +1069,72 @@ class DaasClient(DataQueryClient):
         ret = getattr(self, default_call)(self._user, self._password, interface, parameters, path)
         return ret.fileInfos
 
-    def _sel_nafp(self, datasource: str, inittime: Union[datetime, slice] = None,
-                  fh: Union[int, slice] = None, varname: str = None,
-                  **kwargs) -> Union[pd.DataFrame, xr.DataArray]:
-        """Sel  nafp (model) variable from daas
+    @staticmethod
+    def _spatial_interface(interface: str, parameters: dict, lat=None, lon=None) -> tuple:
+        """append spatial part of interface name and parameters
+
+        Parameters
+        ----------
+        interface: str
+            interface name before spatial part, e.g. getNafpEle
+        parameters: dict
+            parameters of interface, spatial parameters will be updated in place
+        lat, lon: slice or point
+            latitude/longitude range or points
+
+        Returns
+        -------
+        (str, str): interface name and default call method
+        """
+        default_call = "callAPI_to_gridArray2D"
+        if lat and lon:
+            if isinstance(lat, slice):
+                interface += 'GridInRect'
+                parameters.update(
+                    {'minLat': f"{lat.start}",
+                     'maxLat': f"{lat.stop}",
+                     'minLon': f"{lon.start}",
+                     'maxLon': f"{lon.stop}"}
+                )
+            else:
+                interface += 'AtPoint'
+                if isinstance(lat, (list, tuple)) and isinstance(lon, (list, tuple)):
+                    points = ','.join([f'{y}/{x}' for y, x in zip(lat, lon)])
+                else:
+                    points = f'{lat}/{lon}'
+                parameters.update({'latLons': points})
+                default_call = "callAPI_to_array2D"
+        else:
+            interface += 'Grid'
+        return interface, default_call
+
+    def _nafp_interface(self, datasource: str, inittime: datetime, fh: Union[int, slice] = None,
+                        varname: str = None, level: int = 0, level_type: int = None,
+                        lat=None, lon=None) -> tuple:
+        """construct nafp (model) interface name and parameters
 
         Parameters
         ----------
         datasource: str
             data source name from Daas
-        inittime: datetime, slice
+        inittime: datetime
             model initial datetime
         fh: int, slice
             forecast lead hours
         varname: str
             forecast variable name
-        kwargs:
-            lat,lon: slice or point
+        level: int
+            forecast level, None for data without level
+        level_type: int
+            level type, default 1 for level 0 otherwise 100
+        lat, lon: slice or point
+            latitude/longitude range or points
 
         Returns
         -------
-        (xr.DataArray, pd.DataFrame): variable
+        (str, dict, str): interface name, parameters and default call method
         """
-        download = kwargs.pop('download', False)
-        if download:
-            url = self._sel_file(datasource, inittime, path=download, **kwargs)
-            return url
-
-        default_call = "callAPI_to_gridArray2D"
-        level = kwargs.pop('level', 0)
-        if 'levelType' in kwargs:
-            level_type = kwargs.get('levelType')
-        else:
+        if level_type is None:
             level_type = 1 if level == 0 else 100
         parameters = {
             "dataCode": self.alias.get(datasource, datasource),
@@ -278,37 +1145,15 @@ class DaasClient(DataQueryClient):
         if level is None:
             parameters.update({"levelType": "-"})
         else:
-            parameters.update({"levelType": f"{kwargs.pop('levelType', level_type)}",
-                               "fcstLevel": f"{kwargs.pop('level', level)}", })
+            parameters.update({"levelType": f"{level_type}",
+                               "fcstLevel": f"{level}", })
 
         interface = "getNafpEle"
         if datasource.startswith('NAFP_GRID_ANA'):
             interface = "getNafpAnaEle"
-
-        if kwargs.get('lat') and kwargs.get('lon'):
-            lat, lon = kwargs.get('lat'), kwargs.get('lon')
-
-            if isinstance(lat, slice):
-                interface += 'GridInRect'
-                parameters.update(
-                    {'minLat': f"{lat.start}",
-                     'maxLat': f"{lat.stop}",
-                     'minLon': f"{lon.start}",
-                     'maxLon': f"{lon.stop}"}
-                )
-            else:
-                interface += 'AtPoint'
-                if isinstance(lat, (list, tuple)) and isinstance(lon, (list, tuple)):
-                    points = ','.join([f'{y}/{x}' for y, x in zip(lat, lon)])
-                else:
-                    points = f'{lat}/{lon}'
-                parameters.update({'latLons': points})
-                default_call = "callAPI_to_array2D"
-        else:
-            interface += 'Grid'
+        interface, default_call = self._spatial_interface(interface, parameters, lat, lon)
         interface += 'ByTimeAndLevel'
 
-        time = inittime
         if isinstance(fh, slice):
             interface += 'AndValidtimeRange'
             parameters.update(
@@ -318,42 +1163,219 @@ class DaasClient(DataQueryClient):
         elif fh is not None:
             interface += 'AndValidtime'
             parameters.update({'validTime': f"{fh}"})
-            time = inittime + timedelta(hours=fh)
+        return interface, parameters, default_call
 
-        ret = getattr(self, default_call)(self._user, self._password, interface, parameters)
-        if ret.request.errorCode == 0:
-            logger.debug(ret)
-            if default_call == "callAPI_to_array2D":
-                # TODO: 返回不一致的数据类型，让人不知所措
-                data = pd.DataFrame(ret.data, columns=list(ret.elementNames))
-            else:
-                if datasource == "NAFP_C3E_FOR_FTM_LOW_ASI":
-                    rets = [ret.data]
-                    for i in range(1, 51):
-                        parameters['fcstLevel'] = f"{i}"
-                        ret = getattr(self, default_call)(self._user, self._password, interface, parameters)
-                        rets.append(ret.data)
-                    data = xr.DataArray([rets], dims=('time', 'number', 'lat', 'lon'),
-                                        coords={'time': [time],
-                                                # 'inittime': [inittime],
-                                                'number': np.arange(51, dtype='i4'),
-                                                'lon': np.linspace(ret.startLon, ret.endLon, ret.lonCount),
-                                                'lat': np.linspace(ret.startLat, ret.endLat, ret.latCount)},
-                                        name=varname)
-                    data = data.assign_coords(inittime=xr.DataArray([inittime], dims='time'))
-                else:
-                    data = xr.DataArray([ret.data], dims=('time', 'lat', 'lon'),
-                                        coords={'lon': np.linspace(ret.startLon, ret.endLon, ret.lonCount),
-                                                'lat': np.linspace(ret.startLat, ret.endLat, ret.latCount),
-                                                # 'inittime': [inittime],
-                                                'time': [time]},
-                                        name=varname)
-                    data = data.assign_coords(inittime=xr.DataArray([inittime], dims='time'))
+    def _surf_grid_interface(self, datasource: str, inittime: datetime, varname: str = None,
+                             lat=None, lon=None) -> tuple:
+        """construct surface (observation) grid interface name and parameters
 
-            return data
-        else:
+        Returns
+        -------
+        (str, dict, str): interface name, parameters and default call method
+        """
+        parameters = {"dataCode": self.alias.get(datasource, datasource),
+                      "time": f"{inittime:%Y%m%d%H%M%S}",
+                      "fcstEle": varname, }
+        interface, default_call = self._spatial_interface("getSurfEle", parameters, lat, lon)
+        interface += 'ByTime'
+        return interface, parameters, default_call
+
+    def _timer(self, name: str, **labels):
+        """context observing seconds into histogram `name` of metrics, no-op if metrics is disabled"""
+        return self.metrics.timer(name, **labels) if self.metrics is not None else nullcontext()
+
+    def _timed(self, method: Callable, userId: str, pwd: str, interfaceId: str, params: dict, serverId=None):
+        """call MUSIC method and record its timings into metrics"""
+        if self.metrics is None:
+            return method(userId, pwd, interfaceId, params, serverId)
+        started = time.perf_counter()
+        ret = method(userId, pwd, interfaceId, params, serverId)
+        elapsed = time.perf_counter() - started
+        timing = self.last_timing() or {}
+        self.metrics.record(dict(method=method.__name__, interface=interfaceId, datacode=params.get('dataCode', ''),
+                                 error_code=ret.request.errorCode, rows=ret.request.rowCount,
+                                 server_take=ret.request.takeTime / 1000. if ret.request.takeTime else None,
+                                 elapsed=elapsed, parse=elapsed - timing['total'] if timing else None, **timing))
+        return ret
+
+    def callAPI_to_array2D(self, userId, pwd, interfaceId, params, serverId=None):
+        return self._timed(super().callAPI_to_array2D, userId, pwd, interfaceId, params, serverId)
+
+    def callAPI_to_gridArray2D(self, userId, pwd, interfaceId, params, serverId=None):
+        return self._timed(super().callAPI_to_gridArray2D, userId, pwd, interfaceId, params, serverId)
+
+    def callAPI_to_gridScalar2D(self, userId, pwd, interfaceId, params, serverId=None):
+        return self._timed(super().callAPI_to_gridScalar2D, userId, pwd, interfaceId, params, serverId)
+
+    def callAPI_to_gridVector2D(self, userId, pwd, interfaceId, params, serverId=None):
+        return self._timed(super().callAPI_to_gridVector2D, userId, pwd, interfaceId, params, serverId)
+
+    def callAPI_to_fileList(self, userId, pwd, interfaceId, params, serverId=None):
+        return self._timed(super().callAPI_to_fileList, userId, pwd, interfaceId, params, serverId)
+
+    def callAPI_to_dataBlock(self, userId, pwd, interfaceId, params, serverId=None):
+        return self._timed(super().callAPI_to_dataBlock, userId, pwd, interfaceId, params, serverId)
+
+    def _grid_array(self, interface: str, parameters: dict) -> xr.DataArray:
+        """request a 2D grid field by callAPI_to_gridArray2D
+
+        Returns
+        -------
+        xr.DataArray: 2D (lat, lon) field named by fcstEle
+        """
+        ret = self.callAPI_to_gridArray2D(self._user, self._password, interface, parameters)
+        if ret.request.errorCode != 0:
+            logger.debug(ret.request)
+            raise Exception(ret.request.errorCode, ret.request.errorMessage)
+        logger.debug(ret)
+        with self._timer('decode_seconds', kind='grid'):
+            return xr.DataArray(ret.data, dims=('lat', 'lon'),
+                                coords={'lon': np.linspace(ret.startLon, ret.endLon, ret.lonCount),
+                                        'lat': np.linspace(ret.startLat, ret.endLat, ret.latCount)},
+                                name=parameters.get('fcstEle'))
+
+    def _vector_dataset(self, interface: str, parameters: dict, names: tuple, wind: bool = False) -> xr.Dataset:
+        """request u and v components of a 2D grid in one request by callAPI_to_gridVector2D
+
+        Parameters
+        ----------
+        interface: str
+            grid interface of MUSIC
+        parameters: dict
+            parameters of interface, fcstEle is the comma separated u and v elements
+        names: tuple
+            requested u and v elements, names of components if server does not return them
+        wind: bool
+            add wind_speed and wind_direction (meteorological, degree from north which wind blows from)
+
+        Returns
+        -------
+        xr.Dataset: u and v components on (lat, lon) grid
+        """
+        ret = self.callAPI_to_gridVector2D(self._user, self._password, interface, parameters)
+        if ret.request.errorCode != 0:
+            logger.debug(ret.request)
+            raise Exception(ret.request.errorCode, ret.request.errorMessage)
+        with self._timer('decode_seconds', kind='vector'):
+            coords = {'lat': np.linspace(ret.startLat, ret.endLat, ret.latCount),
+                      'lon': np.linspace(ret.startLon, ret.endLon, ret.lonCount)}
+            u, v = np.asarray(ret.u_datas, dtype='f8'), np.asarray(ret.v_datas, dtype='f8')
+            data = xr.Dataset({ret.u_EleName or names[0]: (('lat', 'lon'), u),
+                               ret.v_EleName or names[1]: (('lat', 'lon'), v)}, coords=coords)
+        if wind:
+            data['wind_speed'] = (('lat', 'lon'), np.hypot(u, v), {'units': 'm/s'})
+            data['wind_direction'] = (('lat', 'lon'), np.degrees(np.arctan2(-u, -v)) % 360., {'units': 'degree'})
+        return data
+
+    def _point_array(self, interface: str, parameters: dict) -> pd.DataFrame:
+        """request points by callAPI_to_array2D, long point list is split into several requests
+
+        Returns
+        -------
+        pd.DataFrame: values at points
+        """
+        ret = self._call_array2d(interface, parameters)
+        if ret.request.errorCode != 0:
             logger.debug(ret.request)
             raise Exception(ret.request.errorCode, ret.request.errorMessage)
+        logger.debug(ret)
+        # TODO: 返回不一致的数据类型，让人不知所措
+        with self._timer('decode_seconds', kind='points'):
+            return pd.DataFrame(ret.data, columns=list(ret.elementNames))
+
+    @staticmethod
+    def _cache_key(interface: str, parameters: dict) -> tuple:
+        """hashable key of a request"""
+        return (interface, *sorted(parameters.items()))
+
+    def _get_grid(self, build, lat=None, lon=None) -> xr.DataArray:
+        """get 2D grid field, use tile cache for rect request if it's enabled
+
+        Parameters
+        ----------
+        build: Callable
+            function build interface name, parameters and default call method from lat/lon
+        lat, lon: slice
+            latitude/longitude range
+
+        Returns
+        -------
+        xr.DataArray: 2D (lat, lon) field
+        """
+        if self.tile_cache is not None and isinstance(lat, slice) and isinstance(lon, slice):
+            key = self._cache_key(*build(None, None)[:2])
+            return self.tile_cache.get_rect(key, lat, lon, lambda y, x: self._grid_array(*build(y, x)[:2]))
+        return self._grid_array(*build(lat, lon)[:2])
+
+    def _sel_nafp(self, datasource: str, inittime: Union[datetime, slice] = None,
+                  fh: Union[int, slice] = None, varname: str = None,
+                  **kwargs) -> Union[pd.DataFrame, xr.DataArray]:
+        """Sel  nafp (model) variable from daas
+
+        Parameters
+        ----------
+        datasource: str
+            data source name from Daas
+        inittime: datetime, slice
+            model initial datetime
+        fh: int, slice
+            forecast lead hours
+        varname: str
+            forecast variable name
+        kwargs:
+            lat,lon: slice or point
+            vector: fetch u/v components in one request, True for varname of 'U,V' or (u, v) elements
+            wind: add wind_speed and wind_direction of vector
+
+        Returns
+        -------
+        (xr.DataArray, pd.DataFrame, xr.Dataset): variable, Dataset of u/v components for vector
+        """
+        download = kwargs.pop('download', False)
+        if download:
+            url = self._sel_file(datasource, inittime, path=download, **kwargs)
+            return url
+
+        level = kwargs.pop('level', 0)
+        level_type = kwargs.pop('levelType', 1 if level == 0 else 100)
+        lat, lon = kwargs.get('lat'), kwargs.get('lon')
+        vector = kwargs.pop('vector', varname in VECTORS)
+        if vector:
+            names = VECTORS.get(varname, tuple(varname.split(','))) if vector is True else tuple(vector)
+            varname = ','.join(names)
+        build = partial(self._nafp_interface, datasource, inittime, fh, varname, level, level_type)
+        _, _, default_call = build(lat, lon)
+
+        time = inittime
+        if fh is not None and not isinstance(fh, slice):
+            time = inittime + timedelta(hours=fh)
+
+        if vector:
+            if default_call == "callAPI_to_array2D":
+                raise NotImplementedError("vector is only supported by grid requests, use `interp` for points")
+            data = self._vector_dataset(*build(lat, lon)[:2], names, kwargs.get('wind', False))
+            data = data.expand_dims(time=[time])
+            data = data.assign_coords(inittime=xr.DataArray([inittime], dims='time'))
+        elif default_call == "callAPI_to_array2D":
+            data = self._point_array(*build(lat, lon)[:2])
+        elif datasource == "NAFP_C3E_FOR_FTM_LOW_ASI":
+            grid = self._get_grid(build, lat, lon)
+            rets = [grid.values]
+            for i in range(1, 51):
+                member = partial(self._nafp_interface, datasource, inittime, fh, varname, i, level_type)
+                rets.append(self._get_grid(member, lat, lon).values)
+            data = xr.DataArray([rets], dims=('time', 'number', 'lat', 'lon'),
+                                coords={'time': [time],
+                                        # 'inittime': [inittime],
+                                        'number': np.arange(51, dtype='i4'),
+                                        'lon': grid.lon.values,
+                                        'lat': grid.lat.values},
+                                name=varname)
+            data = data.assign_coords(inittime=xr.DataArray([inittime], dims='time'))
+        else:
+            data = self._get_grid(build, lat, lon).expand_dims(time=[time])
+            data = data.assign_coords(inittime=xr.DataArray([inittime], dims='time'))
+        return data
 
     def _sel_surf_grid(self, datasource: str, inittime: Union[datetime, slice] = None,
                        varname: str = None, **kwargs) -> Union[pd.DataFrame, xr.DataArray]:
@@ -374,49 +1396,26 @@ class DaasClient(DataQueryClient):
         -------
         (xr.DataArray, pd.DataFrame): variable
         """
-        default_call = "callAPI_to_gridArray2D"
-        parameters = {"dataCode": self.alias.get(datasource, datasource),
-                      "time": f"{inittime:%Y%m%d%H%M%S}",
-                      "fcstEle": varname, }
-
-        interface = "getSurfEle"
-        if kwargs.get('lat') and kwargs.get('lon'):
-            lat, lon = kwargs.get('lat'), kwargs.get('lon')
-
-            if isinstance(lat, slice):
-                interface += 'GridInRect'
-                parameters.update(
-                    {'minLat': f"{lat.start}",
-                     'maxLat': f"{lat.stop}",
-                     'minLon': f"{lon.start}",
-                     'maxLon': f"{lon.stop}"}
-                )
-            else:
-                interface += 'AtPoint'
-                if isinstance(lat, (list, tuple)) and isinstance(lon, (list, tuple)):
-                    points = ','.join([f'{y}/{x}' for y, x in zip(lat, lon)])
-                else:
-                    points = f'{lat}/{lon}'
-                parameters.update({'latLons': points})
-                default_call = "callAPI_to_array2D"
-        else:
-            interface += 'Grid'
-        interface += 'ByTime'
-        ret = getattr(self, default_call)(self._user, self._password, interface, parameters)
-        if ret.request.errorCode == 0:
-            logger.debug(ret)
-            if default_call == "callAPI_to_array2D":
-                # TODO: 返回不一致的数据类型，让人不知所措
-                data = pd.DataFrame(ret.data, columns=ret.elementNames)
-            else:
-                data = xr.DataArray(ret.data, dims=('lat', 'lon'),
-                                    coords={'lon': np.linspace(ret.startLon, ret.endLon, ret.lonCount),
-                                            'lat': np.linspace(ret.startLat, ret.endLat, ret.latCount)},
-                                    name=varname)
+        lat, lon = kwargs.get('lat'), kwargs.get('lon')
+        build = partial(self._surf_grid_interface, datasource, inittime, varname)
+        _, _, default_call = build(lat, lon)
+        if default_call == "callAPI_to_array2D":
+            return self._point_array(*build(lat, lon)[:2])
+        return self._get_grid(build, lat, lon)
+
+    def _table(self, ret, index_col: str = None, arrow: bool = False, cube: Union[bool, str] = False,
+               cube_level: str = None, **kwargs) -> Union[pd.DataFrame, xr.Dataset]:
+        """decode RetArray2D into DataFrame (strings, indexed by `index_col`), typed arrow table (`index_col`
+        as leading columns) or (station, time[, level]) cube"""
+        with self._timer('decode_seconds', kind='arrow' if arrow else 'cube' if cube else 'table'):
+            if arrow:
+                return array2d_to_table(ret, index_col=index_col)
+            data = pd.DataFrame(ret.data, columns=list(ret.elementNames))
+            if cube:
+                return to_cube(data, cube_level, cube)
+            if index_col is not None:
+                data = data.set_index(index_col.split(','))
             return data
-        else:
-            logger.debug(ret.request)
-            raise Exception(ret.request.errorCode, ret.request.errorMessage)
 
     def _sel_surf(self, datasource: str, inittime: Union[str, slice, datetime] = None,
                   varname: str = None, **kwargs) -> pd.DataFrame:
@@ -441,10 +1440,16 @@ class DaasClient(DataQueryClient):
             limitCnt: max return records number
             orderBy: order key
             dataProvinceId: BABJ, BEHZ ...
+            split: split time range queries without limitCnt into sub-ranges fetched concurrently, True
+                (default) by estimated cost, int for budget of values (rows * elements) of one sub-query, False
+                to disable
+            split_jobs: number of concurrent sub-queries, default 4
+            cube: True (sparse backing if fill ratio is low), 'dense' or 'sparse', return (station, time) dataset
+                of numeric elements, static attributes as station coordinates
 
         Returns
         -------
-        data: pd.DataFrame
+        data: pd.DataFrame, xr.Dataset
             requested observation data
         """
         read_from_file = kwargs.pop('read_from_file', False)
@@ -512,15 +1517,233 @@ class DaasClient(DataQueryClient):
             if k in kwargs:
                 parameters.update({k: kwargs.get(k)})
 
-        ret = self.callAPI_to_array2D(self._user, self._password, interface, parameters, )
+        if kwargs.get('cube'):
+            self._cube_elements(parameters)
+        if self.station_cache is not None and interface.startswith('getSurf') and not kwargs.get('arrow'):
+            static = [e for e in dict.fromkeys(parameters['elements'].split(',')) if e in StationCache.static]
+            split = {k: kwargs[k] for k in ('split', 'split_jobs') if k in kwargs}
+            if static and kwargs.get('cube'):
+                return to_cube(self._sel_surf_static(interface, parameters, static, **split), backing=kwargs['cube'])
+            elif static:
+                return self._sel_surf_static(interface, parameters, static, kwargs.get('index_col'), **split)
+
+        ret = self._array2d(interface, parameters, **kwargs)
         if ret.request.errorCode == 0:
-            data = pd.DataFrame(ret.data, columns=list(ret.elementNames))
-            if kwargs.get('index_col') is not None:
-                data = data.set_index(kwargs.get('index_col').split(','))
-            return data
+            return self._table(ret, **kwargs)
         else:
             raise Exception(ret.request.errorCode, ret.request.errorMessage)
 
+    def _call_array2d(self, interface: str, parameters: dict, jobs: int = 4, retries: int = RETRIES):
+        """callAPI_to_array2D, id or point list of a request longer than maxUrlLength is split into balanced
+        sub-requests fetched concurrently, unless the gateway accepts POST requests (`music_post`)
+
+        Parameters
+        ----------
+        interface: str
+            interface of MUSIC
+        parameters: dict
+            parameters of interface
+        jobs: int
+            number of concurrent sub-requests
+        retries: int
+            times a sub-request failing on transport (timeout) is retried with exponential backoff
+
+        Returns
+        -------
+        ret: RetArray2D
+            rows of sub-requests in order of ids/points, or the error of the first failed sub-request with failed
+            parts listed in errorMessage if any sub-request failed after retries
+        """
+        key = next((k for k in ('staIds', 'latLons') if parameters.get(k)), None)
+        length = len(self.getConcateUrl(self._user, self._password, interface, parameters, None,
+                                        'callAPI_to_array2D'))
+        if key is None or self.post or length <= self.maxUrlLength:
+            return self.callAPI_to_array2D(self._user, self._password, interface, parameters)
+
+        items = str(parameters[key]).split(',')
+        available = self.maxUrlLength - (length - len(str(parameters[key])))
+        if available <= max(len(i) for i in items):
+            raise Exception(f"url of {interface} exceeds {self.maxUrlLength} characters with a single item of {key}")
+        n = -(-len(str(parameters[key])) // available)
+        while True:
+            parts = [','.join(p) for p in np.array_split(np.asarray(items, dtype=object), n) if len(p)]
+            if max(len(p) for p in parts) <= available:
+                break
+            n += 1
+        logger.debug(f"url of {interface} is {length} characters, split {len(items)} {key} into {len(parts)} requests")
+
+        def fetch(part):
+            for attempt in range(retries + 1):
+                ret = self.callAPI_to_array2D(self._user, self._password, interface, {**parameters, key: part})
+                if ret.request.errorCode != self.OTHER_ERROR or attempt == retries:
+                    return ret
+                logger.debug(f"part of {key} of {interface} failed: {ret.request.errorMessage}, "
+                             f"retry in {BACKOFF * 2 ** attempt:.0f}s")
+                time.sleep(BACKOFF * 2 ** attempt)
+
+        with ThreadPoolExecutor(max_workers=min(jobs, len(parts))) as executor:
+            rets = list(executor.map(fetch, parts))
+        succeed = [r for r in rets if r.request.errorCode == 0]
+        if not succeed:
+            return rets[0]
+        failed = [(i, r) for i, r in enumerate(rets) if r.request.errorCode != 0]
+        if failed:
+            # a partial answer would silently drop stations/points, fail the whole request
+            message = '; '.join(f"{key} {parts[i].split(',')[0]}...: {r.request.errorMessage}" for i, r in failed[:3])
+            message += ' ...' if len(failed) > 3 else ''
+            ret = failed[0][1]
+            ret.request.errorMessage = f"{len(failed)} of {len(parts)} parts of {interface} failed, {message}"
+            return ret
+        merged = succeed[0]
+        merged.data = [row for r in succeed for row in r.data]
+        merged.row = merged.request.rowCount = len(merged.data)
+        return merged
+
+    def _array2d(self, interface: str, parameters: dict, split: Union[bool, int] = True, split_jobs: int = 4,
+                 **kwargs):
+        """request station elements by callAPI_to_array2D, long time range queries are split into sub-ranges
+
+        The number of sub-ranges is chosen by a cost estimate from time span, station scope and elements of the
+        query (`pydaas.split.plan_ranges`). Queries with limitCnt, distinct or orderBy are not split. Sub-queries
+        run concurrently with a limitCnt of `ROW_FACTOR` times their planned rows, a sub-range timed out or
+        returning as many rows (truncated) is bisected, at most `MAX_DEPTH` times, sub-ranges can't be bisected
+        any more are retried `RETRIES` times with exponential backoff on transport errors. Rows of sub-ranges
+        are appended in time order as soon as all earlier sub-ranges are done.
+
+        Parameters
+        ----------
+        interface: str
+            interface of MUSIC
+        parameters: dict
+            parameters of interface
+        split: bool, int
+            True to split by estimated cost, int for budget of values (rows * elements) of one sub-query,
+            False to request the time range at once
+        split_jobs: int
+            number of concurrent sub-queries
+
+        Returns
+        -------
+        ret: RetArray2D
+            rows of all sub-ranges, or the error of the first sub-range still failing (or truncated) after
+            bisection, the remaining sub-ranges are cancelled
+        """
+        if split is False or split is None or not splittable(interface, parameters):
+            return self._call_array2d(interface, parameters, split_jobs)
+        max_cells = MAX_CELLS if split is True else int(split)
+        ranges = plan_ranges(parameters, max_cells)
+        limit = row_limit(parameters, max_cells)
+
+        def fetch(time_range, depth=0):
+            params = {**parameters, 'timeRange': format_time_range(*time_range), 'limitCnt': limit}
+            halves = bisect_range(*time_range) if depth < MAX_DEPTH else None
+            # sub-ranges can't be bisected any more are retried on transport errors
+            for attempt in range(1 if halves else RETRIES + 1):
+                if attempt:
+                    time.sleep(BACKOFF * 2 ** (attempt - 1))
+                ret = self._call_array2d(interface, params, 1, retries=0)
+                if ret.request.errorCode != self.OTHER_ERROR:
+                    break
+            truncated = ret.request.errorCode == 0 and len(ret.data) >= limit
+            if ret.request.errorCode != self.OTHER_ERROR and not truncated:
+                return ret
+            reason = f"truncated at {limit} rows" if truncated else f"failed: {ret.request.errorMessage}"
+            if halves is None:
+                ret.request.errorCode = ret.request.errorCode or self.OTHER_ERROR
+                ret.request.errorMessage = f"sub-range {params['timeRange']} of {interface} {reason}"
+                return ret
+            logger.debug(f"{params['timeRange']} of {interface} {reason}, bisect it")
+            if not truncated:
+                time.sleep(BACKOFF * 2 ** depth)
+            first = fetch(halves[0], depth + 1)
+            if first.request.errorCode != 0:
+                return first
+            second = fetch(halves[1], depth + 1)
+            if second.request.errorCode != 0:
+                return second
+            first.data = [*first.data, *second.data]
+            return first
+
+        merged = None
+        with ThreadPoolExecutor(max_workers=max(min(split_jobs, len(ranges)), 1)) as executor:
+            futures = [executor.submit(fetch, r) for r in ranges]
+            # append rows of sub-ranges in time order, release them once appended
+            for time_range, future in zip(ranges, futures):
+                ret = future.result()
+                if ret.request.errorCode != 0:
+                    for f in futures:
+                        f.cancel()
+                    if len(ranges) > 1 and not ret.request.errorMessage.startswith('sub-range'):
+                        ret.request.errorMessage = f"sub-range {format_time_range(*time_range)} of {interface} " \
+                                                   f"failed: {ret.request.errorMessage}"
+                    return ret
+                elif merged is None:
+                    merged, ret.data = ret, list(ret.data)
+                else:
+                    merged.data.extend(ret.data)
+        merged.row = merged.request.rowCount = len(merged.data)
+        return merged
+
+    @staticmethod
+    def _cube_elements(parameters: dict, level: str = None):
+        """add elements of cube dimensions to request"""
+        if not parameters.get('elements') or parameters.get('statEles'):
+            raise NotImplementedError("cube is only supported by element queries, not statistics")
+        elements = parameters['elements'].split(',')
+        parameters['elements'] = ','.join([*elements, *[e for e in (STATION, TIME, level)
+                                                        if e is not None and e not in elements]])
+
+    def _sel_surf_static(self, interface: str, parameters: dict, static: list, index_col: str = None,
+                         **kwargs) -> pd.DataFrame:
+        """request surface observations without static attributes and join them from station cache
+
+        Parameters
+        ----------
+        interface: str
+            `getSurfEle...` interface
+        parameters: dict
+            parameters of interface
+        static: list
+            static attributes in requested elements
+        index_col: str
+            index of returned data
+        kwargs:
+            split, split_jobs of time range splitting, see `_array2d`
+
+        Returns
+        -------
+        data: pd.DataFrame
+            requested observation data, same columns as requested with all attributes from server
+        """
+        elements = list(dict.fromkeys(parameters['elements'].split(',')))
+        query = [e for e in elements if e not in static]
+        query = query if StationCache.key in query else [StationCache.key, *query]
+        ret = self._array2d(interface, {**parameters, 'elements': ','.join(query)}, **kwargs)
+        if ret.request.errorCode != 0:
+            raise Exception(ret.request.errorCode, ret.request.errorMessage)
+        data = self._table(ret)
+
+        def fetch(columns, ids):
+            """distinct station attributes at time of the query, all stations of datasource if ids is None"""
+            name = 'getSurfEleByTimeRange' if 'timeRange' in parameters else 'getSurfEleByTime'
+            params = {k: parameters[k] for k in ('dataCode', 'timeRange', 'times') if k in parameters}
+            params.update(elements=','.join([StationCache.key, *columns]), distinct='true')
+            if ids is not None:
+                name += 'AndStaID'
+                params['staIds'] = ','.join(ids)
+            meta = self._call_array2d(name, params)
+            if meta.request.errorCode != 0:
+                logger.error(f"request station attributes failed: {meta.request.errorMessage}")
+                raise Exception(meta.request.errorCode, meta.request.errorMessage)
+            return self._table(meta)
+
+        meta = self.station_cache.get(parameters['dataCode'], static, data[StationCache.key].values, fetch)
+        data = StationCache.join(data, meta, static)[elements]
+        if index_col is not None:
+            index_col = index_col.split(',')
+            data = data.set_index(index_col)
+        return data
+
     def _sel_upar(self, datasource: str, inittime: Union[str, slice, datetime] = None,
                   varname: str = None, **kwargs) -> pd.DataFrame:
         """sel upper data
@@ -544,10 +1767,17 @@ class DaasClient(DataQueryClient):
             limitCnt: max return records number
             orderBy: order key
             dataProvinceId: BABJ, BEHZ ...
+            split: split time range queries without limitCnt into sub-ranges fetched concurrently, True
+                (default) by estimated cost, int for budget of values (rows * elements) of one sub-query, False
+                to disable
+            split_jobs: number of concurrent sub-queries, default 4
+            cube: True (sparse backing if fill ratio is low), 'dense' or 'sparse', return (station, time, level)
+                dataset of numeric elements, static attributes as station coordinates
+            cube_level: element of level dimension in cube, default PRS_HWC
 
         Returns
         -------
-        data: pd.DataFrame
+        data: pd.DataFrame, xr.Dataset
             requested observation data
         """
         read_from_file = kwargs.pop('read_from_file', False)
@@ -604,13 +1834,13 @@ class DaasClient(DataQueryClient):
         for k in options:
             if k in kwargs:
                 parameters.update({k: kwargs.get(k)})
+        if kwargs.get('cube'):
+            kwargs['cube_level'] = kwargs.get('cube_level', 'PRS_HWC')
+            self._cube_elements(parameters, kwargs['cube_level'])
 
-        ret = self.callAPI_to_array2D(self._user, self._password, interface, parameters, )
+        ret = self._array2d(interface, parameters, **kwargs)
         if ret.request.errorCode == 0:
-            data = pd.DataFrame(ret.data, columns=list(ret.elementNames))
-            if kwargs.get('index_col') is not None:
-                data = data.set_index(kwargs.get('index_col').split(','))
-            return data
+            return self._table(ret, **kwargs)
         else:
             raise Exception(ret.request.errorCode, ret.request.errorMessage)
 
@@ -686,9 +1916,6 @@ class DaasClient(DataQueryClient):
 
         ret = self.callAPI_to_array2D(self._user, self._password, interface, parameters, )
         if ret.request.errorCode == 0:
-            data = pd.DataFrame(ret.data, columns=list(ret.elementNames))
-            if kwargs.get('index_col') is not None:
-                data = data.set_index(kwargs.get('index_col').split(','))
-            return data
+            return self._table(ret, **kwargs)
         else:
             raise Exception(ret.request.errorCode, ret.request.errorMessage)
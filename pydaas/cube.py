@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 16:50
+# @Last Modified by: wqshen
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from typing import Union
+from logzero import logger
+from pydaas.cache import StationCache
+
+try:
+    import sparse
+except ImportError:
+    sparse = None
+
+STATION, TIME = 'Station_Id_C', 'Datetime'
+
+
+def to_cube(data: pd.DataFrame, level: str = None, backing: Union[bool, str] = True,
+            fill_threshold: float = 0.3) -> xr.Dataset:
+    """build (station, time[, level]) cube from observation rows by integer-coded indexing
+
+    Parameters
+    ----------
+    data: pd.DataFrame
+        observation rows with Station_Id_C and Datetime elements
+    level: str
+        element of vertical level (e.g. PRS_HWC for upper air), default None without level dimension
+    backing: bool, str
+        'dense', 'sparse' or True (auto) for sparse COO backing when fill ratio is below `fill_threshold`
+        and the sparse package is installed
+    fill_threshold: float
+        fill ratio (rows / cells) below which auto backing is sparse
+
+    Returns
+    -------
+    xr.Dataset: numeric elements as variables, NaN for missing station/time pairs; static attributes
+        (Station_Name, Lat, Lon, Alti ...) as station coordinates
+    """
+    for key in (STATION, TIME, level):
+        if key is not None and key not in data.columns:
+            raise ValueError(f"cube requires element {key}")
+    if backing == 'sparse' and sparse is None:
+        raise ImportError("sparse cube requires sparse, install it by `pip install sparse`")
+
+    station_codes, stations = pd.factorize(data[STATION], sort=True)
+    time_codes, times = pd.factorize(pd.to_datetime(data[TIME]), sort=True)
+    dims, codes, coords = ['station', 'time'], [station_codes, time_codes], {'station': np.asarray(stations),
+                                                                               'time': times}
+    if level is not None:
+        level_codes, levels = pd.factorize(pd.to_numeric(data[level], errors='coerce'), sort=True)
+        dims.append('level')
+        codes.append(level_codes)
+        coords['level'] = np.asarray(levels)
+    shape = tuple(len(coords[d]) for d in dims)
+    valid = np.flatnonzero(np.all([c >= 0 for c in codes], axis=0))
+    # duplicated station/time/level rows, the last one wins
+    cells = np.ravel_multi_index([c[valid] for c in codes], shape)
+    last = len(cells) - 1 - np.unique(cells[::-1], return_index=True)[1]
+    keep = valid[np.sort(last)]
+    codes = [c[keep] for c in codes]
+    data = data.iloc[keep]
+
+    fill_ratio = len(data) / max(int(np.prod(shape)), 1)
+    use_sparse = backing == 'sparse' or (backing is True and sparse is not None and fill_ratio < fill_threshold)
+    logger.debug(f"cube {dict(zip(dims, shape))}, fill ratio {fill_ratio:.3f}, {'sparse' if use_sparse else 'dense'}")
+
+    present, first = np.unique(codes[0], return_index=True)
+    for name in data.columns:
+        if name in StationCache.static:
+            values = np.full(shape[0], None, dtype=object)
+            values[present] = data[name].values[first]
+            numeric = pd.to_numeric(values, errors='coerce')
+            coords[name] = ('station', values if np.isnan(numeric).all() else numeric)
+
+    variables = {}
+    for name in data.columns:
+        if name in (STATION, TIME, level) or name in StationCache.static:
+            continue
+        values = pd.to_numeric(data[name], errors='coerce').to_numpy(dtype='f8')
+        if np.isnan(values).all() and data[name].notna().any():
+            logger.debug(f"element {name} is not numeric, skipped in cube")
+            continue
+        if use_sparse:
+            array = sparse.COO(np.stack(codes), values, shape=shape, fill_value=np.nan, has_duplicates=False)
+        else:
+            array = np.full(shape, np.nan)
+            array[tuple(codes)] = values
+        variables[name] = (dims, array)
+    return xr.Dataset(variables, coords=coords)
@@ -6,14 +6,21 @@
 
 import os
 import sys
+import json
+import time
 import argparse
 import logzero
 import pandas as pd
 import xarray as xr
 from typing import Union
 from logzero import logger
-from datetime import datetime
+from datetime import datetime, timedelta
 from pydaas import DaasClient
+from pydaas.arrow import ArrowStreamWriter, is_table
+from pydaas.workqueue import WorkQueue
+from pydaas.proxy import MusicProxy
+from pydaas.cache import ResponseCache, DEFAULT_CACHE_DIR
+from pydaas.writer import open_writer, CSVStreamWriter, COMPRESSIONS
 
 
 def typecast(string: str) -> Union[int, float, str]:
@@ -82,7 +89,301 @@ def time_parser(s: str) -> Union[slice, list]:
         return list(map(parse_t, s.split(',')))
 
 
+def _sync(argv: list = None):
+    """daas_dump sync, incrementally sync grid fields of a datasource into a local store"""
+    example_text = """Example:
+     # 同步欧洲中心细网格2023021900-2023021912逐12小时起报的0-72小时逐3小时500/850hPa温度和相对湿度到./archive，仅读取缺失的时次
+     daas_dump sync ECMWF_P 2023021900-2023021912-12h -f 0-73-3 -p 500,850 -v TEM,RHU --store ./archive -n 3
+
+     # 同步中国气象局全球模式地面温度，限定纬度为20-40N，经度为110-130E
+     daas_dump sync CMA_GFS 2023021912 -f 0-241-6 -v TEM --lat 20-40 --lon 110-130 --store ./archive
+     """
+    parser = argparse.ArgumentParser(prog='daas_dump sync', description='Daas Data Incremental Sync',
+                                     epilog=example_text, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('datasource', help='data source name')
+    parser.add_argument('inittime', help='model initial time list or range with freq', type=time_parser)
+    parser.add_argument('-f', '--fh', help='model forecast hour list or range with step', type=args_parser)
+    parser.add_argument('-v', '--varname', help='model variable names', type=args_parser)
+    parser.add_argument('-p', '--level', help='pressure level list', type=args_parser, default=0)
+    parser.add_argument('-x', '--lon', help='longitude range', type=args_parser)
+    parser.add_argument('-y', '--lat', help='latitude range', type=args_parser)
+    parser.add_argument('--store', help='root directory of local stores', type=str, required=True)
+    parser.add_argument('-u', '--user', type=str, help='User name')
+    parser.add_argument('-s', '--password', type=str, help='password')
+    parser.add_argument('-n', '--njobs', type=int, help='parallel thread numbers', default=1,
+                        choices=range(1, 9))
+    parser.add_argument('-o', '--loglevel', type=int, help='logger level', default=20,
+                        choices=range(10, 51, 10))
+    args = parser.parse_args(argv)
+    logzero.loglevel(args.loglevel)
+    if isinstance(args.inittime, slice) or isinstance(args.fh, slice):
+        parser.error("inittime and fh should be list or range with freq/step, e.g. 2023021900-2023021912-12h, 0-73-3")
+
+    extra_kwargs = dict()
+    if args.lon is not None:
+        extra_kwargs['lon'] = args.lon
+    if args.lat is not None:
+        extra_kwargs['lat'] = args.lat
+
+    with DaasClient(args.user, args.password) as mc:
+        mc.n_jobs = args.njobs
+        summary = mc.sync(args.datasource, args.store, args.inittime, args.fh, args.varname, args.level,
+                          **extra_kwargs)
+    if summary['failed'] > 0:
+        sys.exit(1)
+
+
+def _watch(argv: list = None):
+    """daas_dump watch, fetch lead times of a model run into a local store as soon as they are published"""
+    example_text = """Example:
+     # 监视中国气象局中尺度模式最新起报时次，0-36小时逐小时地面降水一经发布即读取到./archive，全部到达后结束
+     daas_dump watch CMA_MESO -f 0-37-1 -v TPE --store ./archive -n 4
+
+     # 监视指定起报时次，轮询间隔30秒到10分钟，1小时无新时效到达后结束
+     daas_dump watch CMA_SH3 -i 2023060500 -v TPE --store ./archive --interval 30 --max-interval 600 --timeout 3600
+     """
+    parser = argparse.ArgumentParser(prog='daas_dump watch', description='Daas Data Watch',
+                                     epilog=example_text, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('datasource', help='data source name')
+    parser.add_argument('-i', '--inittime', help='model initial time, default latest published run', type=time_parser)
+    parser.add_argument('-f', '--fh', help='model forecast hour list or range with step', type=args_parser)
+    parser.add_argument('-v', '--varname', help='model variable names', type=args_parser, required=True)
+    parser.add_argument('-p', '--level', help='pressure level list', type=args_parser, default=0)
+    parser.add_argument('-x', '--lon', help='longitude range', type=args_parser)
+    parser.add_argument('-y', '--lat', help='latitude range', type=args_parser)
+    parser.add_argument('--store', help='root directory of local stores', type=str, required=True)
+    parser.add_argument('--interval', help='minimum seconds between polls', type=float, default=60.)
+    parser.add_argument('--max-interval', help='maximum seconds between polls', type=float, default=900.)
+    parser.add_argument('--timeout', help='seconds without new lead time before end', type=float, default=10800.)
+    parser.add_argument('--cycle', help='hours between runs to find the latest run', type=int, default=6)
+    parser.add_argument('--max-attempts', help='fetches of a published lead time before giving up', type=int,
+                        default=3)
+    parser.add_argument('-u', '--user', type=str, help='User name')
+    parser.add_argument('-s', '--password', type=str, help='password')
+    parser.add_argument('-n', '--njobs', type=int, help='parallel thread numbers', default=1,
+                        choices=range(1, 9))
+    parser.add_argument('-o', '--loglevel', type=int, help='logger level', default=20,
+                        choices=range(10, 51, 10))
+    args = parser.parse_args(argv)
+    logzero.loglevel(args.loglevel)
+    if isinstance(args.inittime, slice) or (args.inittime is not None and len(args.inittime) > 1) \
+            or isinstance(args.fh, slice):
+        parser.error("inittime should be a single time and fh list or range with step, e.g. 2023060500, 0-37-1")
+    inittime = args.inittime[0] if args.inittime is not None else None
+
+    extra_kwargs = dict()
+    if args.lon is not None:
+        extra_kwargs['lon'] = args.lon
+    if args.lat is not None:
+        extra_kwargs['lat'] = args.lat
+
+    with DaasClient(args.user, args.password, availability=True) as mc:
+        mc.n_jobs = args.njobs
+        summary = mc.watch(args.datasource, args.varname, args.store, inittime, args.fh, args.level,
+                           interval=args.interval, max_interval=args.max_interval, timeout=args.timeout,
+                           cycle=args.cycle, max_attempts=args.max_attempts, **extra_kwargs)
+    if summary['missing']:
+        sys.exit(1)
+
+
+def size_parser(s: str) -> int:
+    """parse byte size with optional K/M/G/T suffix, e.g. 512M, 2G"""
+    units = dict(K=1 << 10, M=1 << 20, G=1 << 30, T=1 << 40)
+    s = s.strip().upper().rstrip('B')
+    if s and s[-1] in units:
+        return int(float(s[:-1]) * units[s[-1]])
+    return int(s)
+
+
+def _warm(argv: list = None):
+    """daas_dump warm, replay recorded request patterns for the newest run into the response cache"""
+    example_text = """Example:
+     # 按最近7天记录中请求次数最多的200个请求，为欧洲中心细网格最新起报时次预热响应缓存，读取不超过2G
+     daas_dump warm -d ECMWF_P --top 200 --budget 2G -n 4
+
+     # 按最近请求顺序为所有记录的模式数据预热指定起报时次
+     daas_dump warm -i 2023021912 --order recent
+     """
+    parser = argparse.ArgumentParser(prog='daas_dump warm', description='Daas Response Cache Warm',
+                                     epilog=example_text, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-d', '--datasource', help='data source name, default all recorded', type=str)
+    parser.add_argument('-i', '--inittime', help='model initial time, default latest published run', type=time_parser)
+    parser.add_argument('--recorder', help='workload recorder file, default <cache_dir>/workload.sqlite', type=str)
+    parser.add_argument('--cache-dir', help='directory of local caches, default ~/.cache/pydaas', type=str)
+    parser.add_argument('--top', help='number of request patterns', type=int, default=100)
+    parser.add_argument('--order', help='most frequent or most recent patterns first', default='frequent',
+                        choices=['frequent', 'recent'])
+    parser.add_argument('--since', help='days of records to look back', type=float, default=7.)
+    parser.add_argument('--budget', help='bytes of results to fetch, e.g. 512M, 2G', type=size_parser)
+    parser.add_argument('--cycle', help='hours between runs to find the latest run', type=int, default=6)
+    parser.add_argument('-u', '--user', type=str, help='User name')
+    parser.add_argument('-s', '--password', type=str, help='password')
+    parser.add_argument('-n', '--njobs', type=int, help='parallel thread numbers', default=1,
+                        choices=range(1, 9))
+    parser.add_argument('-o', '--loglevel', type=int, help='logger level', default=20,
+                        choices=range(10, 51, 10))
+    args = parser.parse_args(argv)
+    logzero.loglevel(args.loglevel)
+    if isinstance(args.inittime, slice) or (args.inittime is not None and len(args.inittime) > 1):
+        parser.error("inittime should be a single time, e.g. 2023021912")
+
+    with DaasClient(args.user, args.password, cache_dir=args.cache_dir, response_cache=True,
+                    recorder=args.recorder or True) as mc:
+        mc.n_jobs = args.njobs
+        mc.warm(args.datasource, args.inittime[0] if args.inittime is not None else None, args.top, args.order,
+                args.budget, args.since * 86400., args.cycle)
+
+
+EXTRA_ARGS = ['index_col', 'staLevels', 'eleValueRanges', 'limitCnt', 'orderBy', 'dataProvinceId',
+              'statEleValueRanges', 'hourSeparate', 'minSeparate', 'distinct', 'adminCodes',
+              'reportCenters', 'typhNames', 'typhCIds', 'typhGIds']
+
+
+def _request_kwargs(args: argparse.Namespace) -> dict:
+    """kwargs of `sel` from lon/lat/level/staIds and extra arguments"""
+    extra_kwargs = dict()
+    if args.lon is not None:
+        extra_kwargs['lon'] = args.lon
+    if args.lat is not None:
+        extra_kwargs['lat'] = args.lat
+    if args.level is not None:
+        extra_kwargs['level'] = args.level
+    if args.staIds is not None:
+        extra_kwargs['staIds'] = args.staIds
+    for a in EXTRA_ARGS:
+        if getattr(args, a) is not None:
+            extra_kwargs[a] = getattr(args, a)
+    return extra_kwargs
+
+
+def _varname(mc: DaasClient, datasource: Union[str, list], varname):
+    """elements of station observations are requested together as columns of one table, not one by one"""
+    if not isinstance(varname, list) or not all(isinstance(v, str) for v in varname):
+        return varname
+    codes = [mc.alias.get(d, d) for d in ([datasource] if isinstance(datasource, str) else datasource)]
+    if all(c.split('_')[0] in ('SURF', 'UPAR', 'SEVP') and not c.startswith('SURF_CMPA') for c in codes):
+        return ','.join(varname)
+    return varname
+
+
+def _queue(argv: list = None):
+    """daas_dump queue, distribute requests of a job to workers on many nodes by a shared work queue"""
+    example_text = """Example:
+     # 将2022年逐小时降水观测请求写入共享文件系统上的任务队列
+     daas_dump queue submit /share/pre.queue SURFACE 2022010100-2022123123-1h -v Station_Id_C,Datetime,PRE_1H
+
+     # 在各节点上启动工作进程，领取请求并将结果写入共享的断点目录
+     daas_dump queue work /share/pre.queue --store /share/pre.ckpt -n 3
+
+     # 每分钟报告进度和吞吐量，直到全部完成
+     daas_dump queue status /share/pre.queue --interval 60
+
+     # 全部完成后以相同参数从断点目录组装结果
+     daas_dump SURFACE 2022010100-2022123123-1h -v Station_Id_C,Datetime,PRE_1H --checkpoint /share/pre.ckpt -e pre.parquet
+     """
+    parser = argparse.ArgumentParser(prog='daas_dump queue', description='Daas Distributed Work Queue',
+                                     epilog=example_text, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('action', choices=['submit', 'work', 'status'],
+                        help='submit requests, run a worker or report progress')
+    parser.add_argument('queue', help='SQLite file of queue on shared filesystem')
+    parser.add_argument('datasource', nargs='?', help='data source name, for submit')
+    parser.add_argument('inittime', nargs='?', help='model initial time or observation time, for submit',
+                        type=time_parser)
+    parser.add_argument('-f', '--fh', help='model forecast hour', type=args_parser)
+    parser.add_argument('--leadtime', help='model leadtime', type=time_parser)
+    parser.add_argument('-v', '--varname', help='model variable names', type=args_parser)
+    parser.add_argument('-x', '--lon', help='longitude point or range', type=args_parser)
+    parser.add_argument('-y', '--lat', help='latitude point or range', type=args_parser)
+    parser.add_argument('-p', '--level', help='pressure level point or range', type=int)
+    parser.add_argument('-l', '--staIds', help='Station Ids', type=str)
+    for a in EXTRA_ARGS:
+        parser.add_argument(f"--{a}", help=f'extra kwargs {a}', type=str)
+    parser.add_argument('--store', help='directory of results shared by workers, for work', type=str)
+    parser.add_argument('--worker', help='worker name, default host:pid', type=str)
+    parser.add_argument('--batch', help='requests claimed at once, default 2 * njobs', type=int)
+    parser.add_argument('--lease', help='seconds of lease of claimed requests', type=float, default=600.)
+    parser.add_argument('--interval', help='seconds between progress reports, 0 for once', type=float, default=0)
+    parser.add_argument('-u', '--user', type=str, help='User name')
+    parser.add_argument('-s', '--password', type=str, help='password')
+    parser.add_argument('-n', '--njobs', type=int, help='parallel thread numbers', default=1,
+                        choices=range(1, 9))
+    parser.add_argument('-o', '--loglevel', type=int, help='logger level', default=20,
+                        choices=range(10, 51, 10))
+    args = parser.parse_args(argv)
+    logzero.loglevel(args.loglevel)
+
+    queue = WorkQueue(args.queue, lease=args.lease)
+    if args.action == 'status':
+        while True:
+            p = queue.progress()
+            eta = '-' if p['eta'] is None else str(timedelta(seconds=int(p['eta'])))
+            logger.info(f"{p['done']}/{p['total']} done, {p['failed']} failed, {p['retrying']} retrying, "
+                        f"{p['leased']} leased by {p['workers']} workers, {p['rate'] * 60:.1f} requests/min, "
+                        f"{p['throughput'] / 2 ** 20:.2f} MB/s, {p['nbytes'] / 2 ** 20:.1f} MB, eta {eta}")
+            if args.interval <= 0 or queue.finished():
+                return
+            time.sleep(args.interval)
+
+    with DaasClient(args.user, args.password) as mc:
+        mc.n_jobs = args.njobs
+        if args.action == 'submit':
+            if args.datasource is None or args.inittime is None:
+                parser.error("datasource and inittime are required by submit")
+            mc.submit(queue, args.datasource, args.inittime, args.fh, _varname(mc, args.datasource, args.varname),
+                      args.leadtime, **_request_kwargs(args))
+        else:
+            if args.store is None:
+                parser.error("--store is required by work")
+            summary = mc.work(queue, args.store, args.worker, args.batch)
+            if summary['failed']:
+                sys.exit(1)
+
+
+def _proxy(argv: list = None):
+    """daas_dump proxy, local caching proxy of MUSIC shared by processes on one host"""
+    example_text = """Example:
+     # 在本机8765端口启动代理，最多8个并发上游请求，响应缓存上限4G，客户端配置 music_server=127.0.0.1 music_port=8765
+     daas_dump proxy --port 8765 --max-upstream 8 --cache-size 4G
+     """
+    parser = argparse.ArgumentParser(prog='daas_dump proxy', description='Daas Local Caching Proxy',
+                                     epilog=example_text, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', help='listen address', type=str, default='127.0.0.1')
+    parser.add_argument('--port', help='listen port', type=int, default=8765)
+    parser.add_argument('--server', help='upstream MUSIC server, default music_server of client.config', type=str)
+    parser.add_argument('--server-port', help='upstream MUSIC port, default music_port of client.config', type=int)
+    parser.add_argument('--max-upstream', help='upstream requests at the same time', type=int, default=8)
+    parser.add_argument('--cache-dir', help='directory of local caches, default ~/.cache/pydaas', type=str)
+    parser.add_argument('--cache-size', help='bytes of response cache, e.g. 512M, 2G', type=size_parser,
+                        default=2 << 30)
+    parser.add_argument('--ttl', help='hours before cached response expires', type=float, default=6.)
+    parser.add_argument('--no-cache', action='store_true', help='only coalesce requests, without response cache')
+    parser.add_argument('-u', '--user', type=str, help='User name whose requests are cached')
+    parser.add_argument('-s', '--password', type=str, help='password')
+    parser.add_argument('-o', '--loglevel', type=int, help='logger level', default=20,
+                        choices=range(10, 51, 10))
+    args = parser.parse_args(argv)
+    logzero.loglevel(args.loglevel)
+
+    cache = None if args.no_cache else \
+        ResponseCache(args.cache_size, args.ttl * 3600., os.path.join(args.cache_dir or DEFAULT_CACHE_DIR, 'proxy'))
+    users = {args.user: args.password} if args.user is not None else None
+    proxy = MusicProxy(users, args.max_upstream, cache, server=args.server, port=args.server_port)
+    proxy.serve(args.host, args.port)
+
+
+_commands = {
+    'sync': _sync,
+    'watch': _watch,
+    'warm': _warm,
+    'queue': _queue,
+    'proxy': _proxy,
+}
+
+
 def _main():
+    if len(sys.argv) > 1 and sys.argv[1] in _commands:
+        return _commands[sys.argv[1]](sys.argv[2:])
+
     example_text = """Example:
      # 读取欧洲中心细网格2023021912起报的预报时效为24小时的500hPa相对湿度，并保存为ECMWF.2023021912.024.RHU.500.nc文件
      daas_dump ECMWF_P 2023021912 -f 24 --level 500 -v RHU --outfile ./ECMWF.2023021912.024.RHU.500.nc
@@ -112,6 +413,12 @@ def _main():
      
      # 读取2023072612-2023072912的杜苏芮台风（DOKSURI）路径预报
      daas_dump SEVP_ZJ_WEFC_TYP_WT 2023072612-2023072912 -v Datetime,TYPH_Name,V_CHN_NAME,Num_Nati,Bul_Center,Lat,Lon,PRS,Validtime --reportCenters BABJ --typhNames DOKSURI 
+
+     # 逐时次读取一年的逐小时降水观测并记录断点，中断后以相同命令重新运行时跳过已完成的请求
+     daas_dump SURFACE 2022010100-2022123123-1h -v Station_Id_C,Datetime,PRE_1H --checkpoint ./ckpt -n 3 -e ./pre.parquet
+
+     # 增量同步模式数据到本地存储，详见 daas_dump sync -h
+     daas_dump sync ECMWF_P 2023021900-2023021912-12h -f 0-73-3 -p 500,850 -v TEM,RHU --store ./archive
      """
 
     parser = argparse.ArgumentParser(description='Daas Data Dumper', epilog=example_text,
@@ -123,6 +430,19 @@ def _main():
     parser.add_argument('-e', '--outfile', type=str, help='output netcdf file name')
     parser.add_argument('-c', '--complevel', type=int, help='output netcdf4 compress level',
                         default=5, choices=range(10))
+    parser.add_argument('--compression', type=str, help='output compression codec, zstd and blosc_* need '
+                        'netcdf-c filter plugins for netcdf or numcodecs for zarr', default='zlib',
+                        choices=COMPRESSIONS)
+    parser.add_argument('--no-shuffle', action='store_true', help='disable shuffle filter')
+    parser.add_argument('--lsd', type=int, help='least significant digit, quantize values before compress')
+    parser.add_argument('--pack', action='store_true', help='pack values into int16 with scale_factor/add_offset')
+    parser.add_argument('--pack-range', type=float, nargs=2, metavar=('MIN', 'MAX'),
+                        help='value range of packed variables, default valid_min/valid_max attributes')
+    parser.add_argument('--chunks', type=str, help='chunk shape for map or time series access', default='map',
+                        choices=('map', 'series'))
+    parser.add_argument('--threads', type=int, help='compress threads of zarr output', default=4)
+    parser.add_argument('--partition', type=str, help='partition parquet/arrow output of observations',
+                        choices=('date', 'station'))
     parser.add_argument('-v', '--varname', help='model variable names', type=args_parser)
     parser.add_argument('-x', '--lon', help='longitude point or range', type=args_parser)
     parser.add_argument('-y', '--lat', help='latitude point or range', type=args_parser)
@@ -132,17 +452,18 @@ def _main():
     parser.add_argument('-t', '--offset-inittime', help='offset inittime (hours) to variable',
                         type=str)
     parser.add_argument('--name_map', help='map variable name to new', type=args_parser)
+    parser.add_argument('--checkpoint', help='directory of checkpoint journal, rerun skips completed requests',
+                        type=str)
+    parser.add_argument('--metrics', help='write request timing metrics, .json for JSON, else Prometheus text',
+                        type=str)
     parser.add_argument('-u', '--user', type=str, help='User name')
     parser.add_argument('-s', '--password', type=str, help='password')
     parser.add_argument('-n', '--njobs', type=int, help='parallel thread numbers', default=1,
-                        choices=range(4))
+                        choices=range(1, 9))
     parser.add_argument('-o', '--loglevel', type=int, help='logger level', default=20,
                         choices=range(10, 51, 10))
 
-    extra_args = ['index_col', 'staLevels', 'eleValueRanges', 'limitCnt', 'orderBy', 'dataProvinceId',
-                  'statEleValueRanges', 'hourSeparate', 'minSeparate', 'distinct', 'adminCodes',
-                  'reportCenters', 'typhNames', 'typhCIds', 'typhGIds']
-    for a in extra_args:
+    for a in EXTRA_ARGS:
         parser.add_argument(f"--{a}", help=f'extra kwargs {a}', type=str)
 
     if len(sys.argv) == 1:
@@ -153,49 +474,101 @@ def _main():
     logzero.loglevel(args.loglevel)
     logger.debug(args)
 
-    extra_kwargs = dict()
-    if args.lon is not None:
-        extra_kwargs['lon'] = args.lon
-    if args.lat is not None:
-        extra_kwargs['lat'] = args.lat
-    if args.level is not None:
-        extra_kwargs['level'] = args.level
-    if args.staIds is not None:
-        extra_kwargs['staIds'] = args.staIds
+    extra_kwargs = _request_kwargs(args)
     if args.download is not None:
         extra_kwargs['download'] = args.download
-    for a in extra_args:
-        if getattr(args, a) is not None:
-            extra_kwargs[a] = getattr(args, a)
+    if args.checkpoint is not None:
+        extra_kwargs['checkpoint'] = args.checkpoint
 
-    with DaasClient(args.user, args.password) as mc:
-        mc.njobs = args.njobs
+    with DaasClient(args.user, args.password, metrics=args.metrics is not None) as mc:
+        mc.n_jobs = args.njobs
+        args.varname = _varname(mc, args.datasource, args.varname)
         logger.debug(f"{args.datasource}, {args.inittime}, {args.fh}, {args.varname}, {extra_kwargs}")
-        dataset = mc.sel(args.datasource, args.inittime, args.fh, args.varname, args.leadtime,
-                         merge=True, **extra_kwargs)
-        logger.debug(dataset)
+        try:
+            if args.outfile is not None:
+                _dump(mc, args, extra_kwargs)
+                return
+            dataset = mc.sel(args.datasource, args.inittime, args.fh, args.varname, args.leadtime,
+                             merge=True, **extra_kwargs)
+            logger.debug(dataset)
+            dataset = _postprocess(dataset, args)
+        finally:
+            if args.metrics is not None:
+                _write_metrics(mc.metrics, args.metrics)
 
-        if args.offset_inittime is not None:
-            dataset['time'] = pd.to_datetime(dataset.time.values) + pd.to_timedelta(
-                args.offset_inittime)
+    logger.info(f"-------------\n{dataset}")
 
-        if args.name_map is not None:
-            dataset = dataset.rename({args.name_map[0]: args.name_map[1]})
 
-    logger.info(f"-------------\n{dataset}")
-    if args.outfile is not None:
-        _, file_extension = os.path.splitext(args.outfile)
-        if file_extension in ('.nc', '.nc4') and isinstance(dataset, xr.Dataset):
-            comp = dict(zlib=True, complevel=args.complevel, dtype='f4')
-            encoding = {var: comp for var in [*dataset.data_vars, 'lon', 'lat']}
-            dataset.to_netcdf(args.outfile, encoding=encoding)
-        elif file_extension in ('.txt', '.csv'):
-            if isinstance(dataset, xr.DataArray):
-                dataset.to_dataframe().to_csv(args.outfile)
-            else:
-                dataset.to_csv(args.outfile)
+def _write_metrics(metrics, path: str):
+    """write metrics of requests as JSON (.json) or Prometheus text (node exporter textfile collector)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            json.dump(metrics.to_json(), f, indent=1)
         else:
-            raise NotImplementedError("Only support nc, nc4, txt, csv extentsion.")
+            f.write(metrics.to_prometheus())
+    logger.info(f"write request metrics into {path}")
+
+
+def _postprocess(data: Union[xr.DataArray, xr.Dataset, pd.DataFrame], args: argparse.Namespace):
+    """offset time and rename variable of results"""
+    if args.offset_inittime is not None:
+        data['time'] = pd.to_datetime(data.time.values) + pd.to_timedelta(args.offset_inittime)
+
+    if args.name_map is not None:
+        if isinstance(data, xr.DataArray):
+            data = data.rename(args.name_map[1]) if data.name == args.name_map[0] else data
+        elif is_table(data):
+            data = data.rename_columns([args.name_map[1] if n == args.name_map[0] else n for n in data.column_names])
+        else:
+            data = data.rename({args.name_map[0]: args.name_map[1]})
+    return data
+
+
+def _planned_times(inittime, fh, leadtime) -> tuple:
+    """planned times and time index of output, (None, 'time') if they are unknown before requests"""
+    inittime = [inittime] if isinstance(inittime, datetime) else inittime
+    fh = [fh] if isinstance(fh, int) else fh
+    if not isinstance(inittime, list) or not all(isinstance(i, datetime) for i in inittime):
+        return None, 'time'
+    if leadtime is not None:
+        return (inittime, 'inittime') if len(inittime) > 1 else (None, 'time')
+    if isinstance(fh, list) and all(isinstance(f, int) for f in fh):
+        times = [i + timedelta(hours=f) for i in inittime for f in fh]
+        if len(set(times)) < len(times):
+            raise ValueError("forecasts of different inittime/fh share valid times, they can't be written into "
+                             "one time dimension, dump one inittime or use --leadtime")
+        return sorted(times), 'time'
+    return None, 'time'
+
+
+def _dump(mc: DaasClient, args: argparse.Namespace, extra_kwargs: dict):
+    """stream results into output file as they arrive, instead of merging all results in memory"""
+    times, time_index = _planned_times(args.inittime, args.fh, args.leadtime)
+    if times is not None and time_index == 'time' and args.offset_inittime is not None:
+        times = [t + pd.to_timedelta(args.offset_inittime) for t in times]
+    encoding = dict(compression=args.compression, complevel=args.complevel, shuffle=not args.no_shuffle,
+                    least_significant_digit=args.lsd, pack=tuple(args.pack_range) if args.pack_range else args.pack,
+                    chunks=args.chunks, threads=args.threads)
+    if args.outfile.endswith(('.parquet', '.arrow')):
+        # results are typed by the writer, so that requests (and keys of checkpoint) do not depend on output
+        encoding = dict(partition=args.partition)
+    with open_writer(args.outfile, times=times, time_index=time_index, **encoding) as writer:
+        # rows of table outputs are written in order of requests
+        for request, data in mc.sel_iter(args.datasource, args.inittime, args.fh, args.varname, args.leadtime,
+                                         ordered=isinstance(writer, (CSVStreamWriter, ArrowStreamWriter)),
+                                         **extra_kwargs):
+            logger.debug(f"write {request}")
+            writer.write(_postprocess(data, args))
+    if isinstance(writer, (CSVStreamWriter, ArrowStreamWriter)):
+        logger.info(f"-------------\nwrite {writer.rows} rows into {args.outfile}")
+        return
+
+    with (xr.open_zarr(args.outfile) if args.outfile.rstrip('/').endswith('.zarr')
+          else xr.open_dataset(args.outfile)) as dataset:
+        logger.info(f"-------------\n{dataset}")
+    r = writer.report()
+    logger.info(f"{r['fields']} fields, {r['raw_bytes'] / 2 ** 20:.1f} MB raw -> {r['bytes'] / 2 ** 20:.1f} MB "
+                f"on disk (ratio {r['ratio']:.1f}), write {r['write_time']:.1f}s of total {r['total_time']:.1f}s")
 
 
 if __name__ == '__main__':
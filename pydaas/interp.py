@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 10:05
+# @Last Modified by: wqshen
+
+import hashlib
+import threading
+import numpy as np
+import xarray as xr
+from typing import Union
+from collections import OrderedDict
+
+
+def _axis_weights(coord: np.ndarray, x: np.ndarray) -> tuple:
+    """neighbour indexes and weight of the right neighbour along a monotonic axis
+
+    Parameters
+    ----------
+    coord: np.ndarray
+        monotonic (ascending or descending) coordinate
+    x: np.ndarray
+        target positions
+
+    Returns
+    -------
+    (np.ndarray, np.ndarray, np.ndarray, np.ndarray): left index, right index, right weight, inside mask
+    """
+    coord = np.asarray(coord, dtype='f8')
+    n = coord.size
+    descending = n > 1 and coord[0] > coord[-1]
+    c = coord[::-1] if descending else coord
+    i0 = np.clip(np.searchsorted(c, x, side='right') - 1, 0, max(n - 2, 0))
+    i1 = np.minimum(i0 + 1, n - 1)
+    if n > 1:
+        w = np.clip((x - c[i0]) / (c[i1] - c[i0]), 0., 1.)
+    else:
+        w = np.zeros_like(x)
+    inside = (x >= c[0] - 1e-6) & (x <= c[-1] + 1e-6)
+    if descending:
+        i0, i1 = n - 1 - i0, n - 1 - i1
+    return i0, i1, w, inside
+
+
+class PointInterpolator(object):
+    """Interpolate rectilinear lat/lon grid to points by precomputed indexes and weights
+
+    Indexes and weights only depend on the grid definition and the point set, they are computed once
+    and applied as one gather over all leading dimensions (time, fh, level, member ...) of the field.
+    """
+    methods = ('nearest', 'bilinear')
+    _cache = OrderedDict()
+    _cache_lock = threading.Lock()
+    cache_size = 64
+
+    def __init__(self, grid_lat: np.ndarray, grid_lon: np.ndarray, lat: np.ndarray, lon: np.ndarray,
+                 method: str = 'bilinear'):
+        """PointInterpolator
+
+        Parameters
+        ----------
+        grid_lat: np.ndarray
+            latitude of grid
+        grid_lon: np.ndarray
+            longitude of grid
+        lat: np.ndarray
+            latitude of points
+        lon: np.ndarray
+            longitude of points
+        method: str
+            nearest or bilinear
+        """
+        if method not in self.methods:
+            raise NotImplementedError(f"interpolation method {method}, only support {self.methods}")
+        self.method = method
+        self.lat, self.lon = np.atleast_1d(lat).astype('f8'), np.atleast_1d(lon).astype('f8')
+        self.shape = (np.size(grid_lat), np.size(grid_lon))
+        nx = self.shape[1]
+
+        y0, y1, wy, inside_y = _axis_weights(grid_lat, self.lat)
+        x0, x1, wx, inside_x = _axis_weights(grid_lon, self.lon)
+        if method == 'nearest':
+            iy, ix = np.where(wy < 0.5, y0, y1), np.where(wx < 0.5, x0, x1)
+            self.index = (iy * nx + ix)[:, None]
+            self.weight = np.ones_like(self.index, dtype='f8')
+        else:
+            self.index = np.stack([y0 * nx + x0, y0 * nx + x1, y1 * nx + x0, y1 * nx + x1], axis=-1)
+            self.weight = np.stack([(1 - wy) * (1 - wx), (1 - wy) * wx, wy * (1 - wx), wy * wx], axis=-1)
+        self.inside = inside_y & inside_x
+
+    @staticmethod
+    def grid_key(grid_lat: np.ndarray, grid_lon: np.ndarray) -> tuple:
+        """hashable definition of a rectilinear grid"""
+        return tuple(round(float(v), 6) for c in (grid_lat, grid_lon) for v in (c[0], c[-1])) + \
+            (np.size(grid_lat), np.size(grid_lon))
+
+    @classmethod
+    def cached(cls, grid_lat: np.ndarray, grid_lon: np.ndarray, lat: np.ndarray, lon: np.ndarray,
+               method: str = 'bilinear') -> 'PointInterpolator':
+        """get interpolator of (grid definition, point set, method) from cache, create it if not exists"""
+        points = np.ascontiguousarray([np.atleast_1d(lat), np.atleast_1d(lon)], dtype='f8')
+        key = (cls.grid_key(grid_lat, grid_lon), hashlib.sha1(points.tobytes()).hexdigest(), method)
+        with cls._cache_lock:
+            interpolator = cls._cache.get(key)
+            if interpolator is not None:
+                cls._cache.move_to_end(key)
+                return interpolator
+        interpolator = cls(grid_lat, grid_lon, points[0], points[1], method)
+        with cls._cache_lock:
+            cls._cache[key] = interpolator
+            while len(cls._cache) > cls.cache_size:
+                cls._cache.popitem(last=False)
+        return interpolator
+
+    def __call__(self, data: xr.DataArray) -> xr.DataArray:
+        """interpolate field to points
+
+        Parameters
+        ----------
+        data: xr.DataArray
+            field with lat and lon dimensions, other dimensions are kept
+
+        Returns
+        -------
+        xr.DataArray: field with lat/lon dimensions replaced by station dimension
+        """
+        data = data.transpose(..., 'lat', 'lon')
+        lead = data.shape[:-2]
+        flat = data.values.reshape(-1, self.shape[0] * self.shape[1])
+        values = flat[:, self.index]
+        values = np.where(self.weight > 0, values * self.weight, 0.).sum(axis=-1)
+        values[:, ~self.inside] = np.nan
+        coords = {k: v for k, v in data.coords.items() if 'lat' not in v.dims and 'lon' not in v.dims}
+        coords.update({'station': np.arange(self.lat.size),
+                       'lat': ('station', self.lat),
+                       'lon': ('station', self.lon)})
+        return xr.DataArray(values.reshape(*lead, self.lat.size), dims=(*data.dims[:-2], 'station'),
+                            coords=coords, name=data.name, attrs=data.attrs)
+
+
+def interp_points(data: Union[xr.DataArray, xr.Dataset, list], lat: Union[float, list], lon: Union[float, list],
+                  method: str = 'bilinear') -> Union[xr.DataArray, xr.Dataset, list]:
+    """interpolate grid fields to points locally
+
+    Parameters
+    ----------
+    data: xr.DataArray, xr.Dataset, list
+        grid fields with lat and lon dimensions
+    lat: float, list
+        latitude of points
+    lon: float, list
+        longitude of points
+    method: str
+        nearest or bilinear
+
+    Returns
+    -------
+    (xr.DataArray, xr.Dataset, list): fields at points with station dimension
+    """
+    if isinstance(data, list):
+        return [interp_points(d, lat, lon, method) for d in data]
+    if data is None:
+        return data
+    if not isinstance(data, (xr.DataArray, xr.Dataset)) or 'lat' not in data.dims or 'lon' not in data.dims:
+        raise NotImplementedError(f"interp only supports grid fields with lat and lon dimensions, got {type(data)}")
+    interpolator = PointInterpolator.cached(data.lat.values, data.lon.values, lat, lon, method)
+    if isinstance(data, xr.Dataset):
+        return interpolator(data.to_array('variable')).to_dataset('variable')
+    return interpolator(data)
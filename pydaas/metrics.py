@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 23:50
+# @Last Modified by: wqshen
+
+import time
+import json
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Callable
+from logzero import logger
+
+# upper bounds of histogram buckets, seconds by default, bytes and rows for sizes
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1., 2.5, 5., 10., 30., 60., 120., 300.)
+SIZE_BUCKETS = {
+    'response_bytes': (1 << 10, 1 << 13, 1 << 16, 1 << 19, 1 << 22, 1 << 25, 1 << 28),
+    'response_rows': (1, 10, 100, 1000, 10000, 100000, 1000000),
+}
+# histograms of a call record: key of record -> metric name
+CALL_METRICS = (('namelookup', 'http_namelookup_seconds'), ('connect', 'http_connect_seconds'),
+                ('starttransfer', 'http_starttransfer_seconds'), ('total', 'http_total_seconds'),
+                ('server_take', 'server_take_seconds'), ('parse', 'parse_seconds'),
+                ('size_download', 'response_bytes'), ('rows', 'response_rows'))
+
+
+class Histogram(object):
+    """cumulative histogram of observations, as Prometheus histogram"""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """[(upper bound, observations <= bound), ...] with +Inf bound last"""
+        total, result = 0, []
+        for bound, n in zip(self.buckets + (float('inf'),), self.counts):
+            total += n
+            result.append((bound, total))
+        return result
+
+
+class MetricsRegistry(object):
+    """Histograms and counters of requests labelled by interface/dataCode/datasource, with hooks
+
+    Each MUSIC call is recorded as a dict (see `DaasClient.metrics`) of pycurl timings (namelookup, connect,
+    starttransfer, total seconds and size_download bytes), server reported takeTime and rowCount, and client
+    parse seconds. Records are observed into histograms and passed to hooks, e.g. to log slow calls or send
+    them to a tracing system.
+    """
+
+    def __init__(self, prefix: str = 'pydaas', buckets: tuple = BUCKETS):
+        """MetricsRegistry
+
+        Parameters
+        ----------
+        prefix: str
+            prefix of metric names
+        buckets: tuple
+            upper bounds of histogram buckets of durations in seconds
+        """
+        self.prefix = prefix
+        self.buckets = buckets
+        self.hooks = []
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook: Callable):
+        """call hook(record) with each record of `record`"""
+        self.hooks.append(hook)
+
+    def observe(self, name: str, value: float, **labels):
+        """observe value into histogram `name` of labels"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(SIZE_BUCKETS.get(name, self.buckets))
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """increase counter `name` of labels"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """observe seconds of the with block into histogram `name`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def record(self, record: dict):
+        """observe a MUSIC call record and pass it to hooks
+
+        Parameters
+        ----------
+        record: dict
+            method, interface, datacode, error_code and timings/sizes of CALL_METRICS keys
+        """
+        labels = dict(interface=record.get('interface', ''), datacode=record.get('datacode', ''))
+        self.inc('calls_total', error_code=str(record.get('error_code', 0)), **labels)
+        for key, name in CALL_METRICS:
+            if record.get(key) is not None:
+                self.observe(name, record[key], **labels)
+        for hook in self.hooks:
+            try:
+                hook(record)
+            except Exception as e:
+                logger.exception(f"metrics hook {hook} failed: {e}")
+
+    def to_json(self) -> dict:
+        """metrics as {name: [{labels, count, sum, buckets} or {labels, value}, ...]}"""
+        result = {}
+        with self._lock:
+            for (name, labels), h in sorted(self._histograms.items()):
+                result.setdefault(f"{self.prefix}_{name}", []).append(
+                    dict(labels=dict(labels), count=h.count, sum=h.sum,
+                         buckets={str(b): n for b, n in h.cumulative()}))
+            for (name, labels), value in sorted(self._counters.items()):
+                result.setdefault(f"{self.prefix}_{name}", []).append(dict(labels=dict(labels), value=value))
+        return result
+
+    def to_prometheus(self) -> str:
+        """metrics in Prometheus text exposition format"""
+        def format_labels(labels, **extra):
+            items = list(labels) + list(extra.items())
+            if not items:
+                return ''
+            return '{' + ','.join(f'{k}={json.dumps(str(v))}' for k, v in items) + '}'
+
+        lines, typed = [], set()
+        with self._lock:
+            for (name, labels), h in sorted(self._histograms.items()):
+                name = f"{self.prefix}_{name}"
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                for bound, n in h.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f"{name}_bucket{format_labels(labels, le=le)} {n}")
+                lines.append(f"{name}_sum{format_labels(labels)} {h.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {h.count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                name = f"{self.prefix}_{name}"
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
@@ -21,6 +21,7 @@ import time
 import uuid
 import socket
 import pycurl
+import threading
 import hashlib
 import configparser
 import urllib.request
@@ -33,6 +34,9 @@ from . import DataFormatUtils
 from .MusicDataBean import RetArray2D, RetGridArray2D, RetGridVector2D
 from .MusicDataBean import RetFilesInfo, RetDataBlock, RetGridScalar2D
 
+# 各线程最近一次请求的pycurl耗时信息
+_timing = threading.local()
+
 
 class DataQueryClient(object):
     """
@@ -44,7 +48,7 @@ class DataQueryClient(object):
     getwayFlag = "\"flag\":\"slb\""  # 网关返回错误标识
 
     def __init__(self, server=None, port=None, service_node_id=None, conn_timeout=None,
-                 read_timeout=None, config_file=None):
+                 read_timeout=None, config_file=None, max_url_length=None, post=None):
         """
         Constructor
         """
@@ -91,6 +95,17 @@ class DataQueryClient(object):
             if read_timeout.isdigit():
                 self.readTimeout = int(read_timeout)
 
+        # url最大长度，超过时以POST提交（网关支持时）或由调用方拆分请求
+        if max_url_length is None:
+            self.maxUrlLength = cf.getint("Pb", "music_maxUrlLength", fallback=8000)
+        else:
+            self.maxUrlLength = int(max_url_length)
+        # 网关是否支持POST表单形式的请求
+        if post is None:
+            self.post = cf.getboolean("Pb", "music_post", fallback=False)
+        else:
+            self.post = bool(post)
+
         # 本机IP
         self.clientIp = socket.gethostbyname(socket.gethostname())
         self.basicUrl = "http://%s:%s/music-ws/api?serviceNodeId=%s&"
@@ -109,15 +124,7 @@ class DataQueryClient(object):
         newUrl = self.getConcateUrl(userId, pwd, interfaceId, params, serverId, method)
         logger.debug('URL: ' + newUrl)
         try:
-            buf = BytesIO()
-            response = pycurl.Curl()
-            response.setopt(pycurl.URL, newUrl)
-            response.setopt(pycurl.CONNECTTIMEOUT, self.connTimeout)
-            response.setopt(pycurl.TIMEOUT, self.readTimeout)
-            response.setopt(pycurl.WRITEFUNCTION, buf.write)
-            # response.setopt(pycurl.WRITEDATA, value)
-            response.perform()
-            response.close()
+            buf = self._perform(newUrl)
         except Exception:  # http error
             logger.exception("Error retrieving data")
             retArray2D.request.errorCode = self.OTHER_ERROR
@@ -154,15 +161,7 @@ class DataQueryClient(object):
         newUrl = self.getConcateUrl(userId, pwd, interfaceId, params, serverId, method)
         logger.debug('URL: ' + newUrl)
         try:
-            buf = BytesIO()
-            response = pycurl.Curl()
-            response.setopt(pycurl.URL, newUrl)
-            response.setopt(pycurl.CONNECTTIMEOUT, self.connTimeout)
-            response.setopt(pycurl.TIMEOUT, self.readTimeout)
-            response.setopt(pycurl.WRITEFUNCTION, buf.write)
-            # response.setopt(pycurl.WRITEDATA, value)
-            response.perform()
-            response.close()
+            buf = self._perform(newUrl)
         except Exception:  # http error
             logger.exception("Error retrieving data")
             retDataBlock.request.errorCode = self.OTHER_ERROR
@@ -200,15 +199,7 @@ class DataQueryClient(object):
         newUrl = self.getConcateUrl(userId, pwd, interfaceId, params, serverId, method)
         logger.debug('URL: ' + newUrl)
         try:
-            buf = BytesIO()
-            response = pycurl.Curl()
-            response.setopt(pycurl.URL, newUrl)
-            response.setopt(pycurl.CONNECTTIMEOUT, self.connTimeout)
-            response.setopt(pycurl.TIMEOUT, self.readTimeout)
-            response.setopt(pycurl.WRITEFUNCTION, buf.write)
-            # response.setopt(pycurl.WRITEDATA, value)
-            response.perform()
-            response.close()
+            buf = self._perform(newUrl)
         except Exception:  # http error
             logger.exception("Error retrieving data")
             retGridArray2D.request.errorCode = self.OTHER_ERROR
@@ -246,15 +237,7 @@ class DataQueryClient(object):
         newUrl = self.getConcateUrl(userId, pwd, interfaceId, params, serverId, method)
         logger.debug('URL: ' + newUrl)
         try:
-            buf = BytesIO()
-            response = pycurl.Curl()
-            response.setopt(pycurl.URL, newUrl)
-            response.setopt(pycurl.CONNECTTIMEOUT, self.connTimeout)
-            response.setopt(pycurl.TIMEOUT, self.readTimeout)
-            response.setopt(pycurl.WRITEFUNCTION, buf.write)
-            # response.setopt(pycurl.WRITEDATA, value)
-            response.perform()
-            response.close()
+            buf = self._perform(newUrl)
         except Exception:  # http error
             logger.exception("Error retrieving data")
             retFilesInfo.request.errorCode = self.OTHER_ERROR
@@ -294,15 +277,7 @@ class DataQueryClient(object):
         newUrl = self.getConcateUrl(userId, pwd, interfaceId, params, serverId, method)
         logger.debug('URL: ' + newUrl)
         try:
-            buf = BytesIO()
-            response = pycurl.Curl()
-            response.setopt(pycurl.URL, newUrl)
-            response.setopt(pycurl.CONNECTTIMEOUT, self.connTimeout)
-            response.setopt(pycurl.TIMEOUT, self.readTimeout)
-            response.setopt(pycurl.WRITEFUNCTION, buf.write)
-            # response.setopt(pycurl.WRITEDATA, value)
-            response.perform()
-            response.close()
+            buf = self._perform(newUrl)
         except Exception:  # http error
             logger.exception("Error retrieving data")
             return "Error retrieving data"
@@ -342,15 +317,7 @@ class DataQueryClient(object):
         newUrl = self.getConcateUrl(userId, pwd, interfaceId, params, serverId, method)
         logger.debug('URL: ' + newUrl)
         try:
-            buf = BytesIO()
-            response = pycurl.Curl()
-            response.setopt(pycurl.URL, newUrl)
-            response.setopt(pycurl.CONNECTTIMEOUT, self.connTimeout)
-            response.setopt(pycurl.TIMEOUT, self.readTimeout)
-            response.setopt(pycurl.WRITEFUNCTION, buf.write)
-            # response.setopt(pycurl.WRITEDATA, value)
-            response.perform()
-            response.close()
+            buf = self._perform(newUrl)
         except Exception:  # http error
             logger.exception("Error retrieving data")
             retFilesInfo.request.errorCode = self.OTHER_ERROR
@@ -401,15 +368,7 @@ class DataQueryClient(object):
         newUrl = self.getConcateUrl(userId, pwd, interfaceId, params, serverId, method)
         logger.debug('URL: ' + newUrl)
         try:
-            buf = BytesIO()
-            response = pycurl.Curl()
-            response.setopt(pycurl.URL, newUrl)
-            response.setopt(pycurl.CONNECTTIMEOUT, self.connTimeout)
-            response.setopt(pycurl.TIMEOUT, self.readTimeout)
-            response.setopt(pycurl.WRITEFUNCTION, buf.write)
-            # response.setopt(pycurl.WRITEDATA, value)
-            response.perform()
-            response.close()
+            buf = self._perform(newUrl)
         except Exception:  # http error
             logger.exception("Error retrieving data")
             retFilesInfo.request.errorCode = self.OTHER_ERROR
@@ -467,15 +426,7 @@ class DataQueryClient(object):
         newUrl = self.getConcateUrl(userId, pwd, interfaceId, params, serverId, method)
         logger.debug('URL: ' + newUrl)
         try:
-            buf = BytesIO()
-            response = pycurl.Curl()
-            response.setopt(pycurl.URL, newUrl)
-            response.setopt(pycurl.CONNECTTIMEOUT, self.connTimeout)
-            response.setopt(pycurl.TIMEOUT, self.readTimeout)
-            response.setopt(pycurl.WRITEFUNCTION, buf.write)
-            # response.setopt(pycurl.WRITEDATA, value)
-            response.perform()
-            response.close()
+            buf = self._perform(newUrl)
         except Exception:  # http error
             logger.exception("Error retrieving data")
             retGridScalar2D.request.errorCode = self.OTHER_ERROR
@@ -517,16 +468,7 @@ class DataQueryClient(object):
         newUrl = self.getConcateUrl(userId, pwd, interfaceId, params, serverId, method)
         logger.debug('URL: ' + newUrl)
         try:
-            buf = BytesIO()
-            # buf = BytesIO()
-            response = pycurl.Curl()
-            response.setopt(pycurl.URL, newUrl)
-            response.setopt(pycurl.CONNECTTIMEOUT, self.connTimeout)
-            response.setopt(pycurl.TIMEOUT, self.readTimeout)
-            response.setopt(pycurl.WRITEFUNCTION, buf.write)
-            # response.setopt(pycurl.WRITEDATA, value)
-            response.perform()
-            response.close()
+            buf = self._perform(newUrl)
         except Exception:  # http error
             logger.exception("Error retrieving data")
             retGridVector2D.request.errorCode = self.OTHER_ERROR
@@ -554,6 +496,38 @@ class DataQueryClient(object):
 
         return retGridVector2D
 
+    def _perform(self, url):
+        """
+        执行请求，返回结果缓冲区；url长度超过maxUrlLength且网关支持POST时，参数以POST表单提交
+        """
+        buf = BytesIO()
+        response = pycurl.Curl()
+        if self.post and len(url) > self.maxUrlLength:
+            base, query = url.split('?', 1)
+            response.setopt(pycurl.URL, base)
+            response.setopt(pycurl.POSTFIELDS, query)
+        else:
+            response.setopt(pycurl.URL, url)
+        response.setopt(pycurl.CONNECTTIMEOUT, self.connTimeout)
+        response.setopt(pycurl.TIMEOUT, self.readTimeout)
+        response.setopt(pycurl.WRITEFUNCTION, buf.write)
+        _timing.last = None
+        response.perform()
+        _timing.last = dict(namelookup=response.getinfo(pycurl.NAMELOOKUP_TIME),
+                            connect=response.getinfo(pycurl.CONNECT_TIME),
+                            starttransfer=response.getinfo(pycurl.STARTTRANSFER_TIME),
+                            total=response.getinfo(pycurl.TOTAL_TIME),
+                            size_download=response.getinfo(pycurl.SIZE_DOWNLOAD))
+        response.close()
+        return buf
+
+    @staticmethod
+    def last_timing():
+        """
+        当前线程最近一次请求的耗时信息（秒）：域名解析、建立连接、首字节、总耗时及下载字节数，请求失败时为None
+        """
+        return getattr(_timing, 'last', None)
+
     def getConcateUrl(self, userId, pwd, interfaceId, params, serverId, method):
         """
         将请求参数拼接为url
@@ -29,8 +29,10 @@ import configparser
 from copy import deepcopy
 from logzero import logger
 from shutil import copyfile
+from concurrent.futures import ThreadPoolExecutor
 from . import DataFormatUtils, apiinterface_pb2
 from .MusicDataBean import RequestInfo
+from .UploadLedger import UploadLedger
 
 
 class DataStoreClient(object):
@@ -42,7 +44,7 @@ class DataStoreClient(object):
     gatewayFlag = "\"flag\":\"slb\""  # 网关返回错误标识
 
     def __init__(self, server=None, port=None, service_node_id=None, conn_timeout=None,
-                 read_timeout=None, config_file=None):
+                 read_timeout=None, config_file=None, upload_ledger=None):
         """
         Constructor
         """
@@ -93,6 +95,10 @@ class DataStoreClient(object):
         if self.storeBackstage == 1:
             self.localMount = cf.get("Pb", "music_local_mount")  # 本地挂载目录对应位置
             self.serverMount = cf.get("Pb", "music_server_mount")  # 服务端挂载目录位置
+        # 上传去重记录文件，为空则不启用
+        if upload_ledger is None:
+            upload_ledger = cf.get("Pb", "music_upload_ledger", fallback='')
+        self.uploadLedger = self.getUploadLedger(upload_ledger)
         # 本机IP
         self.clientIp = socket.gethostbyname(socket.gethostname())
         self.basicUrl_write = "http://%s:%s/music-ws/write?serviceNodeId=%s&"
@@ -115,7 +121,11 @@ class DataStoreClient(object):
         return requestInfo
 
     def callAPI_to_storeFile(self, userId, pwd, interfaceId, params, inArray2D, inFilePaths,
-                             serverId=None, isBackstage=0, localMountPath='', serverMountPath=''):
+                             serverId=None, isBackstage=0, localMountPath='', serverMountPath='',
+                             ledger=None):
+        """
+        文件写入接口，ledger 为上传记录(UploadLedger或sqlite文件路径)，内容已成功上传过的文件将被跳过
+        """
         if isBackstage == 1:
             if (localMountPath is None) or (serverMountPath is None):
                 self.storeBackstageCur = isBackstage
@@ -165,9 +175,33 @@ class DataStoreClient(object):
                 # http传输
                 copyResult = []  # 传输是否成功
                 httpTempNames = []
+                uploaded = []  # 本次实际上传的文件序号及其hash
                 utils = DataFormatUtils.Utils()
+                ledger = self.getUploadLedger(ledger) if ledger is not None else self.uploadLedger
+                batch = dict(files=0, skipped=0, bytes=0, skipped_bytes=0)
+                hashFutures = []
+                if ledger is not None:
+                    # 在上一个文件上传的同时，后台并行计算后续文件的hash
+                    executor = ThreadPoolExecutor(max_workers=min(4, fileNum))
+                    hashFutures = [executor.submit(UploadLedger.hashFile, f) for f in inFilePaths]
+                    executor.shutdown(wait=False)
                 for k in range(fileNum):
                     copyResult = []
+                    fileHash, fileSize = None, None
+                    if ledger is not None:
+                        try:
+                            fileHash, fileSize = hashFutures[k].result()
+                        except Exception as e:  # 文件不可读等
+                            for f in hashFutures:
+                                f.cancel()
+                            requestInfo.errorCode = self.OTHER_ERROR
+                            requestInfo.errorMessage = "hash file fail:%s, %s" % (inFilePaths[k], e)
+                            return requestInfo
+                        skipped = ledger.contains(interfaceId, params, inArray2D[k], fileHash, fileSize)
+                        ledger.count(fileSize, skipped, batch)
+                        if skipped:
+                            logger.debug('skip uploaded file: ' + inFilePaths[k])
+                            continue
                     uuidTemp = uuid.uuid1()
                     uploadFileName = 'music_python_%d_%s' % (k, uuidTemp)
                     httpTempNames.append(uploadFileName)
@@ -203,6 +237,8 @@ class DataStoreClient(object):
                         copyResult = self.uploadFile(uploadUrl, fullFileName, self.connTimeout,
                                                      self.readTimeout)
                     if copyResult[0] == False:
+                        for f in hashFutures:
+                            f.cancel()
                         if copyResult[1].__contains__(DataStoreClient.gatewayFlag):  # 网关错误
                             getwayInfo = json.loads(copyResult[1])
                             if getwayInfo is None:
@@ -218,9 +254,32 @@ class DataStoreClient(object):
                             return requestInfo
                             # else:
                         # print 'upload file success:'+ fullFileName
+                    uploaded.append((k, fileHash, fileSize))
 
-            return self.callAPI_to_storeArray2D_FileInfo(userId, pwd, interfaceId, serverId, params,
-                                                         method, inArray2D, httpTempNames)
+            if ledger is None:
+                return self.callAPI_to_storeArray2D_FileInfo(userId, pwd, interfaceId, serverId, params,
+                                                             method, inArray2D, httpTempNames)
+
+            ledger.report(batch)
+            if len(uploaded) == 0:  # 所有文件均已上传过
+                requestInfo.errorMessage = 'All %d files have been uploaded, skipped.' % fileNum
+                return requestInfo
+            requestInfo = self.callAPI_to_storeArray2D_FileInfo(userId, pwd, interfaceId, serverId, params,
+                                                                method, [inArray2D[k] for k, _, _ in uploaded],
+                                                                httpTempNames)
+            if requestInfo.errorCode == 0:
+                ledger.add(interfaceId, params, [(inArray2D[k], h, s, inFilePaths[k]) for k, h, s in uploaded])
+            return requestInfo
+
+    def getUploadLedger(self, ledger):
+        """
+        获取上传记录对象，ledger 可以为 UploadLedger 或 sqlite 文件路径
+        """
+        if ledger is None or isinstance(ledger, UploadLedger):
+            return ledger
+        if ledger == '':
+            return None
+        return UploadLedger(ledger)
 
     def callAPI_to_storeSerializedStr(self, userId, pwd, interfaceId, params, inString,
                                       serverId=None):
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+"""
+upload ledger for data store client
+Created in 2026/10/19
+@author: wqshen91@163.com
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from logzero import logger
+
+
+class UploadLedger(object):
+    """
+    上传记录，使用 sqlite 保存已成功上传文件的 (interfaceId, params, 索引行hash, 文件hash, 文件大小)，
+    索引行及内容一致的文件再次上传时可直接跳过，内容相同但索引行不同(不同时次)的文件仍会上传
+    """
+
+    def __init__(self, path):
+        """
+        Constructor
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            columns = [r[1] for r in self._conn.execute("PRAGMA table_info(uploads)")]
+            if columns and 'row_hash' not in columns:
+                # 旧记录不含索引行，无法判断文件对应的时次，丢弃后重新记录
+                logger.warning("upload ledger %s without row hash is discarded" % path)
+                self._conn.execute("DROP TABLE uploads")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS uploads ("
+                               "interface_id TEXT, params TEXT, row_hash TEXT, file_hash TEXT, file_size INTEGER, "
+                               "file_path TEXT, upload_time REAL, "
+                               "PRIMARY KEY (interface_id, params, row_hash, file_hash, file_size))")
+        self.stats = dict(files=0, skipped=0, bytes=0, skipped_bytes=0)
+
+    @staticmethod
+    def hashFile(fileName, chunkSize=1 << 20):
+        """
+        计算文件内容的 sha256 及文件大小
+        """
+        sha = hashlib.sha256()
+        size = 0
+        with open(fileName, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunkSize), b''):
+                sha.update(chunk)
+                size += len(chunk)
+        return sha.hexdigest(), size
+
+    @staticmethod
+    def paramsKey(params):
+        """
+        将请求参数转换为有序的字符串，作为记录的键
+        """
+        return json.dumps(params, sort_keys=True, default=str)
+
+    @staticmethod
+    def rowKey(row):
+        """
+        文件索引行(inArray2D 中对应的一行)的 sha256
+        """
+        return hashlib.sha256(json.dumps(list(row), default=str).encode('utf-8')).hexdigest()
+
+    def contains(self, interfaceId, params, row, fileHash, fileSize):
+        """
+        判断索引行为 row 的文件是否已成功上传过
+        """
+        with self._lock:
+            found = self._conn.execute("SELECT 1 FROM uploads WHERE interface_id=? AND params=? AND row_hash=? "
+                                       "AND file_hash=? AND file_size=?",
+                                       (interfaceId, self.paramsKey(params), self.rowKey(row), fileHash,
+                                        fileSize)).fetchone()
+        return found is not None
+
+    def add(self, interfaceId, params, entries):
+        """
+        记录成功上传的文件，entries 为 (索引行, 文件hash, 文件大小, 文件路径) 列表
+        """
+        now = time.time()
+        key = self.paramsKey(params)
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                   [(interfaceId, key, self.rowKey(r), h, s, p, now) for r, h, s, p in entries])
+
+    def count(self, fileSize, skipped=False, batch=None):
+        """
+        累计复用统计，batch 不为空时同时累计到本批次的统计中
+        """
+        with self._lock:
+            for stats in (self.stats, batch) if batch is not None else (self.stats,):
+                stats['files'] += 1
+                stats['bytes'] += fileSize
+                if skipped:
+                    stats['skipped'] += 1
+                    stats['skipped_bytes'] += fileSize
+
+    def report(self, batch=None):
+        """
+        输出复用统计，batch 为本批次的统计，为空时输出累计统计
+        """
+        stats = self.stats if batch is None else batch
+        logger.info("upload ledger: %d/%d files reused, %.2f/%.2f MB skipped" % (
+            stats['skipped'], stats['files'], stats['skipped_bytes'] / 1048576., stats['bytes'] / 1048576.))
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
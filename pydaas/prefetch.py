@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 21:10
+# @Last Modified by: wqshen
+
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime
+from typing import Union, Callable
+from logzero import logger
+from pydaas.recorder import canonical
+
+# positions of (datasource, inittime, fh, varname, leadtime) request stepped in loops: inittime, fh, leadtime
+AXES = (1, 2, 4)
+
+
+class _Stream(object):
+    """recent values of one axis of requests sharing the other fields, and speculative requests ahead of them"""
+
+    def __init__(self, depth: int):
+        self.values = deque(maxlen=3)
+        self.depth = depth
+        self.ahead = OrderedDict()
+
+    def step(self, value):
+        """append value, step of progression if the last three values are equally spaced, else None"""
+        self.values.append(value)
+        if len(self.values) < 3:
+            return None
+        v0, v1, v2 = self.values
+        step = v2 - v1
+        return step if step and step == v1 - v0 else None
+
+
+class Prefetcher(object):
+    """Speculatively request the next steps of `sel` requests looping over lead times or observation times
+
+    Single requests sharing datasource, varname and other arguments (level, bbox ...) form a stream per axis
+    (inittime, fh, leadtime). Once three values of a stream are equally spaced, the next `depth` values are
+    requested in background threads. Depth of a stream grows by one on each hit and halves when speculative
+    requests are discarded, speculation is cancelled when a request leaves the progression.
+    """
+
+    def __init__(self, depth: int = 2, max_depth: int = 8, workers: int = 2, max_streams: int = 16):
+        """Prefetcher
+
+        Parameters
+        ----------
+        depth: int
+            initial number of requests issued ahead of a detected progression
+        max_depth: int
+            upper limit of depth
+        workers: int
+            threads of speculative requests
+        max_streams: int
+            number of streams tracked, the least recently used stream and its speculation are dropped
+        """
+        self.depth = depth
+        self.max_depth = max_depth
+        self.workers = workers
+        self.max_streams = max_streams
+        self.issued, self.hits, self.wasted = 0, 0, 0
+        self._streams = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pydaas-prefetch')
+
+    def __getstate__(self):
+        return dict(depth=self.depth, max_depth=self.max_depth, workers=self.workers, max_streams=self.max_streams)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def stats(self) -> dict:
+        """number of issued, hit and wasted speculative requests"""
+        return dict(issued=self.issued, hits=self.hits, wasted=self.wasted,
+                    hit_rate=self.hits / self.issued if self.issued else 0.)
+
+    def _discard(self, stream: _Stream, values: list):
+        for value in values:
+            stream.ahead.pop(value).cancel()
+        self.wasted += len(values)
+        if values:
+            stream.depth = max(1, stream.depth // 2)
+            logger.debug(f"prefetch: discard {len(values)} speculative requests, depth {stream.depth}")
+
+    def observe(self, request: Union[list, tuple], kwargs: dict, fetch: Callable) -> Union[Future, None]:
+        """observe a `sel` request, issue speculative requests of progressions it continues
+
+        Parameters
+        ----------
+        request: list, tuple
+            (datasource, inittime, fh, varname, leadtime) request of `sel`
+        kwargs: dict
+            other arguments of `sel` method of specific reader
+        fetch: Callable
+            function of request returning its result, called in background threads
+
+        Returns
+        -------
+        Future: speculative request issued earlier for this request, None if not prefetched
+        """
+        request = tuple(request)
+        hit = None
+        with self._lock:
+            for axis in AXES:
+                value = request[axis]
+                if isinstance(value, bool) or not isinstance(value, (int, datetime)) or \
+                        (isinstance(value, int) and value < 0):
+                    continue
+                key = canonical(request[:axis] + (None,) + request[axis + 1:], kwargs)
+                stream = self._streams.pop(key, None) or _Stream(self.depth)
+                self._streams[key] = stream
+                while len(self._streams) > self.max_streams:
+                    _, dropped = self._streams.popitem(last=False)
+                    self._discard(dropped, list(dropped.ahead))
+
+                future = stream.ahead.pop(value, None)
+                if future is not None:
+                    hit = hit or future
+                    self.hits += 1
+                    stream.depth = min(stream.depth + 1, self.max_depth)
+
+                step = stream.step(value)
+                expected = [] if step is None else [value + step * k for k in range(1, stream.depth + 1)]
+                self._discard(stream, [v for v in stream.ahead if v not in expected])
+                for v in expected:
+                    if v not in stream.ahead:
+                        stream.ahead[v] = self._executor.submit(fetch, request[:axis] + (v,) + request[axis + 1:])
+                        self.issued += 1
+                if expected:
+                    logger.debug(f"prefetch: {request[0]} {expected[0]} .. {expected[-1]} by step {step}")
+        return hit
+
+    def close(self):
+        """cancel speculative requests and stop threads"""
+        with self._lock:
+            for stream in self._streams.values():
+                self._discard(stream, list(stream.ahead))
+            self._streams.clear()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 23:10
+# @Last Modified by: wqshen
+
+import os
+import json
+import queue
+import pycurl
+import threading
+import configparser
+from io import BytesIO
+from typing import Union
+from logzero import logger
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pydaas.cache import ResponseCache, DEFAULT_CACHE_DIR
+from pydaas.music import apiinterface_pb2
+from pydaas.music.DataQueryClient import DataQueryClient
+
+# protobuf results of methods, responses of these methods with errorCode 0 are cached
+CACHEABLE = {
+    'callAPI_to_array2D': apiinterface_pb2.RetArray2D,
+    'callAPI_to_gridArray2D': apiinterface_pb2.RetGridArray2D,
+    'callAPI_to_gridScalar2D': apiinterface_pb2.RetGridScalar2D,
+    'callAPI_to_gridVector2D': apiinterface_pb2.RetGridVector2D,
+    'callAPI_to_fileList': apiinterface_pb2.RetFilesInfo,
+    'callAPI_to_dataBlock': apiinterface_pb2.RetDataBlock,
+}
+# parameters changing at each call of the same request
+VOLATILE = ('timestamp', 'nonce', 'sign')
+
+
+class _Flight(object):
+    """upstream request in flight, shared by identical requests arriving meanwhile"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class MusicProxy(DataQueryClient):
+    """Local caching proxy of MUSIC `music-ws/api` shared by processes on one host
+
+    Requests are forwarded unchanged to the MUSIC server of client.config. Requests of known users (signed
+    with their password) are keyed without timestamp/nonce/sign, identical ones in flight are coalesced into
+    one upstream request and successful responses are kept in a shared response cache. Upstream requests
+    reuse pooled connections and at most `max_upstream` run at the same time over the host.
+    Clients use the proxy by `music_server`/`music_port` of client.config, or DaasClient(server=, port=).
+    """
+
+    def __init__(self, users: dict = None, max_upstream: int = 8, cache: Union[bool, ResponseCache] = True,
+                 cache_dir: str = None, **kwargs):
+        """MusicProxy
+
+        Parameters
+        ----------
+        users: dict
+            {user: password} whose requests are verified, coalesced and cached, default music_user of
+            client.config. Requests of other users are forwarded without caching
+        max_upstream: int
+            upstream requests running at the same time
+        cache: bool, ResponseCache
+            cache of responses, True for ResponseCache (2 GiB, 6 hours TTL) in <cache_dir>/proxy
+        cache_dir: str
+            directory of local caches, default ~/.cache/pydaas
+        kwargs:
+            other parameters passed into DataQueryClient, e.g. server/port of upstream
+        """
+        kwargs['config_file'] = kwargs.get('config_file', fr'{os.path.dirname(__file__)}/config/client.config')
+        super().__init__(**kwargs)
+        if users is None:
+            cf = configparser.ConfigParser()
+            cf.read(kwargs['config_file'], 'utf-8')
+            user, password = cf.get('Pb', 'music_user'), cf.get('Pb', 'music_password')
+            users = {user: password} if user else {}
+        self.users = users
+        self.max_upstream = max_upstream
+        if cache is True:
+            cache = ResponseCache(cache_dir=os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'proxy'))
+        self.cache = cache if isinstance(cache, ResponseCache) else None
+        self.stats = dict(requests=0, hits=0, coalesced=0, upstream=0, uncached=0, errors=0, in_flight=0)
+        self._slots = threading.BoundedSemaphore(max_upstream)
+        self._pool = queue.LifoQueue()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    @staticmethod
+    def _params(query: str) -> dict:
+        """parameters of query string as they are signed, without unquoting"""
+        return dict(p.split('=', 1) if '=' in p else (p, '') for p in query.split('&') if p)
+
+    def key(self, query: str) -> Union[str, None]:
+        """key of request without volatile parameters, None if it is not cacheable or not signed by a known user"""
+        params = self._params(query)
+        password = self.users.get(params.get('userId'))
+        if params.get('method') not in CACHEABLE or password is None or 'sign' not in params:
+            return None
+        sign_params = {k: v for k, v in params.items() if k != 'sign'}
+        sign_params['pwd'] = password
+        if self.getSign(sign_params) != params['sign']:
+            return None
+        return '&'.join(f"{k}={v}" for k, v in sorted(params.items()) if k not in VOLATILE)
+
+    def upstream(self, query: str, post: bool = False) -> tuple:
+        """forward request to MUSIC server by a pooled connection, (status, body)"""
+        url = self.basicUrl.split('?')[0] % (self.serverIp, self.serverPort)
+        with self._slots:
+            self._count('upstream')
+            self._count('in_flight')
+            try:
+                curl = self._pool.get_nowait()
+                curl.reset()
+            except queue.Empty:
+                curl = pycurl.Curl()
+            buf = BytesIO()
+            try:
+                if post:
+                    curl.setopt(pycurl.URL, url)
+                    curl.setopt(pycurl.POSTFIELDS, query)
+                else:
+                    curl.setopt(pycurl.URL, f"{url}?{query}")
+                curl.setopt(pycurl.CONNECTTIMEOUT, self.connTimeout)
+                curl.setopt(pycurl.TIMEOUT, self.readTimeout)
+                curl.setopt(pycurl.WRITEFUNCTION, buf.write)
+                curl.perform()
+                status = curl.getinfo(pycurl.RESPONSE_CODE)
+            except Exception:
+                curl.close()
+                raise
+            else:
+                # handle keeps its connection alive for the next request
+                self._pool.put(curl)
+            finally:
+                self._count('in_flight', -1)
+        return status, buf.getvalue()
+
+    @staticmethod
+    def cacheable(method: str, body: bytes) -> bool:
+        """response is a result of errorCode 0, not a gateway error"""
+        if DataQueryClient.getwayFlag.encode() in body:
+            return False
+        ret = CACHEABLE[method]()
+        try:
+            ret.ParseFromString(body)
+        except Exception:
+            return False
+        return ret.request.errorCode == 0
+
+    def handle(self, query: str, post: bool = False) -> tuple:
+        """response of request from cache, the same request in flight or upstream, (status, body)"""
+        self._count('requests')
+        key = self.key(query)
+        if key is None:
+            self._count('uncached')
+            return self.upstream(query, post)
+        if self.cache is not None:
+            body = self.cache.get(key)
+            if body is not None:
+                self._count('hits')
+                return 200, body
+
+        with self._lock:
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._flights[key] = _Flight()
+        if not owner:
+            self._count('coalesced')
+            flight.event.wait()
+            if isinstance(flight.result, Exception):
+                raise flight.result
+            return flight.result
+
+        try:
+            flight.result = self.upstream(query, post)
+            status, body = flight.result
+            if self.cache is not None and status == 200 and self.cacheable(self._params(key)['method'], body):
+                self.cache.put(key, body)
+            return flight.result
+        except Exception as e:
+            flight.result = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def serve(self, host: str = '127.0.0.1', port: int = 8765):
+        """serve `music-ws/api` on host:port until interrupted"""
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+        server.proxy = self
+        logger.info(f"proxy of http://{self.serverIp}:{self.serverPort}/music-ws/api listening on "
+                    f"http://{host}:{port}/music-ws/api, at most {self.max_upstream} upstream requests")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return server
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, status: int, body: bytes, content_type: str = 'application/octet-stream'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _proxy(self, query: str, post: bool):
+        proxy = self.server.proxy
+        try:
+            self._reply(*proxy.handle(query, post))
+        except Exception as e:
+            logger.exception(f"proxy upstream error: {e}")
+            proxy._count('errors')
+            # gateway style error, so that clients report it as errorCode
+            body = json.dumps(dict(flag='slb', returnCode=proxy.OTHER_ERROR,
+                                   returnMessage=f"pydaas proxy upstream error: {e}"))
+            self._reply(502, body.encode(), 'application/json')
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        if path == '/pydaas/stats':
+            proxy = self.server.proxy
+            stats = dict(proxy.stats, cache_bytes=proxy.cache.size if proxy.cache is not None else 0)
+            self._reply(200, json.dumps(stats).encode(), 'application/json')
+        elif path.endswith('/music-ws/api'):
+            self._proxy(query, False)
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if not self.path.partition('?')[0].endswith('/music-ws/api'):
+            self.send_error(404)
+            return
+        query = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        self._proxy(query, True)
+
+    def log_message(self, format, *args):
+        logger.debug(f"proxy {self.address_string()} {format % args}")
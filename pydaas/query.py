@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 17:30
+# @Last Modified by: wqshen
+
+import operator
+import numpy as np
+import pandas as pd
+from typing import Union
+from logzero import logger
+from datetime import datetime
+
+AGGREGATIONS = {'sum': 'SUM', 'max': 'MAX', 'min': 'MIN', 'avg': 'AVG', 'mean': 'AVG', 'count': 'COUNT'}
+_LOCAL_AGG = {'SUM': 'sum', 'MAX': 'max', 'MIN': 'min', 'AVG': 'mean', 'COUNT': 'count'}
+_OPS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le, '==': operator.eq,
+        '!=': operator.ne}
+
+
+class Expr(object):
+    """boolean expression on elements, combined by & | ~"""
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def conjuncts(self) -> list:
+        return [self]
+
+    def elements(self) -> set:
+        raise NotImplementedError
+
+    def evaluate(self, data: pd.DataFrame) -> pd.Series:
+        raise NotImplementedError
+
+
+class Predicate(Expr):
+    """comparison of an element with a value, `between` with (low, high), `isin` with values"""
+
+    def __init__(self, element: str, op: str, value):
+        self.element, self.op, self.value = element, op, value
+
+    def __repr__(self):
+        return f"{self.element} {self.op} {self.value!r}"
+
+    def elements(self) -> set:
+        return {self.element}
+
+    def evaluate(self, data: pd.DataFrame) -> pd.Series:
+        column = data[self.element]
+        if self.op == 'isin':
+            return column.astype(str).isin([str(v) for v in self.value])
+        values = self.value if self.op == 'between' else [self.value]
+        if all(isinstance(v, (int, float)) for v in values):
+            column = pd.to_numeric(column, errors='coerce')
+        if self.op == 'between':
+            return (column >= self.value[0]) & (column <= self.value[1])
+        return _OPS[self.op](column, self.value)
+
+    def interval(self) -> Union[tuple, None]:
+        """(low, low closed, high, high closed) of numeric comparison, None if not an interval"""
+        values = self.value if self.op == 'between' else [self.value]
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            return
+        v = self.value
+        if self.op == 'between':
+            return v[0], True, v[1], True
+        return {'>': (v, False, None, False), '>=': (v, True, None, False), '<': (None, False, v, False),
+                '<=': (None, False, v, True), '==': (v, True, v, True)}.get(self.op)
+
+
+class And(Expr):
+    def __init__(self, *exprs):
+        self.exprs = exprs
+
+    def __repr__(self):
+        return ' & '.join(f"({e})" for e in self.exprs)
+
+    def conjuncts(self) -> list:
+        return [c for e in self.exprs for c in e.conjuncts()]
+
+    def elements(self) -> set:
+        return set().union(*[e.elements() for e in self.exprs])
+
+    def evaluate(self, data: pd.DataFrame) -> pd.Series:
+        return np.logical_and.reduce([e.evaluate(data) for e in self.exprs])
+
+
+class Or(And):
+    def __repr__(self):
+        return ' | '.join(f"({e})" for e in self.exprs)
+
+    def conjuncts(self) -> list:
+        return [self]
+
+    def evaluate(self, data: pd.DataFrame) -> pd.Series:
+        return np.logical_or.reduce([e.evaluate(data) for e in self.exprs])
+
+
+class Not(Expr):
+    def __init__(self, expr: Expr):
+        self.expr = expr
+
+    def __repr__(self):
+        return f"~({self.expr})"
+
+    def elements(self) -> set:
+        return self.expr.elements()
+
+    def evaluate(self, data: pd.DataFrame) -> pd.Series:
+        return ~np.asarray(self.expr.evaluate(data), dtype=bool)
+
+
+class Element(object):
+    """element of MUSIC datasource used in expressions, e.g. `E.PRE_1H > 0`"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+    def __gt__(self, v):
+        return Predicate(self.name, '>', v)
+
+    def __ge__(self, v):
+        return Predicate(self.name, '>=', v)
+
+    def __lt__(self, v):
+        return Predicate(self.name, '<', v)
+
+    def __le__(self, v):
+        return Predicate(self.name, '<=', v)
+
+    def __eq__(self, v):
+        return Predicate(self.name, '==', v)
+
+    def __ne__(self, v):
+        return Predicate(self.name, '!=', v)
+
+    __hash__ = object.__hash__
+
+    def between(self, low, high) -> Predicate:
+        return Predicate(self.name, 'between', (low, high))
+
+    def isin(self, values: list) -> Predicate:
+        return Predicate(self.name, 'isin', list(values))
+
+
+class _Elements(object):
+    def __getattr__(self, name: str) -> Element:
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Element(name)
+
+    def __getitem__(self, name: str) -> Element:
+        return Element(name)
+
+
+E = _Elements()
+
+
+def _intersect(a: tuple, b: tuple) -> tuple:
+    lo, lo_closed = a[:2]
+    if b[0] is not None and (lo is None or b[0] > lo or (b[0] == lo and not b[1])):
+        lo, lo_closed = b[:2]
+    hi, hi_closed = a[2:]
+    if b[2] is not None and (hi is None or b[2] < hi or (b[2] == hi and not b[3])):
+        hi, hi_closed = b[2:]
+    return lo, lo_closed, hi, hi_closed
+
+
+def _ranges(intervals: dict) -> str:
+    """format intervals as MUSIC value ranges, e.g. PRE_1H:(0,);TEM:[0,10]"""
+    items = []
+    for name, (lo, lo_closed, hi, hi_closed) in intervals.items():
+        items.append(f"{name}:{'[' if lo_closed and lo is not None else '('}{'' if lo is None else lo},"
+                     f"{'' if hi is None else hi}{']' if hi_closed and hi is not None else ')'}")
+    return ';'.join(items)
+
+
+class Query(object):
+    """Query builder of station observations with server side pushdown
+
+    Filters (`where`) on numeric elements are compiled into `eleValueRanges`, `isin` on Station_Id_C into
+    `staIds`, aggregations (`groupby` + `agg`) of surface datasources into `statSurfEle` interfaces
+    (`SUM_`/`MAX_`/`MIN_`/`AVG_`/`COUNT_` elements) and filters on aggregated values (`having`) into
+    `statEleValueRanges`. Other parts are evaluated locally on the returned rows, `explain` reports
+    which parts are pushed down.
+
+    Examples
+    --------
+    >>> q = dc.query('SURFACE', slice(datetime(2023, 2, 19), datetime(2023, 2, 20)), adminCodes='330000')
+    >>> q = q.where(E.PRE_1H > 0).groupby('Station_Id_C').agg(sum='PRE_1H')
+    >>> q.explain()
+    >>> data = q.execute()
+    """
+
+    def __init__(self, client, datasource: str, inittime: Union[datetime, slice, str], **kwargs):
+        """Query
+
+        Parameters
+        ----------
+        client: DaasClient
+            client to execute query
+        datasource: str
+            data source name from Daas, also alias from config/alias.yaml
+        inittime: datetime, slice, str
+            observation time or time range
+        kwargs:
+            other parameters passed into `sel`, e.g. adminCodes, lat/lon, staLevels
+        """
+        self.client = client
+        self.datasource = datasource
+        self.inittime = inittime
+        self.kwargs = kwargs
+        self._select, self._where, self._groupby, self._agg, self._having = [], [], [], [], []
+
+    def _copy(self, **changes) -> 'Query':
+        q = Query(self.client, self.datasource, self.inittime, **self.kwargs)
+        q._select, q._where, q._groupby = list(self._select), list(self._where), list(self._groupby)
+        q._agg, q._having = list(self._agg), list(self._having)
+        for k, v in changes.items():
+            setattr(q, k, getattr(q, k) + v)
+        return q
+
+    def select(self, *elements: str) -> 'Query':
+        """elements to return"""
+        return self._copy(_select=[e for es in elements for e in es.split(',')])
+
+    def where(self, expr: Expr) -> 'Query':
+        """filter rows, multiple where are combined by and"""
+        return self._copy(_where=expr.conjuncts())
+
+    def groupby(self, *keys: str) -> 'Query':
+        """elements to group rows"""
+        return self._copy(_groupby=[k for ks in keys for k in ks.split(',')])
+
+    def agg(self, **aggregations: Union[str, list]) -> 'Query':
+        """aggregate elements of groups, e.g. agg(sum='PRE_1H', max=['PRE_1H', 'TEM']),
+        results are named as server statistics, e.g. SUM_PRE_1H"""
+        items = []
+        for fn, elements in aggregations.items():
+            if fn not in AGGREGATIONS:
+                raise NotImplementedError(f"aggregation {fn}, only support {list(AGGREGATIONS)}")
+            for e in [elements] if isinstance(elements, str) else elements:
+                items.append((AGGREGATIONS[fn], e))
+        return self._copy(_agg=items)
+
+    def having(self, expr: Expr) -> 'Query':
+        """filter aggregated groups by statistics, e.g. having(E.SUM_PRE_1H > 10)"""
+        return self._copy(_having=expr.conjuncts())
+
+    @property
+    def _surface(self) -> bool:
+        return self.client.alias.get(self.datasource, self.datasource).startswith('SURF')
+
+    def plan(self) -> dict:
+        """compile query into `sel` parameters and local operations
+
+        Returns
+        -------
+        dict: `sel` kwargs, pushed and local parts
+        """
+        intervals, pushed, local, params = {}, [], [], dict(self.kwargs)
+        for p in self._where:
+            interval = p.interval() if isinstance(p, Predicate) else None
+            if interval is not None:
+                intervals[p.element] = _intersect(intervals.get(p.element, (None, False, None, False)), interval)
+                pushed.append(f"where {p}")
+            elif isinstance(p, Predicate) and p.op == 'isin' and p.element == 'Station_Id_C' \
+                    and 'staIds' not in params and 'lat' not in params:
+                params['staIds'] = ','.join(map(str, p.value))
+                pushed.append(f"where {p}")
+            else:
+                local.append(p)
+        if intervals:
+            params['eleValueRanges'] = _ranges(intervals)
+
+        stats = [f"{fn}_{e}" for fn, e in self._agg]
+        push_agg = bool(self._agg) and self._surface and not local and bool(self._groupby)
+        local_having = []
+        if push_agg:
+            params['varname'] = ','.join(stats)
+            params['index_col'] = ','.join(self._groupby)
+            pushed.append(f"groupby {self._groupby} agg {stats}")
+            having = {}
+            for p in self._having:
+                interval = p.interval() if isinstance(p, Predicate) else None
+                if interval is not None and p.element in stats:
+                    having[p.element] = _intersect(having.get(p.element, (None, False, None, False)), interval)
+                    pushed.append(f"having {p}")
+                else:
+                    local_having.append(p)
+            if having:
+                params['statEleValueRanges'] = _ranges(having)
+        else:
+            local_having = list(self._having)
+            referenced = set().union(*[p.elements() for p in local]) if local else set()
+            elements = [*self._select, *self._groupby, *[e for _, e in self._agg], *sorted(referenced)]
+            params['varname'] = ','.join(dict.fromkeys(elements))
+        return dict(params=params, pushed=pushed, local_where=local, local_agg=bool(self._agg) and not push_agg,
+                    local_having=local_having)
+
+    def explain(self) -> dict:
+        """report which parts of query are pushed down to server and which are evaluated locally"""
+        plan = self.plan()
+        local = [f"where {p}" for p in plan['local_where']]
+        if plan['local_agg']:
+            local.append(f"groupby {self._groupby} agg {[f'{fn}_{e}' for fn, e in self._agg]}")
+        local += [f"having {p}" for p in plan['local_having']]
+        report = dict(pushed=plan['pushed'], local=local, params=plan['params'])
+        logger.info(f"query {self.datasource}: pushed {report['pushed']}, local {report['local']}")
+        return report
+
+    def execute(self) -> pd.DataFrame:
+        """execute query
+
+        Returns
+        -------
+        pd.DataFrame: rows, or statistics indexed by group keys
+        """
+        plan = self.plan()
+        self.explain()
+        params = dict(plan['params'])
+        varname = params.pop('varname')
+        data = self.client.sel(self.datasource, self.inittime, varname=varname, merge=True, **params)
+        if plan['local_where']:
+            data = data[np.logical_and.reduce([p.evaluate(data) for p in plan['local_where']])]
+        if plan['local_agg']:
+            columns = {f"{fn}_{e}": (e, _LOCAL_AGG[fn]) for fn, e in self._agg}
+            numeric = data.assign(**{e: pd.to_numeric(data[e], errors='coerce') for _, e in self._agg})
+            if self._groupby:
+                data = numeric.groupby(self._groupby).agg(**columns)
+            else:
+                data = pd.DataFrame({k: [numeric[e].agg(fn)] for k, (e, fn) in columns.items()})
+        elif self._agg:
+            data = data.apply(pd.to_numeric, errors='coerce')
+        elif self._select:
+            data = data[[e for e in self._select if e in data.columns]]
+        if plan['local_having']:
+            data = data[np.logical_and.reduce([p.evaluate(data) for p in plan['local_having']])]
+        return data
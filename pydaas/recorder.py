@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 19:40
+# @Last Modified by: wqshen
+
+import json
+import time
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+import xarray as xr
+from typing import Union
+from logzero import logger
+from datetime import datetime
+
+REQUEST_FIELDS = ('datasource', 'inittime', 'fh', 'varname', 'leadtime')
+
+
+def _plain(value):
+    """json serializable form of request values, slices as {"slice": [start, stop]}, datetimes in ISO format"""
+    if isinstance(value, slice):
+        return {'slice': [_plain(value.start), _plain(value.stop)]}
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value if value is None or isinstance(value, (str, int, float, bool)) else str(value)
+
+
+def _restore(value):
+    """request value from its json form, slices of numbers are restored"""
+    if isinstance(value, dict) and set(value) == {'slice'}:
+        return slice(*value['slice'])
+    if isinstance(value, list):
+        return [_restore(v) for v in value]
+    return value
+
+
+def canonical(request: Union[list, tuple], kwargs: dict = None, inittime: bool = True) -> str:
+    """canonical string of a `sel` request (datasource, inittime, fh, varname, leadtime) and its kwargs
+
+    Parameters
+    ----------
+    request: list, tuple
+        request of `sel`
+    kwargs: dict
+        other arguments of `sel` method of specific reader
+    inittime: bool
+        include inittime, False for the pattern of request repeated at each model run
+
+    Returns
+    -------
+    str: sorted json
+    """
+    fields = dict(zip(REQUEST_FIELDS, request))
+    if not inittime:
+        fields.pop('inittime')
+    fields.update({k: v for k, v in (kwargs or {}).items() if v is not None})
+    return json.dumps({k: _plain(v) for k, v in fields.items()}, sort_keys=True)
+
+
+def nbytes(data) -> int:
+    """memory size of a result"""
+    if isinstance(data, (xr.DataArray, xr.Dataset)):
+        return int(data.nbytes)
+    if isinstance(data, (pd.DataFrame, pd.Series)):
+        return int(np.sum(data.memory_usage(deep=True)))
+    return int(getattr(data, 'nbytes', 0))
+
+
+class WorkloadRecorder(object):
+    """Record `sel` requests with timings and result sizes into a local SQLite file
+
+    Each request is saved with its canonical key, the pattern without inittime (so that requests repeated at
+    each model run share one pattern), elapsed seconds and result bytes. Patterns are replayed by `warm`.
+    """
+
+    def __init__(self, path: str):
+        """WorkloadRecorder
+
+        Parameters
+        ----------
+        path: str
+            SQLite file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS requests ("
+                               "key TEXT, pattern TEXT, datasource TEXT, inittime TEXT, started REAL, "
+                               "elapsed REAL, nbytes INTEGER, ok INTEGER)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS requests_pattern ON requests (pattern)")
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def record(self, request: Union[list, tuple], kwargs: dict, started: float, elapsed: float, data):
+        """record a request, `data` is its result, None for failed request"""
+        inittime = request[1]
+        row = (canonical(request, kwargs), canonical(request, kwargs, inittime=False), request[0],
+               inittime.isoformat() if isinstance(inittime, datetime) else json.dumps(_plain(inittime)),
+               started, elapsed, 0 if data is None else nbytes(data), int(data is not None))
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO requests VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def patterns(self, datasource: str = None, order: str = 'frequent', top: int = 100,
+                 since: float = 7 * 86400.) -> list:
+        """request patterns of model runs (requests with a single inittime)
+
+        Parameters
+        ----------
+        datasource: str
+            only patterns of datasource, default all
+        order: str
+            'frequent' (most requested first) or 'recent' (latest requested first)
+        top: int
+            number of patterns
+        since: float
+            seconds to look back
+
+        Returns
+        -------
+        list: [(request without inittime as dict, kwargs dict, count, mean bytes), ...]
+        """
+        if order not in ('frequent', 'recent'):
+            raise NotImplementedError(f"order {order}, only support frequent and recent")
+        sql = ("SELECT pattern, COUNT(*) AS n, MAX(started) AS last, AVG(nbytes) FROM requests "
+               "WHERE ok = 1 AND started >= ? AND inittime GLOB '[0-9]*'")
+        params = [time.time() - since]
+        if datasource is not None:
+            sql += " AND datasource = ?"
+            params.append(datasource)
+        sql += f" GROUP BY pattern ORDER BY {'n' if order == 'frequent' else 'last'} DESC LIMIT ?"
+        params.append(top)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        patterns = []
+        for pattern, n, _, size in rows:
+            fields = {k: _restore(v) for k, v in json.loads(pattern).items()}
+            request = {k: fields.pop(k, None) for k in REQUEST_FIELDS if k != 'inittime'}
+            patterns.append((request, fields, n, size))
+        return patterns
+
+    def summary(self) -> dict:
+        with self._lock:
+            n, ok, elapsed, size = self._conn.execute(
+                "SELECT COUNT(*), SUM(ok), SUM(elapsed), SUM(nbytes) FROM requests").fetchone()
+        summary = dict(requests=n, succeed=ok or 0, elapsed=elapsed or 0., nbytes=size or 0)
+        logger.debug(f"workload recorder {self.path}: {summary}")
+        return summary
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
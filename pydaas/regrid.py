@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 11:20
+# @Last Modified by: wqshen
+
+import os
+import hashlib
+import numpy as np
+import xarray as xr
+from typing import Union
+from logzero import logger
+from pydaas.cache import DEFAULT_CACHE_DIR
+from pydaas.interp import _axis_weights
+
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
+
+def _bounds(coord: np.ndarray) -> np.ndarray:
+    """cell bounds of a monotonic coordinate, midpoints between neighbours"""
+    coord = np.asarray(coord, dtype='f8')
+    if coord.size == 1:
+        return np.array([coord[0] - 0.5, coord[0] + 0.5])
+    mid = (coord[1:] + coord[:-1]) / 2.
+    return np.concatenate([[2 * coord[0] - mid[0]], mid, [2 * coord[-1] - mid[-1]]])
+
+
+def _linear_matrix(src: np.ndarray, dst: np.ndarray) -> tuple:
+    """1D linear interpolation matrix (dst, src) and mask of covered dst points"""
+    i0, i1, w, inside = _axis_weights(src, np.asarray(dst, dtype='f8'))
+    rows = np.arange(np.size(dst))
+    matrix = sp.coo_matrix((np.concatenate([1 - w, w]), (np.concatenate([rows, rows]), np.concatenate([i0, i1]))),
+                           shape=(np.size(dst), np.size(src))).tocsr()
+    return matrix, inside
+
+
+def _overlap_matrix(src: np.ndarray, dst: np.ndarray, transform=None) -> tuple:
+    """1D conservative (overlap fraction) matrix (dst, src) and mask of covered dst cells"""
+    sb, db = _bounds(src), _bounds(dst)
+    if transform is not None:
+        sb, db = transform(np.clip(sb, -90, 90)), transform(np.clip(db, -90, 90))
+    slo, shi = np.minimum(sb[:-1], sb[1:]), np.maximum(sb[:-1], sb[1:])
+    dlo, dhi = np.minimum(db[:-1], db[1:]), np.maximum(db[:-1], db[1:])
+    overlap = np.clip(np.minimum(dhi[:, None], shi[None, :]) - np.maximum(dlo[:, None], slo[None, :]), 0, None)
+    total = overlap.sum(axis=1)
+    covered = total > 0
+    overlap[covered] /= total[covered, None]
+    return sp.csr_matrix(overlap), covered
+
+
+class Regridder(object):
+    """Regrid fields between rectilinear lat/lon grids by a sparse weight matrix
+
+    Weight matrix of (source grid, target grid, method) is built once, saved as npz in cache
+    directory, and applied as one sparse matmul over all stacked fields on the source grid.
+    """
+    methods = ('bilinear', 'conservative')
+
+    def __init__(self, src_lat: np.ndarray, src_lon: np.ndarray, dst_lat: np.ndarray, dst_lon: np.ndarray,
+                 method: str = 'bilinear', cache_dir: str = None):
+        """Regridder
+
+        Parameters
+        ----------
+        src_lat, src_lon: np.ndarray
+            latitude and longitude of source grid
+        dst_lat, dst_lon: np.ndarray
+            latitude and longitude of target grid
+        method: str
+            bilinear or conservative
+        cache_dir: str
+            directory to cache weight matrix, default ~/.cache/pydaas
+        """
+        if sp is None:
+            raise ImportError("regrid requires scipy, install it by `pip install scipy`")
+        if method not in self.methods:
+            raise NotImplementedError(f"regrid method {method}, only support {self.methods}")
+        self.method = method
+        self.dst_lat, self.dst_lon = np.asarray(dst_lat, dtype='f8'), np.asarray(dst_lon, dtype='f8')
+        self.src_shape = (np.size(src_lat), np.size(src_lon))
+
+        coords = [np.round(np.asarray(c, dtype='f8'), 6) for c in (src_lat, src_lon, dst_lat, dst_lon)]
+        key = hashlib.sha1(b''.join(c.tobytes() for c in coords) + method.encode()).hexdigest()
+        cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'regrid')
+        path = os.path.join(cache_dir, f"{key}.npz")
+        if os.path.isfile(path):
+            logger.debug(f"load regrid weights from {path}")
+            self.weights = sp.load_npz(path).tocsr()
+            self.weights.eliminate_zeros()
+        else:
+            self.weights = self.build(*coords[:2], *coords[2:], method)
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.npz"
+            sp.save_npz(tmp, self.weights)
+            os.replace(tmp, path)
+            logger.debug(f"save regrid weights to {path}")
+        self.covered = np.asarray(self.weights.sum(axis=1)).ravel() > 0
+
+    @staticmethod
+    def build(src_lat: np.ndarray, src_lon: np.ndarray, dst_lat: np.ndarray, dst_lon: np.ndarray,
+              method: str = 'bilinear'):
+        """build sparse weight matrix (dst_lat * dst_lon, src_lat * src_lon)
+
+        Both methods are separable on rectilinear grids, the 2D matrix is the kronecker product of
+        latitude and longitude matrices. Conservative weights use sin(lat) for the area of latitude bands.
+        """
+        if method == 'bilinear':
+            wy, my = _linear_matrix(src_lat, dst_lat)
+            wx, mx = _linear_matrix(src_lon, dst_lon)
+        else:
+            wy, my = _overlap_matrix(src_lat, dst_lat, lambda b: np.sin(np.deg2rad(b)))
+            wx, mx = _overlap_matrix(src_lon, dst_lon)
+        wy, wx = sp.diags(my.astype('f8')) @ wy, sp.diags(mx.astype('f8')) @ wx
+        weights = sp.kron(wy, wx, format='csr')
+        # explicit zero weights would spread NaN of neighbours (e.g. masked land/sea) into the matmul
+        weights.eliminate_zeros()
+        return weights
+
+    def regrid_values(self, values: np.ndarray) -> np.ndarray:
+        """regrid stacked values (..., src_lat, src_lon) to (..., dst_lat, dst_lon)"""
+        lead = values.shape[:-2]
+        flat = values.reshape(-1, self.src_shape[0] * self.src_shape[1]).astype('f8')
+        out = (self.weights @ flat.T).T
+        out[:, ~self.covered] = np.nan
+        return out.reshape(*lead, self.dst_lat.size, self.dst_lon.size)
+
+    def __call__(self, data: xr.DataArray) -> xr.DataArray:
+        """regrid field to target grid"""
+        data = data.transpose(..., 'lat', 'lon')
+        return self._wrap(data, self.regrid_values(data.values))
+
+    def _wrap(self, data: xr.DataArray, values: np.ndarray) -> xr.DataArray:
+        coords = {k: v for k, v in data.coords.items() if 'lat' not in v.dims and 'lon' not in v.dims}
+        coords.update({'lat': self.dst_lat, 'lon': self.dst_lon})
+        return xr.DataArray(values, dims=data.dims, coords=coords, name=data.name, attrs=data.attrs)
+
+
+def target_grid(target: Union[xr.DataArray, xr.Dataset, dict, tuple]) -> tuple:
+    """latitude and longitude of target grid from DataArray/Dataset, dict(lat=, lon=) or (lat, lon) tuple"""
+    if isinstance(target, (xr.DataArray, xr.Dataset)):
+        return target.lat.values, target.lon.values
+    if isinstance(target, dict):
+        return np.asarray(target['lat']), np.asarray(target['lon'])
+    return np.asarray(target[0]), np.asarray(target[1])
+
+
+def regrid(data: Union[xr.DataArray, xr.Dataset, list], target: Union[xr.DataArray, xr.Dataset, dict, tuple],
+           method: str = 'bilinear', cache_dir: str = None) -> Union[xr.DataArray, xr.Dataset, list]:
+    """regrid fields to target grid
+
+    Fields in a list are grouped by their source grid, each group is regridded by one sparse matmul.
+
+    Parameters
+    ----------
+    data: xr.DataArray, xr.Dataset, list
+        fields with lat and lon dimensions, variables of Dataset are regridded together, other items of list
+        are returned unchanged
+    target: xr.DataArray, xr.Dataset, dict, tuple
+        target grid
+    method: str
+        bilinear or conservative
+    cache_dir: str
+        directory to cache weight matrix
+
+    Returns
+    -------
+    (xr.DataArray, xr.Dataset, list): regridded fields
+    """
+    dst_lat, dst_lon = target_grid(target)
+    if not isinstance(data, list):
+        return regrid([data], (dst_lat, dst_lon), method, cache_dir)[0]
+
+    data = list(data)
+    for k, d in enumerate(data):
+        if isinstance(d, xr.Dataset):
+            names = [n for n in d.data_vars if 'lat' in d[n].dims and 'lon' in d[n].dims]
+            fields = regrid([d[n] for n in names], (dst_lat, dst_lon), method, cache_dir)
+            data[k] = xr.Dataset(dict(zip(names, fields)), attrs=d.attrs)
+
+    groups = {}
+    for k, d in enumerate(data):
+        if isinstance(d, xr.DataArray) and 'lat' in d.dims and 'lon' in d.dims:
+            key = (d.lat.values.tobytes(), d.lon.values.tobytes())
+            groups.setdefault(key, []).append(k)
+
+    for members in groups.values():
+        fields = [data[k].transpose(..., 'lat', 'lon') for k in members]
+        regridder = Regridder(fields[0].lat.values, fields[0].lon.values, dst_lat, dst_lon, method, cache_dir)
+        sizes = [int(np.prod(f.shape[:-2])) for f in fields]
+        stacked = np.concatenate([f.values.reshape(-1, *f.shape[-2:]) for f in fields])
+        values = np.split(regridder.regrid_values(stacked), np.cumsum(sizes)[:-1])
+        for k, f, v in zip(members, fields, values):
+            data[k] = regridder._wrap(f, v.reshape(*f.shape[:-2], dst_lat.size, dst_lon.size))
+    return data
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 17:40
+# @Last Modified by: wqshen
+
+import math
+from datetime import datetime, timedelta
+from logzero import logger
+
+TIME_FORMAT = '%Y%m%d%H%M%S'
+# observations of one station per hour, matched by datasource code, default hourly
+FREQUENCY = (('_MIN', 60.), ('_HALFHOUR', 2.), ('_DAY', 1 / 24.), ('_TEN', 1 / 240.), ('_MON', 1 / 720.),
+             ('_YER', 1 / 8760.), ('UPAR_CHN_MUL_FTM', 1 / 12.))
+# stations of query scope: whole datasource, one region (province), density of lat/lon rect per square degree
+NATION_STATIONS, REGION_STATIONS, RECT_DENSITY = 70000, 3000, 30.
+# sounding stations and levels of one upper air report
+UPAR_STATIONS, UPAR_LEVELS = 120, 100
+# budget of values (rows * elements) of one sub-query
+MAX_CELLS = 2000000
+# retries of a sub-query failing on transport, and seconds before the first retry, doubled at each retry
+RETRIES, BACKOFF = 2, 1.
+# times a sub-range timed out or truncated is bisected, sub-queries are capped at ROW_FACTOR times the rows
+# planned for them, reaching the cap means the sub-range is truncated
+MAX_DEPTH, ROW_FACTOR = 3, 4
+# parameters change the meaning of concatenated sub-ranges, queries with them are not split, limitCnt caps
+# rows of the whole query
+UNSPLITTABLE = ('distinct', 'orderBy', 'limitCnt')
+
+
+def parse_time_range(time_range: str) -> tuple:
+    """parse MUSIC timeRange `[YYYYmmddHHMMSS,YYYYmmddHHMMSS]` into (start, stop) of closed interval"""
+    start, stop = time_range.strip()[1:-1].split(',')
+    start, stop = datetime.strptime(start, TIME_FORMAT), datetime.strptime(stop, TIME_FORMAT)
+    if time_range.strip().startswith('('):
+        start += timedelta(seconds=1)
+    if time_range.strip().endswith(')'):
+        stop -= timedelta(seconds=1)
+    return start, stop
+
+
+def format_time_range(start: datetime, stop: datetime) -> str:
+    return f"[{start:{TIME_FORMAT}},{stop:{TIME_FORMAT}}]"
+
+
+def splittable(interface: str, parameters: dict) -> bool:
+    """element query of a time range, sub-ranges of which concatenate into the same result"""
+    return (interface.startswith(('getSurfEle', 'getUparEle')) and 'timeRange' in parameters
+            and not any(k in parameters for k in UNSPLITTABLE))
+
+
+def estimate_rows(parameters: dict) -> float:
+    """estimate returned rows of a time range query by time span, station scope and frequency of datasource
+
+    Parameters
+    ----------
+    parameters: dict
+        parameters of `getSurfEle...`/`getUparEle...` interface with timeRange
+
+    Returns
+    -------
+    float: estimated number of rows
+    """
+    start, stop = parse_time_range(parameters['timeRange'])
+    code = parameters.get('dataCode', '')
+    frequency = next((f for k, f in FREQUENCY if k in code), 1.)
+    hours = (stop - start).total_seconds() / 3600.
+    times = max(hours * frequency, 1.)
+
+    upar = code.startswith('UPAR')
+    if parameters.get('staIds'):
+        stations = len(str(parameters['staIds']).split(','))
+    elif parameters.get('adminCodes'):
+        stations = len(str(parameters['adminCodes']).split(',')) * (UPAR_STATIONS / 30 if upar else REGION_STATIONS)
+    elif 'minLat' in parameters:
+        area = abs(float(parameters['maxLat']) - float(parameters['minLat'])) * \
+               abs(float(parameters['maxLon']) - float(parameters['minLon']))
+        stations = min(area * (UPAR_STATIONS / 1000 if upar else RECT_DENSITY),
+                       UPAR_STATIONS if upar else NATION_STATIONS)
+    else:
+        stations = UPAR_STATIONS if upar else NATION_STATIONS
+
+    levels = 1
+    if upar:
+        layers = parameters.get('pLayers') or parameters.get('hLayers')
+        levels = len(str(layers).split(',')) if layers else UPAR_LEVELS
+    return math.ceil(times) * max(stations, 1) * levels
+
+
+def plan_ranges(parameters: dict, max_cells: int = MAX_CELLS) -> list:
+    """split timeRange of query into sub-ranges by estimated cost
+
+    Sub-ranges are closed intervals aligned to whole hours (minutes for spans shorter than a few hours), the
+    number of sub-ranges keeps estimated values (rows * elements) of each under `max_cells`.
+
+    Parameters
+    ----------
+    parameters: dict
+        parameters of query with timeRange
+    max_cells: int
+        budget of values of one sub-query
+
+    Returns
+    -------
+    list: [(start, stop), ...] in time order
+    """
+    start, stop = parse_time_range(parameters['timeRange'])
+    rows = estimate_rows(parameters)
+    elements = max(len(str(parameters.get('elements', '')).split(',')), 1)
+    n = max(math.ceil(rows * elements / max_cells), 1)
+    span = (stop - start).total_seconds()
+    if n == 1 or span <= 0:
+        return [(start, stop)]
+
+    unit = 3600 if span >= 3 * 3600 else 60
+    step = max(math.ceil(span / n / unit), 1) * unit
+    ranges, begin = [], start
+    while begin <= stop:
+        end = min(begin + timedelta(seconds=step - 1), stop)
+        ranges.append((begin, end))
+        begin = end + timedelta(seconds=1)
+    logger.debug(f"split {parameters['timeRange']} (~{rows:.0f} rows x {elements} elements) "
+                 f"into {len(ranges)} sub-ranges of {step}s")
+    return ranges
+
+
+
+def row_limit(parameters: dict, max_cells: int = MAX_CELLS) -> int:
+    """limitCnt of a sub-query, a sub-range returning as many rows is truncated"""
+    elements = max(len(str(parameters.get('elements', '')).split(',')), 1)
+    return max(math.ceil(max_cells / elements), 1) * ROW_FACTOR
+
+
+def bisect_range(start: datetime, stop: datetime):
+    """split closed interval into two halves at whole hour (minute for short spans), None if too short"""
+    span = (stop - start).total_seconds()
+    unit = 3600 if span >= 2 * 3600 else 60
+    middle = start + timedelta(seconds=math.ceil(span / 2 / unit) * unit)
+    if span < unit or middle > stop:
+        return None
+    return (start, middle - timedelta(seconds=1)), (middle, stop)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 14:30
+# @Last Modified by: wqshen
+
+import os
+import glob
+import time
+import uuid
+import xarray as xr
+from typing import Union
+from logzero import logger
+from datetime import datetime
+
+
+class SlotStore(object):
+    """Local store of a datasource, one NetCDF file per (inittime, varname, level, fh) slot
+
+    Files are laid out as `<root>/<datasource>/<inittime:%Y%m%d%H>/<varname>.L<level>.F<fh:03d>.nc`
+    with (inittime, fh, level, lat, lon) dimensions. Each slot is written into a temporary file and
+    renamed in place, so the store is always readable while syncing and an interrupted sync resumes
+    from the missing slots.
+    """
+
+    def __init__(self, root: str, datasource: str):
+        """SlotStore
+
+        Parameters
+        ----------
+        root: str
+            root directory of stores
+        datasource: str
+            data source name from Daas
+        """
+        self.path = os.path.join(root, datasource)
+        self.datasource = datasource
+        os.makedirs(self.path, exist_ok=True)
+        # remove temporary files left by crashed syncs, recent ones may belong to a running sync
+        for tmp in glob.glob(os.path.join(self.path, '*', '.*.tmp')):
+            if time.time() - os.path.getmtime(tmp) > 3600:
+                os.remove(tmp)
+
+    def slot_path(self, inittime: datetime, varname: str, level: Union[int, None], fh: Union[int, None]) -> str:
+        """file path of a slot"""
+        level = '-' if level is None else level
+        fh = '-' if fh is None else f"{fh:03d}"
+        return os.path.join(self.path, f"{inittime:%Y%m%d%H}", f"{varname}.L{level}.F{fh}.nc")
+
+    def exists(self, inittime: datetime, varname: str, level: Union[int, None], fh: Union[int, None]) -> bool:
+        return os.path.isfile(self.slot_path(inittime, varname, level, fh))
+
+    def missing(self, slots: list) -> list:
+        """slots not in store
+
+        Parameters
+        ----------
+        slots: list
+            (inittime, varname, level, fh) of slots
+
+        Returns
+        -------
+        list: missing slots
+        """
+        return [s for s in slots if not self.exists(*s)]
+
+    def write(self, inittime: datetime, varname: str, level: Union[int, None], fh: Union[int, None],
+              data: xr.DataArray) -> str:
+        """write field of a slot atomically
+
+        Parameters
+        ----------
+        inittime, varname, level, fh:
+            slot
+        data: xr.DataArray
+            field returned by `DaasClient.sel` with time dimension
+
+        Returns
+        -------
+        str: file path of slot
+        """
+        path = self.slot_path(inittime, varname, level, fh)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if 'time' in data.dims:
+            data = data.isel(time=0).drop_vars(['time', 'inittime'], errors='ignore')
+        data = data.expand_dims(inittime=[inittime], fh=[-1 if fh is None else fh],
+                                level=[-1 if level is None else level])
+        tmp = os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex}.tmp")
+        try:
+            data.to_dataset(name=varname).to_netcdf(tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return path
+
+    def files(self, inittime: datetime = None) -> list:
+        """files of completed slots"""
+        subdir = '*' if inittime is None else f"{inittime:%Y%m%d%H}"
+        return sorted(glob.glob(os.path.join(self.path, subdir, '*.nc')))
+
+    def open(self, inittime: datetime = None) -> xr.Dataset:
+        """open completed slots as one dataset
+
+        Parameters
+        ----------
+        inittime: datetime
+            only open slots of this initial time, default all
+
+        Returns
+        -------
+        xr.Dataset: dataset with (inittime, fh, level, lat, lon) dimensions
+        """
+        files = self.files(inittime)
+        if not files:
+            raise FileNotFoundError(f"no slot in {self.path}")
+        logger.debug(f"open {len(files)} slots from {self.path}")
+        return xr.combine_by_coords([xr.load_dataset(f) for f in files], combine_attrs='drop_conflicts')
@@ -5,9 +5,20 @@
 # @Last Modified by: wqshen
 
 import pytest
+import threading
+import numpy as np
 import pandas as pd
+import xarray as xr
 from datetime import datetime, timedelta
 from pydaas.client import DaasClient
+from pydaas.store import SlotStore
+from pydaas.checkpoint import Checkpoint
+from pydaas.workqueue import WorkQueue
+from pydaas.proxy import MusicProxy
+from pydaas.music.UploadLedger import UploadLedger
+from pydaas.writer import NetCDFStreamWriter, CSVStreamWriter
+from pydaas.arrow import ArrowStreamWriter
+from pydaas.block import BlockDescriptor, decode_block, spool_block, find_descriptor, DESCRIPTORS
 
 pd.set_option('display.width', None)
 pd.set_option('display.max_columns', None)
@@ -24,18 +35,166 @@ class TestDaas:
                           lat=slice(20, 40), lon=slice(110, 130))
         print(dar)
 
+    def test_ecmwf_high_element_tile_cache(self):
+        """测试瓦片缓存下重叠经纬度范围读取ECMWF高空变量"""
+        dc = DaasClient(user='xxx', password='xxx', tile_cache=True)
+        dar = dc.sel('ECMWF_P', self.inittime, fh=24, varname='RHU', level=850,
+                     lat=slice(20, 40), lon=slice(110, 130))
+        dar_sub = dc.sel('ECMWF_P', self.inittime, fh=24, varname='RHU', level=850,
+                         lat=slice(25, 35), lon=slice(115, 125))
+        direct = self.dc.sel('ECMWF_P', self.inittime, fh=24, varname='RHU', level=850,
+                             lat=slice(25, 35), lon=slice(115, 125))
+        assert (dar_sub.lat.values == direct.lat.values).all()
+        print(dar, dar_sub, dc.tile_cache.hits)
+
     def test_ecmwf_high_element_atpoint(self):
         """测试指定经纬度点读取ECMWF高空变量"""
         dar = self.dc.sel('ECMWF_P', self.inittime, fh=24, varname='RHU', level=850,
                           lat=[30,35], lon=[120,122])
         print(dar)
 
+    def test_ecmwf_high_element_interp_points(self):
+        """测试读取包含站点的ECMWF高空变量格点并在本地插值到站点"""
+        dar = self.dc.sel('ECMWF_P', self.inittime, fh=[12, 24], varname='RHU', level=850,
+                          lat=[30, 35, 28.5], lon=[120, 122, 121.3], interp='bilinear', merge=True)
+        print(dar)
+
     def test_ecmwf_high_element_atpoint_timeseries(self):
         """测试指定经纬度点读取ECMWF高空变量预报时间序列"""
         dar = self.dc.sel('ECMWF_P', self.inittime, fh=slice(0, 72), varname='RHU', level=850,
                           lat=30, lon=120)
         print(dar)
 
+    def test_multi_model_regrid(self):
+        """测试多模式读取并插值到统一的0.25度网格后合并"""
+        target = dict(lat=np.arange(20, 40.01, 0.25), lon=np.arange(110, 130.01, 0.25))
+        dar = self.dc.sel(['ECMWF_P', 'CMA_GFS'], self.inittime, fh=24, varname='RHU', level=850,
+                          lat=slice(20, 40), lon=slice(110, 130), regrid=target)
+        print(dar)
+
+    def test_ecmwf_lazy_mean(self):
+        """测试延迟读取ECMWF多时效高空变量并计算时间平均"""
+        dar = self.dc.sel('ECMWF_P', self.inittime, fh=list(range(0, 73, 12)), varname='RHU', level=850,
+                          lat=slice(20, 40), lon=slice(110, 130), lazy=True)
+        print(dar, dar.mean('time').compute())
+
+    def test_lazy_datasources_interp(self):
+        """测试延迟读取ECMWF和CMA_GFS，各自按网格取元数据，并在读取时插值到站点"""
+        ecmwf, gfs = self.dc.sel(['ECMWF_P', 'CMA_GFS'], self.inittime, fh=[0, 12], varname='RHU', level=850,
+                                 lat=slice(20, 40), lon=slice(110, 130), lazy=True)
+        assert ecmwf.compute().notnull().all() and gfs.compute().notnull().all()
+        dar = self.dc.sel('ECMWF_P', self.inittime, fh=[0, 12], varname='RHU', level=850, lat=[30.2, 31.5],
+                          lon=[120.1, 121.4], interp='bilinear', lazy=True)
+        assert dar.dims == ('time', 'station')
+        print(dar.compute())
+
+    def test_ecmwf_open_dataset(self):
+        """测试以xarray后端打开ECMWF数据并按经纬度范围和时效按需读取"""
+        import xarray as xr
+        ds = xr.open_dataset('ECMWF_P', engine='pydaas', inittime=self.inittime, fh=[0, 12, 24],
+                             varname='RHU', level=[500, 850], lat=slice(0, 60), lon=slice(70, 140),
+                             client=self.dc)
+        print(ds.sel(lat=slice(20, 40), lon=slice(110, 130)).isel(fh=0).load())
+
+    def test_ecmwf_sel_iter(self):
+        """测试按到达顺序逐个返回ECMWF多时效多层次数据"""
+        n = 0
+        for request, dar in self.dc.sel_iter('ECMWF_P', self.inittime, fh=[0, 12, 24], varname=['RHU', 'TEM'],
+                                             level=500, lat=slice(20, 40), lon=slice(110, 130)):
+            print(request, dar.shape)
+            n += 1
+        assert n == 6
+
+    def test_ecmwf_wind_vector(self):
+        """测试一次请求读取欧洲中心细网格850hPa风场u/v分量，并计算风速风向"""
+        ds = self.dc.sel('ECMWF_P', self.inittime, fh=24, varname='WIND', level=850,
+                         lat=slice(20, 40), lon=slice(110, 130), wind=True)
+        assert {'WIU', 'WIV', 'wind_speed', 'wind_direction'} <= set(ds.data_vars)
+        print(ds)
+
+    def test_ecmwf_latest_run(self):
+        """测试查找欧洲中心细网格最新起报时次及其已到达的预报时效，并跳过未到达的时效"""
+        dc = DaasClient(user='xxx', password='xxx', availability=True)
+        inittime = dc.latest_run('ECMWF_P', cycle=12)
+        fhs = dc.available_fh('ECMWF_P', inittime)
+        print(inittime, fhs)
+        dar = dc.sel('ECMWF_P', inittime, fh=fhs[-1], varname='RHU', level=850, lat=slice(20, 40), lon=slice(110, 130))
+        print(dar)
+
+    def test_ecmwf_watch(self, tmp_path):
+        """测试监视欧洲中心细网格最新起报时次，读取已发布的0-24小时时效到本地存储"""
+        dc = DaasClient(user='xxx', password='xxx', availability=True)
+        summary = dc.watch('ECMWF_P', 'RHU', str(tmp_path), fh=[0, 12, 24], level=850, cycle=12,
+                           lat=slice(20, 40), lon=slice(110, 130), interval=10, timeout=30)
+        assert summary['stored'] == [0, 12, 24]
+        print(SlotStore(str(tmp_path), 'ECMWF_P').open())
+
+    def test_ecmwf_warm(self, tmp_path):
+        """测试记录欧洲中心细网格请求，按记录的请求模式为最新起报时次预热响应缓存"""
+        dc = DaasClient(user='xxx', password='xxx', cache_dir=str(tmp_path), recorder=True, response_cache=True)
+        dc.sel('ECMWF_P', self.inittime, fh=[0, 12], varname='RHU', level=850, lat=slice(20, 40), lon=slice(110, 130))
+        print(dc.recorder.summary())
+        summary = dc.warm('ECMWF_P', budget=1 << 30, cycle=12)
+        assert summary['patterns'] == 2
+        print(summary)
+
+    def test_ecmwf_prefetch(self):
+        """测试逐时效循环读取欧洲中心细网格时预读后续时效"""
+        dc = DaasClient(user='xxx', password='xxx', prefetch=True)
+        for fh in range(0, 25, 3):
+            dc.sel('ECMWF_P', self.inittime, fh=fh, varname='TEM', level=850, lat=slice(20, 40), lon=slice(110, 130))
+        assert dc.prefetcher.stats['hits'] > 0
+        print(dc.prefetcher.stats)
+
+    def test_ecmwf_checkpoint(self, tmp_path):
+        """测试断点续传读取ECMWF多个时效，重新运行时从断点目录读取已完成的请求"""
+        kwargs = dict(varname='RHU', level=850, lat=slice(20, 40), lon=slice(110, 130), checkpoint=str(tmp_path))
+        self.dc.sel('ECMWF_P', self.inittime, fh=[0, 12], **kwargs)
+        dar = self.dc.sel('ECMWF_P', self.inittime, fh=[0, 12, 24], merge=True, **kwargs)
+        assert Checkpoint(str(tmp_path)).summary['completed'] == 3
+        print(dar)
+
+    def test_ecmwf_work_queue(self, tmp_path):
+        """测试通过任务队列分发ECMWF读取请求，两个工作进程读取后从共享断点目录组装结果"""
+        queue, store = str(tmp_path / 'ecmwf.queue'), str(tmp_path / 'ckpt')
+        kwargs = dict(varname='RHU', level=850, lat=slice(20, 40), lon=slice(110, 130))
+        assert self.dc.submit(queue, 'ECMWF_P', self.inittime, fh=[0, 12, 24, 36], **kwargs) == 4
+        for worker in ('node1', 'node2'):
+            print(DaasClient(user='xxx', password='xxx').work(queue, store, worker=worker, batch=2))
+        assert WorkQueue(queue).finished()
+        print(self.dc.sel('ECMWF_P', self.inittime, fh=[0, 12, 24, 36], merge=True, checkpoint=store, **kwargs))
+
+    def test_ecmwf_proxy(self, tmp_path):
+        """测试经本机缓存代理读取ECMWF数据，相同请求由响应缓存返回"""
+        proxy = MusicProxy({'xxx': 'xxx'}, max_upstream=2, cache_dir=str(tmp_path))
+        threading.Thread(target=proxy.serve, args=('127.0.0.1', 18765), daemon=True).start()
+        dc = DaasClient(user='xxx', password='xxx', server='127.0.0.1', port=18765)
+        for _ in range(2):
+            dar = dc.sel('ECMWF_P', self.inittime, fh=12, varname='RHU', level=850,
+                         lat=slice(20, 40), lon=slice(110, 130))
+        assert proxy.stats['hits'] >= 1
+        print(proxy.stats, dar)
+
+    def test_ecmwf_metrics(self):
+        """测试记录ECMWF读取请求的耗时分解，并导出Prometheus文本和JSON"""
+        dc = DaasClient(user='xxx', password='xxx', metrics=True)
+        records = []
+        dc.metrics.add_hook(records.append)
+        dc.sel('ECMWF_P', self.inittime, fh=[0, 12], varname='RHU', level=850, lat=slice(20, 40), lon=slice(110, 130))
+        assert len(records) == 2 and records[0]['total'] > 0
+        assert 'pydaas_http_total_seconds_bucket' in dc.metrics.to_prometheus()
+        print(records[0], dc.metrics.to_json()['pydaas_sel_seconds'])
+
+    def test_ecmwf_sync(self, tmp_path):
+        """测试增量同步ECMWF数据到本地存储，重复同步时跳过已有时次"""
+        summary = self.dc.sync('ECMWF_P', str(tmp_path), [self.inittime], fh=[0, 12], varname='RHU',
+                               level=[500, 850], lat=slice(20, 40), lon=slice(110, 130))
+        assert summary['fetched'] + summary['failed'] == 4
+        summary = self.dc.sync('ECMWF_P', str(tmp_path), [self.inittime], fh=[0, 12, 24], varname='RHU',
+                               level=[500, 850], lat=slice(20, 40), lon=slice(110, 130))
+        assert summary['skipped'] >= 4 - summary['failed']
+        print(SlotStore(str(tmp_path), 'ECMWF_P').open())
+
     def test_ecmwf_eps_surface_element_inrect(self):
         """测试指定经纬度范围读取ECMWF集合预报高空变量"""
         inittime = datetime(2023, 6, 4, 0)
@@ -112,6 +271,50 @@ class TestDaas:
                           orderBy='Datetime:desc,Station_Id_C:asc')
         print(dar)
 
+    def test_surface_hourly_arrow(self):
+        """测试以arrow表读取浙江省逐小时降水观测"""
+        table = self.dc.sel('SURFACE', slice(self.inittime - timedelta(days=1), self.inittime),
+                            varname='Station_Id_C,Datetime,PRE_1H', adminCodes='330000', arrow=True, merge=True)
+        print(table.schema)
+        assert str(table.schema.field('PRE_1H').type) == 'double'
+
+    def test_surface_hourly_station_cache(self):
+        """测试缓存站点信息后读取浙江省逐小时降水观测，站点属性在本地关联"""
+        dc = DaasClient(user='xxx', password='xxx', station_cache=True)
+        variable = 'Station_Name,Lon,Lat,Alti,Datetime,PRE_1H'
+        time_range = slice(self.inittime - timedelta(days=1), self.inittime)
+        dar = dc.sel('SURFACE', time_range, varname=variable, adminCodes='330000', index_col='Station_Name')
+        expected = self.dc.sel('SURFACE', time_range, varname=variable, adminCodes='330000',
+                               index_col='Station_Name')
+        assert list(dar.columns) == list(expected.columns)
+        assert list(dar.dtypes) == list(expected.dtypes)
+        print(dar)
+
+    def test_surface_hourly_cube(self):
+        """测试读取浙江省逐小时降水观测为站点×时间数据集"""
+        ds = self.dc.sel('SURFACE', slice(self.inittime - timedelta(days=1), self.inittime),
+                         varname='Station_Name,Lon,Lat,Datetime,PRE_1H', adminCodes='330000', cube='dense')
+        assert ds.PRE_1H.dims == ('station', 'time')
+        print(ds)
+
+    def test_surface_hourly_split(self):
+        """测试浙江省一周逐小时降水查询按时间段自动拆分，与整段查询结果一致"""
+        time_range = slice(self.inittime - timedelta(days=7), self.inittime)
+        data = self.dc.sel('SURFACE', time_range, varname='Station_Id_C,Datetime,PRE_1H', adminCodes='330000',
+                           split=100000)
+        whole = self.dc.sel('SURFACE', time_range, varname='Station_Id_C,Datetime,PRE_1H', adminCodes='330000',
+                            split=False)
+        assert len(data) == len(whole)
+        print(data)
+
+    def test_surface_query_pushdown(self):
+        """测试浙江省逐小时降水按站点求和，筛选与统计下推到服务端"""
+        from pydaas.query import E
+        q = self.dc.query('SURFACE', slice(self.inittime - timedelta(days=1), self.inittime), adminCodes='330000')
+        q = q.where(E.PRE_1H > 0).groupby('Station_Id_C').agg(sum='PRE_1H')
+        assert q.explain()['local'] == []
+        print(q.execute())
+
     def test_surface_daily(self):
         """读取地面日观测数据"""
         variable = 'Station_Id_C,Station_Name,Lon,Lat,Alti,Datetime,PRE_Time_0808'
@@ -141,5 +344,128 @@ class TestDaas:
         print(dar)
 
 
+class TestBlock:
+    header = np.array([25., 115.], dtype='<f4').tobytes()
+    values = np.arange(12, dtype='<i2').reshape(3, 4)
+    descriptor = BlockDescriptor('i2', (-1, 4), offset=8, dims=('lat', 'lon'),
+                                 coords=lambda h: {'lat': np.frombuffer(h, '<f4')[0] + np.arange(3)})
+
+    def test_decode_zero_copy(self):
+        """测试数据块解码共享内存且只读"""
+        data = self.header + self.values.tobytes()
+        dar = decode_block(data, self.descriptor, name='block')
+        assert np.shares_memory(dar.values, np.frombuffer(data, dtype='u1'))
+        assert not dar.values.flags.writeable
+        with pytest.raises(ValueError):
+            dar.values[0, 0] = 1
+
+    def test_decode_inferred_axis_offset(self):
+        """测试自动推断-1维长度并跳过头部字节"""
+        assert self.descriptor.resolve(8 + self.values.nbytes) == (3, 4)
+        dar = decode_block(self.header + self.values.tobytes(), self.descriptor, name='block')
+        np.testing.assert_array_equal(dar.values, self.values)
+        np.testing.assert_array_equal(dar.lat.values, [25., 26., 27.])
+        with pytest.raises(ValueError):
+            BlockDescriptor('i2', (4, 4), offset=8).resolve(8 + self.values.nbytes)
+
+    def test_decode_spooled_memmap(self, tmp_path):
+        """测试落盘数据块以内存映射方式解码"""
+        path = spool_block(self.header + self.values.tobytes(), str(tmp_path / 'block.bin'))
+        dar = decode_block(path, self.descriptor, name='block')
+        assert isinstance(dar.variable._data, np.memmap)
+        np.testing.assert_array_equal(dar.values, self.values)
+        np.testing.assert_array_equal(dar.lat.values, [25., 26., 27.])
+
+    def test_find_descriptor_missing(self, monkeypatch):
+        """测试未注册数据块名称抛出KeyError"""
+        monkeypatch.setitem(DESCRIPTORS, 'GRID_*', self.descriptor)
+        assert find_descriptor('GRID_T') is self.descriptor
+        with pytest.raises(KeyError):
+            find_descriptor(None)
+        with pytest.raises(KeyError):
+            find_descriptor('unregistered_block')
+
+
+class TestUploadLedger:
+    params = {'dataCode': 'NAFP_TEST'}
+
+    def test_ledger_hit_miss(self, tmp_path):
+        """测试上传记录按接口、参数、索引行及文件内容判断是否已上传"""
+        path = tmp_path / 'a.bin'
+        path.write_bytes(b'\xff' * 64)
+        ledger = UploadLedger(str(tmp_path / 'ledger.db'))
+        h, size = UploadLedger.hashFile(str(path))
+        assert size == 64
+        row = ['20230219000000', '000', 'a.bin']
+        assert not ledger.contains('putFile', self.params, row, h, size)
+        ledger.add('putFile', self.params, [(row, h, size, str(path))])
+        assert ledger.contains('putFile', self.params, row, h, size)
+        # 内容相同但索引行(时次)不同的文件不能跳过
+        assert not ledger.contains('putFile', self.params, ['20230219000000', '003', 'b.bin'], h, size)
+        assert not ledger.contains('putFile', {'dataCode': 'NAFP_OTHER'}, row, h, size)
+        assert not ledger.contains('putFile', self.params, row, h, size + 1)
+        ledger.close()
+        assert UploadLedger(str(tmp_path / 'ledger.db')).contains('putFile', self.params, row, h, size)
+
+
+class TestStreamWriter:
+    times = pd.date_range('2023-02-19 12:00', periods=3, freq='12h')
+
+    def field(self, time, value, inittime=None, name='RHU'):
+        inittime = self.times[0] if inittime is None else inittime
+        return xr.DataArray(np.full((1, 2, 3), value, dtype='f4'), dims=('time', 'lat', 'lon'), name=name,
+                            coords={'time': [time], 'inittime': ('time', [inittime]),
+                                    'lat': [20., 21.], 'lon': [110., 111., 112.]})
+
+    def test_netcdf_time_slots(self, tmp_path):
+        """测试流式写入nc时按有效时间写入对应时次，重复时次报错"""
+        path = str(tmp_path / 'out.nc')
+        with NetCDFStreamWriter(path, times=list(self.times)) as writer:
+            for k in (2, 0, 1):
+                writer.write(self.field(self.times[k], k))
+            with pytest.raises(ValueError):
+                writer.write(self.field(self.times[1], 9, inittime=self.times[1]))
+        with xr.open_dataset(path) as ds:
+            np.testing.assert_array_equal(ds.time.values, self.times.values)
+            np.testing.assert_array_equal(ds.RHU.values[:, 0, 0], [0, 1, 2])
+            assert (ds.inittime.values == self.times[0].to_datetime64()).all()
+
+    def test_netcdf_pack_range(self, tmp_path):
+        """测试打包范围取自给定值，与首个场无关"""
+        path = str(tmp_path / 'packed.nc')
+        with NetCDFStreamWriter(path, times=list(self.times), pack=(0., 100.)) as writer:
+            writer.write(self.field(self.times[0], 0.))
+            writer.write(self.field(self.times[1], 37.5))
+        with xr.open_dataset(path) as ds:
+            np.testing.assert_allclose(ds.RHU.values[:2, 0, 0], [0., 37.5], atol=1e-2)
+        with pytest.raises(ValueError):
+            with NetCDFStreamWriter(str(tmp_path / 'unknown.nc'), pack=True) as writer:
+                writer.write(self.field(self.times[0], 0.))
+
+    def test_csv_columns(self, tmp_path):
+        """测试csv流式写入时新增列追加到表头"""
+        path = str(tmp_path / 'out.csv')
+        with CSVStreamWriter(path) as writer:
+            writer.write(pd.DataFrame({'Station_Id_C': ['58457'], 'RHU': [80.]}).set_index('Station_Id_C'))
+            writer.write(pd.DataFrame({'Station_Id_C': ['58456'], 'TEM': [5.]}).set_index('Station_Id_C'))
+        data = pd.read_csv(path, dtype={'Station_Id_C': str}).set_index('Station_Id_C')
+        assert list(data.columns) == ['RHU', 'TEM']
+        assert data.loc['58457', 'RHU'] == 80. and np.isnan(data.loc['58457', 'TEM'])
+        assert data.loc['58456', 'TEM'] == 5. and np.isnan(data.loc['58456', 'RHU'])
+
+    def test_arrow_conform(self, tmp_path):
+        """测试parquet流式写入时后续表按首个表的schema对齐"""
+        pq = pytest.importorskip('pyarrow.parquet')
+        path = str(tmp_path / 'out.parquet')
+        with ArrowStreamWriter(path) as writer:
+            writer.write(pd.DataFrame({'Station_Id_C': ['58457'], 'TEM': ['5.5']}))
+            writer.write(pd.DataFrame({'Station_Id_C': ['58456']}))
+            with pytest.raises(ValueError):
+                writer.write(pd.DataFrame({'Station_Id_C': ['58455'], 'RHU': ['80']}))
+        table = pq.read_table(path)
+        assert table.column_names == ['Station_Id_C', 'TEM']
+        assert table.column('TEM').to_pylist() == [5.5, None]
+
+
 if __name__ == '__main__':
     pytest.main(['-q', 'test_diamond_reader.py'])
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 22:30
+# @Last Modified by: wqshen
+
+import os
+import time
+import socket
+import pickle
+import sqlite3
+import threading
+from logzero import logger
+from pydaas.recorder import canonical
+
+
+class WorkQueue(object):
+    """Queue of `sel` requests in a SQLite file shared by workers on many nodes
+
+    Requests of a job plan are inserted once (resubmitting the plan adds only new requests). Workers claim
+    batches of pending requests with a lease, requests whose lease expired (crashed or preempted worker) and
+    failed requests with attempts left are claimed again, a request whose lease expires at its last attempt
+    fails. Only the worker holding the lease can complete a request. The file should be on a filesystem with
+    working POSIX locks (local disk, NFSv4, Lustre ...).
+    """
+
+    def __init__(self, path: str, lease: float = 600., max_attempts: int = 3):
+        """WorkQueue
+
+        Parameters
+        ----------
+        path: str
+            SQLite file of queue
+        lease: float
+            seconds a claimed request is held by a worker before it can be claimed again
+        max_attempts: int
+            attempts of a request before it stays failed
+        """
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=60., isolation_level=None, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS tasks ("
+                           "id INTEGER PRIMARY KEY, key TEXT UNIQUE, request BLOB, state TEXT, worker TEXT, "
+                           "lease_until REAL, attempts INTEGER, finished REAL, nbytes INTEGER, error TEXT)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state)")
+
+    def __getstate__(self):
+        return dict(path=self.path, lease=self.lease, max_attempts=self.max_attempts)
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _write(self, fn):
+        """call fn(connection) in one write transaction, which locks the queue against other workers"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def submit(self, requests: list, kwargs: dict = None) -> int:
+        """add requests of a job plan
+
+        Parameters
+        ----------
+        requests: list
+            (datasource, inittime, fh, varname, leadtime) requests of `sel`
+        kwargs: dict
+            other arguments of `sel` method of specific reader, shared by requests
+
+        Returns
+        -------
+        int: number of requests added, requests already in queue are skipped
+        """
+        kwargs = kwargs or {}
+        rows = [(canonical(r, kwargs), pickle.dumps((tuple(r), kwargs))) for r in requests]
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO tasks (key, request, state, attempts) "
+                             "VALUES (?, ?, 'pending', 0)", rows)
+            return conn.total_changes - before
+
+        added = self._write(insert)
+        logger.info(f"queue {self.path}: {added} of {len(rows)} requests added")
+        return added
+
+    def _expire(self, conn, now: float):
+        """fail requests whose lease expired at the last attempt (the request crashed its workers)"""
+        expired = conn.execute("UPDATE tasks SET state = 'failed', finished = ?, error = 'lease expired' "
+                               "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                               (now, now, self.max_attempts)).rowcount
+        if expired:
+            logger.warning(f"queue {self.path}: {expired} requests failed, lease expired after "
+                           f"{self.max_attempts} attempts")
+
+    def claim(self, worker: str, batch: int = 4) -> list:
+        """lease a batch of requests to worker
+
+        Parameters
+        ----------
+        worker: str
+            worker name
+        batch: int
+            number of requests
+
+        Returns
+        -------
+        list: [(task id, request, kwargs), ...], empty if nothing claimable now
+        """
+        def lease(conn):
+            now = time.time()
+            self._expire(conn, now)
+            rows = conn.execute("SELECT id, request FROM tasks WHERE state = 'pending' "
+                                "OR ((state = 'leased' AND lease_until < ?) OR state = 'failed') AND attempts < ? "
+                                "ORDER BY id LIMIT ?", (now, self.max_attempts, batch)).fetchall()
+            conn.executemany("UPDATE tasks SET state = 'leased', worker = ?, lease_until = ?, "
+                             "attempts = attempts + 1 WHERE id = ?", [(worker, now + self.lease, i) for i, _ in rows])
+            return rows
+
+        return [(i, *pickle.loads(request)) for i, request in self._write(lease)]
+
+    def renew(self, ids: list, worker: str):
+        """extend leases of requests held by worker"""
+        if ids:
+            self._write(lambda conn: conn.execute(
+                f"UPDATE tasks SET lease_until = ? WHERE worker = ? AND state = 'leased' "
+                f"AND id IN ({','.join('?' * len(ids))})", (time.time() + self.lease, worker, *ids)))
+
+    def _finish(self, task: int, worker: str, state: str, nbytes: int, error: str) -> bool:
+        return self._write(lambda conn: conn.execute(
+            "UPDATE tasks SET state = ?, finished = ?, nbytes = ?, error = ? "
+            "WHERE id = ? AND worker = ? AND state = 'leased'",
+            (state, time.time(), nbytes, error, task, worker)).rowcount > 0)
+
+    def done(self, task: int, worker: str, nbytes: int = 0) -> bool:
+        """complete request, False if the lease was lost to another worker"""
+        return self._finish(task, worker, 'done', nbytes, None)
+
+    def fail(self, task: int, worker: str, error: str = None) -> bool:
+        """fail request, it is claimed again until `max_attempts`"""
+        return self._finish(task, worker, 'failed', 0, error)
+
+    def progress(self, window: float = 300.) -> dict:
+        """progress and throughput of the job
+
+        Parameters
+        ----------
+        window: float
+            seconds of recent completions to measure rate
+
+        Returns
+        -------
+        dict: number of total, pending, leased, done and failed (no attempts left) requests, retrying requests,
+              active workers, requests and bytes per second in window, seconds to finish at the rate
+        """
+        now = time.time()
+        self._write(lambda conn: self._expire(conn, now))
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall())
+            retrying, = self._conn.execute("SELECT COUNT(*) FROM tasks WHERE state = 'failed' AND attempts < ?",
+                                           (self.max_attempts,)).fetchone()
+            workers, = self._conn.execute("SELECT COUNT(DISTINCT worker) FROM tasks "
+                                          "WHERE state = 'leased' AND lease_until >= ?", (now,)).fetchone()
+            recent, size = self._conn.execute("SELECT COUNT(*), SUM(nbytes) FROM tasks "
+                                              "WHERE state = 'done' AND finished >= ?", (now - window,)).fetchone()
+            nbytes, = self._conn.execute("SELECT SUM(nbytes) FROM tasks WHERE state = 'done'").fetchone()
+        remaining = counts.get('pending', 0) + counts.get('leased', 0) + retrying
+        rate = recent / window
+        return dict(total=sum(counts.values()), pending=counts.get('pending', 0), leased=counts.get('leased', 0),
+                    done=counts.get('done', 0), failed=counts.get('failed', 0) - retrying, retrying=retrying,
+                    workers=workers, rate=rate, throughput=(size or 0) / window, nbytes=nbytes or 0,
+                    eta=remaining / rate if rate else None)
+
+    def finished(self) -> bool:
+        """no request is pending, leased or failed with attempts left"""
+        p = self.progress()
+        return p['pending'] + p['leased'] + p['retrying'] == 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def worker_name() -> str:
+    """default worker name, host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
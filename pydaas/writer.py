@@ -0,0 +1,580 @@
+# -*- coding: utf-8 -*-
+# @Author: wqshen
+# @Email: wqshen91@gmail.com
+# @Date: 2026/10/19 15:10
+# @Last Modified by: wqshen
+
+import os
+import csv
+import time
+import threading
+import netCDF4
+import numpy as np
+import pandas as pd
+import xarray as xr
+from typing import Union
+from logzero import logger
+from pydaas.arrow import ArrowStreamWriter
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    import zarr
+    import numcodecs
+except ImportError:
+    zarr = numcodecs = None
+
+COMPRESSIONS = ('zlib', 'zstd', 'blosc_lz4', 'blosc_zstd', 'none')
+
+
+def chunk_shape(dims: tuple, shape: tuple, ntime: int = None, access: str = 'map') -> tuple:
+    """chunk shape of a (time, ..., lat, lon) variable matching downstream access
+
+    Parameters
+    ----------
+    dims: tuple
+        dimensions of variable, time first
+    shape: tuple
+        shape of one time slot (without time dimension)
+    ntime: int
+        length of time dimension, None for unlimited
+    access: str
+        'map', one chunk per 2D field, fast to read maps of some times
+        'series', long time and small lat/lon chunks, fast to read time series of some points
+
+    Returns
+    -------
+    tuple: chunk shape including time dimension
+    """
+    if access == 'map':
+        return (1, *[s if d in ('lat', 'lon') else 1 for d, s in zip(dims[1:], shape)])
+    elif access == 'series':
+        nt = min(ntime or 64, 512)
+        return (nt, *[min(s, 16) if d in ('lat', 'lon') else 1 for d, s in zip(dims[1:], shape)])
+    raise NotImplementedError(f"chunk access {access}, only support map, series")
+
+
+def pack_params(lo: float, hi: float) -> tuple:
+    """scale_factor and add_offset to pack float values in [lo, hi] into int16"""
+    if not np.isfinite(lo) or not np.isfinite(hi) or hi <= lo:
+        raise ValueError(f"invalid pack range [{lo}, {hi}]")
+    return (hi - lo) / 65532., (hi + lo) / 2.
+
+
+def pack_range(name: str, attrs: dict, pack: Union[bool, tuple, dict]) -> tuple:
+    """value range of a variable to be packed
+
+    Streams see fields one by one, so the range can not be taken from the data. It's given by `pack` as
+    a (min, max) tuple for all variables or a dict of variable names, otherwise by valid_range or
+    valid_min/valid_max attributes of the variable.
+    """
+    if isinstance(pack, dict) and name in pack:
+        return tuple(map(float, pack[name]))
+    elif isinstance(pack, (tuple, list)):
+        return tuple(map(float, pack))
+    elif 'valid_range' in attrs:
+        return tuple(map(float, attrs['valid_range']))
+    elif 'valid_min' in attrs and 'valid_max' in attrs:
+        return float(attrs['valid_min']), float(attrs['valid_max'])
+    raise ValueError(f"no value range to pack {name}, give it by pack range (--pack-range) or "
+                     f"valid_min/valid_max attributes")
+
+
+def _size(path: str) -> int:
+    """bytes of file or directory on disk"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+class _StreamWriter(object):
+    """time slot bookkeeping and report shared by stream writers"""
+    units = 'hours since 1970-01-01 00:00:00'
+
+    def __init__(self, path: str, times: list = None, time_index: str = 'time', compression: str = 'zlib',
+                 complevel: int = 5, shuffle: bool = True, least_significant_digit: int = None,
+                 pack: Union[bool, tuple, dict] = False, chunks: str = 'map', dtype: str = 'f4'):
+        if compression not in COMPRESSIONS:
+            raise NotImplementedError(f"compression {compression}, only support {COMPRESSIONS}")
+        self.path = path
+        self.time_index = time_index
+        self.compression = None if compression == 'none' or complevel == 0 else compression
+        self.complevel = complevel
+        self.shuffle = shuffle
+        self.least_significant_digit = least_significant_digit
+        self.pack = pack
+        self.chunks = chunks
+        self.dtype = dtype
+        self.ntime = None if times is None else len(times)
+        self._index = {}
+        if times is not None:
+            times = sorted(pd.to_datetime(times))
+            self._index = {np.datetime64(t, 's'): i for i, t in enumerate(times)}
+        self._times = [] if times is None else list(times)
+        self._variables, self._aux = [], []
+        self._written = set()
+        self.fields = 0
+        self.raw_bytes = 0
+        self.write_time = 0.
+        self._start = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        raise NotImplementedError
+
+    def _time_slot(self, t: np.datetime64) -> int:
+        """index of time in time dimension, append it to unlimited time dimension if not exists"""
+        key = np.datetime64(t, 's')
+        if key not in self._index:
+            if self.ntime is not None:
+                raise ValueError(f"time {t} not in planned times of {self.path}")
+            self._index[key] = len(self._index)
+            self._times.append(pd.Timestamp(t))
+        return self._index[key]
+
+    def _claim(self, name: str, t: np.datetime64, slot: int):
+        """mark time slot of variable as written, a slot written twice would silently overwrite a field"""
+        if (name, slot) in self._written:
+            raise ValueError(f"{self.time_index} {t} of {name} is already written into {self.path}, fields of "
+                             f"different inittime/fh share the same {self.time_index}")
+        self._written.add((name, slot))
+
+    def _num(self, t) -> Union[float, np.ndarray]:
+        if np.ndim(t) == 0:
+            return netCDF4.date2num(pd.Timestamp(t).to_pydatetime(), self.units)
+        return netCDF4.date2num(pd.DatetimeIndex(t).to_pydatetime(), self.units)
+
+    def _fields(self, data: Union[xr.DataArray, xr.Dataset]) -> list:
+        """split dataset into fields with time as first dimension"""
+        if isinstance(data, xr.Dataset):
+            return [f for name in data.data_vars for f in self._fields(data[name])]
+        if not isinstance(data, xr.DataArray) or 'time' not in data.dims:
+            raise NotImplementedError(f"stream writer only support DataArray with time dimension, got {type(data)}")
+        return [data.transpose('time', ...)]
+
+    def _encode(self, name: str, values: np.ndarray, attrs: dict) -> np.ndarray:
+        """pack float values into int16 by scale_factor/add_offset of variable"""
+        scale, offset = attrs['scale_factor'], attrs['add_offset']
+        packed = np.round((values - offset) / scale)
+        if np.nanmax(np.abs(packed), initial=0) > 32766:
+            logger.warning(f"values of {name} exceed packed range, clipped")
+        packed = np.clip(packed, -32766, 32766)
+        return np.where(np.isnan(packed), attrs['_FillValue'], packed).astype('i2')
+
+    def report(self) -> dict:
+        """size and time of output
+
+        Returns
+        -------
+        dict: fields, raw (uncompressed float) bytes, bytes on disk, compress ratio, seconds spent in
+            writing and total seconds since writer opened
+        """
+        size = _size(self.path)
+        return dict(fields=self.fields, raw_bytes=self.raw_bytes, bytes=size,
+                    ratio=self.raw_bytes / size if size else float('nan'),
+                    write_time=self.write_time, total_time=time.time() - self._start)
+
+
+class NetCDFStreamWriter(_StreamWriter):
+    """Write grid fields into a NetCDF4 file one by one as they arrive
+
+    The time dimension is preallocated from planned times if given, otherwise it is unlimited and grows
+    with new times. Variables and other dimensions (lat, lon, member ...) are created from the first field
+    of each variable, every following field is written into its time slot directly, so only one field is
+    held in memory regardless of the number of requests. HDF5 compresses chunks in the writing thread,
+    fields are written one by one.
+    """
+
+    def __init__(self, path: str, times: list = None, time_index: str = 'time', **kwargs):
+        """NetCDFStreamWriter
+
+        Parameters
+        ----------
+        path: str
+            output netcdf file
+        times: list
+            planned times of time dimension, default None for unlimited time dimension
+        time_index: str
+            coordinate of fields used as time dimension, 'time' (valid time) or 'inittime'
+        kwargs:
+            encoding options
+            compression (str): zlib (default), zstd, blosc_lz4, blosc_zstd (need filter plugins of netcdf-c), none
+            complevel (int): compress level, 0 to disable compression
+            shuffle (bool): HDF5 shuffle filter, default True
+            least_significant_digit (int): quantize values to keep this number of decimal digits
+            pack (bool, tuple, dict): pack values into int16 with scale_factor/add_offset, True to take the
+                range from valid_range or valid_min/valid_max attributes, (min, max) for all variables or a dict
+                of (min, max) by variable names, see `pack_range`
+            chunks (str): map or series, see `chunk_shape`
+            dtype (str): data type of variables and lat/lon
+        """
+        super().__init__(path, times, time_index, **kwargs)
+        self.nc = netCDF4.Dataset(path, 'w', format='NETCDF4')
+        self.nc.createDimension('time', self.ntime)
+        self.nc.createVariable('time', 'f8', ('time',))
+        self.nc['time'].setncatts({'units': self.units, 'calendar': 'standard'})
+        if self._times:
+            self.nc['time'][:] = self._num(self._times)
+
+    def close(self):
+        if self.nc.isopen():
+            self.nc.close()
+            logger.debug(f"write {self.fields} fields into {self.path}")
+
+    def _time_slot(self, t: np.datetime64) -> int:
+        slot = super()._time_slot(t)
+        if self.ntime is None and slot == len(self.nc.dimensions['time']):
+            self.nc['time'][slot] = self._num(t)
+        return slot
+
+    def _create_dim(self, data: xr.DataArray, dim: str):
+        if dim in self.nc.dimensions:
+            if len(self.nc.dimensions[dim]) != data.sizes[dim]:
+                raise ValueError(f"size of dimension {dim} of {data.name} differs from {self.path}")
+            return
+        self.nc.createDimension(dim, data.sizes[dim])
+        if dim in data.coords:
+            values = data[dim].values
+            dtype = self.dtype if dim in ('lat', 'lon') else values.dtype
+            if np.issubdtype(values.dtype, np.datetime64):
+                values, dtype = self._num(values), 'f8'
+            var = self.nc.createVariable(dim, dtype, (dim,), compression=self.compression,
+                                         complevel=max(self.complevel, 1))
+            var[:] = values
+
+    def _create_var(self, name: str, data: xr.DataArray):
+        for dim in data.dims[1:]:
+            self._create_dim(data, dim)
+        chunks = chunk_shape(data.dims, data.shape[1:], self.ntime, self.chunks)
+        dtype = 'i2' if self.pack else self.dtype
+        var = self.nc.createVariable(name, dtype, data.dims, compression=self.compression,
+                                     complevel=max(self.complevel, 1), shuffle=self.shuffle, chunksizes=chunks,
+                                     least_significant_digit=None if self.pack else self.least_significant_digit,
+                                     fill_value=netCDF4.default_fillvals[np.dtype(dtype).str[1:]])
+        var.setncatts({k: v for k, v in data.attrs.items() if isinstance(v, (str, int, float))})
+        if self.pack:
+            var.scale_factor, var.add_offset = pack_params(*pack_range(name, data.attrs, self.pack))
+            var.set_auto_maskandscale(False)
+        if chunks[0] > 1:
+            # chunks of time series are filled slot by slot, keep a whole row of chunks in cache
+            nbytes = chunks[0] * int(np.prod(data.shape[1:])) * np.dtype(dtype).itemsize
+            var.set_var_chunk_cache(size=min(nbytes, 2 ** 30))
+        self._variables.append(name)
+        if self._aux:
+            var.coordinates = ' '.join(self._aux)
+
+    def _write_aux(self, data: xr.DataArray, slot: int):
+        """write time dependent coordinates (e.g. inittime) at time slot"""
+        for name, coord in data.coords.items():
+            if coord.dims != ('time',) or name == self.time_index:
+                continue
+            name = 'leadtime' if name == 'time' else name
+            if name not in self.nc.variables:
+                self.nc.createVariable(name, 'f8', ('time',), fill_value=np.nan)
+                self.nc[name].setncatts({'units': self.units, 'calendar': 'standard'})
+                self._aux.append(name)
+                for v in self._variables:
+                    self.nc[v].coordinates = ' '.join(self._aux)
+            self.nc[name][slot] = self._num(coord.values[0])
+
+    def write(self, data: Union[xr.DataArray, xr.Dataset]):
+        """write a field (or variables of a dataset) with a time dimension into its time slot"""
+        start = time.time()
+        for data in self._fields(data):
+            if data.name not in self.nc.variables:
+                self._create_var(data.name, data)
+            var = self.nc[data.name]
+            if var.dimensions != data.dims:
+                raise ValueError(f"dimensions {data.dims} of {data.name} differ from {var.dimensions} in {self.path}")
+            index = data[self.time_index].values
+            values = data.values
+            for k in range(data.sizes['time']):
+                slot = self._time_slot(index[k])
+                self._claim(data.name, index[k], slot)
+                if self.pack:
+                    var[slot] = self._encode(data.name, values[k], {a: var.getncattr(a) for a in var.ncattrs()})
+                else:
+                    var[slot] = np.ma.masked_invalid(values[k])
+                self._write_aux(data.isel(time=[k]), slot)
+            self.fields += 1
+            self.raw_bytes += values.size * np.dtype(self.dtype).itemsize
+        self.write_time += time.time() - start
+
+
+class ZarrStreamWriter(_StreamWriter):
+    """Write grid fields into a Zarr store one by one as they arrive
+
+    Arrays are preallocated with planned times (or grown by doubling for unknown times and trimmed on
+    close), each field is encoded and compressed by a thread pool. Fields of different variables are
+    compressed in parallel, fields of the same variable are serialized because they may share chunks.
+    With `chunks='series'` fields are buffered until a row of time chunks is complete (or the writer is
+    closed) and written at once, instead of recompressing the chunks for every field.
+    Store layout follows xarray conventions, read it back by `xr.open_zarr`.
+    """
+
+    def __init__(self, path: str, times: list = None, time_index: str = 'time', threads: int = 4, **kwargs):
+        """ZarrStreamWriter
+
+        Parameters
+        ----------
+        path: str
+            output zarr directory
+        times: list
+            planned times of time dimension, default None for unknown times
+        time_index: str
+            coordinate of fields used as time dimension, 'time' (valid time) or 'inittime'
+        threads: int
+            threads to encode and compress fields
+        kwargs:
+            encoding options same as NetCDFStreamWriter, compression blosc_zstd/blosc_lz4/zstd/zlib/none
+        """
+        if zarr is None:
+            raise ImportError("zarr output requires zarr, install it by `pip install \"zarr<3\"`")
+        super().__init__(path, times, time_index, **kwargs)
+        self.root = zarr.open_group(path, mode='w')
+        self.capacity = self.ntime or 64
+        self._create_array('time', (self.capacity,), 'f8', ('time',), (self.capacity,), compressor=None,
+                           attrs={'units': self.units, 'calendar': 'standard'})
+        if self._times:
+            self.root['time'][:] = self._num(self._times)
+        self._locks = {}
+        self._buffers = {}
+        self._futures = []
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+
+    @property
+    def compressor(self):
+        if self.compression is None:
+            return None
+        if self.compression.startswith('blosc_'):
+            shuffle = numcodecs.Blosc.SHUFFLE if self.shuffle else numcodecs.Blosc.NOSHUFFLE
+            return numcodecs.Blosc(cname=self.compression[6:], clevel=self.complevel, shuffle=shuffle)
+        elif self.compression == 'zstd':
+            return numcodecs.Zstd(level=self.complevel)
+        return numcodecs.Zlib(level=self.complevel)
+
+    def _create_array(self, name: str, shape: tuple, dtype: str, dims: tuple, chunks: tuple, compressor=None,
+                      fill_value=None, filters=None, attrs: dict = None):
+        array = self.root.create_dataset(name, shape=shape, chunks=chunks, dtype=dtype, compressor=compressor,
+                                         fill_value=fill_value, filters=filters)
+        array.attrs.update({'_ARRAY_DIMENSIONS': list(dims), **(attrs or {})})
+        return array
+
+    def _create_var(self, name: str, data: xr.DataArray):
+        for dim in data.dims[1:]:
+            if dim in self.root or dim not in data.coords:
+                continue
+            values = data[dim].values
+            dtype = self.dtype if dim in ('lat', 'lon') else values.dtype
+            self._create_array(dim, values.shape, dtype, (dim,), values.shape)[:] = values
+
+        chunks = chunk_shape(data.dims, data.shape[1:], self.ntime, self.chunks)
+        attrs = {k: v for k, v in data.attrs.items() if isinstance(v, (str, int, float))}
+        filters = None
+        if self.pack:
+            dtype, fill_value = 'i2', int(netCDF4.default_fillvals['i2'])
+            attrs['scale_factor'], attrs['add_offset'] = pack_params(*pack_range(name, data.attrs, self.pack))
+            attrs['_FillValue'] = fill_value
+        else:
+            dtype, fill_value = self.dtype, float('nan')
+            if self.least_significant_digit is not None:
+                filters = [numcodecs.Quantize(digits=self.least_significant_digit, dtype=dtype)]
+        self._create_array(name, (self.capacity, *data.shape[1:]), dtype, data.dims, chunks,
+                           compressor=self.compressor, fill_value=fill_value, filters=filters, attrs=attrs)
+        self._locks[name] = threading.Lock()
+        self._variables.append(name)
+        if self._aux:
+            self.root[name].attrs['coordinates'] = ' '.join(self._aux)
+
+    def _grow(self, slot: int):
+        """double capacity of time dimension after pending writes finished"""
+        wait(self._futures)
+        while self.capacity <= slot:
+            self.capacity *= 2
+        for name in ['time', *self._aux, *self._variables]:
+            self.root[name].resize(self.capacity, *self.root[name].shape[1:])
+
+    def _time_slot(self, t: np.datetime64) -> int:
+        slot = super()._time_slot(t)
+        if slot >= self.capacity:
+            self._grow(slot)
+        if self.ntime is None:
+            self.root['time'][slot] = self._num(t)
+        return slot
+
+    def _write_aux(self, data: xr.DataArray, slot: int):
+        for name, coord in data.coords.items():
+            if coord.dims != ('time',) or name == self.time_index:
+                continue
+            name = 'leadtime' if name == 'time' else name
+            if name not in self.root:
+                self._create_array(name, (self.capacity,), 'f8', ('time',), (self.capacity,),
+                                   fill_value=float('nan'), attrs={'units': self.units, 'calendar': 'standard'})
+                self._aux.append(name)
+                for v in self._variables:
+                    self.root[v].attrs['coordinates'] = ' '.join(self._aux)
+            self.root[name][slot] = self._num(coord.values[0])
+
+    def _write_field(self, name: str, slots: list, values: np.ndarray):
+        start = time.time()
+        array = self.root[name]
+        if self.pack:
+            values = self._encode(name, values, array.attrs)
+        with self._locks[name]:
+            for slot, v in zip(slots, values):
+                array[slot] = v
+        return time.time() - start
+
+    def _write_block(self, name: str, start: int, values: np.ndarray):
+        """write consecutive time slots starting from `start`, a whole row of time chunks"""
+        begin = time.time()
+        array = self.root[name]
+        if self.pack:
+            values = self._encode(name, values, array.attrs)
+        with self._locks[name]:
+            array[start:start + len(values)] = values
+        return time.time() - begin
+
+    def _buffer(self, name: str, slots: list, values: np.ndarray):
+        """keep fields until their row of time chunks is complete, then submit it as one block"""
+        nt = self.root[name].chunks[0]
+        rows = set()
+        for slot, v in zip(slots, values):
+            self._buffers.setdefault((name, slot // nt), {})[slot] = v
+            rows.add(slot // nt)
+        for row in sorted(rows):
+            size = nt if self.ntime is None else min(nt, self.ntime - row * nt)
+            if len(self._buffers[(name, row)]) == size:
+                self._flush(name, row)
+
+    def _flush(self, name: str, row: int):
+        buffer = self._buffers.pop((name, row))
+        nt = self.root[name].chunks[0]
+        start = row * nt
+        block = np.full((min(nt, self.capacity - start), *self.root[name].shape[1:]), np.nan, dtype=self.dtype)
+        for slot, v in buffer.items():
+            block[slot - start] = v
+        self._futures.append(self._executor.submit(self._write_block, name, start, block))
+
+    def write(self, data: Union[xr.DataArray, xr.Dataset]):
+        """submit a field (or variables of a dataset) with a time dimension to be written into its time slot"""
+        for data in self._fields(data):
+            if data.name not in self.root:
+                self._create_var(data.name, data)
+            if tuple(self.root[data.name].attrs['_ARRAY_DIMENSIONS']) != data.dims:
+                raise ValueError(f"dimensions {data.dims} of {data.name} differ from {self.path}")
+            index = data[self.time_index].values
+            slots = [self._time_slot(t) for t in index]
+            for t, slot in zip(index, slots):
+                self._claim(data.name, t, slot)
+            for k, slot in enumerate(slots):
+                self._write_aux(data.isel(time=[k]), slot)
+            values = data.values.astype(self.dtype)
+            if self.root[data.name].chunks[0] > 1:
+                self._buffer(data.name, slots, values)
+            else:
+                self._futures.append(self._executor.submit(self._write_field, data.name, slots, values))
+            self.fields += 1
+            self.raw_bytes += values.nbytes
+
+    def close(self):
+        if self._executor is None:
+            return
+        for name, row in list(self._buffers):
+            self._flush(name, row)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        self.write_time = sum(f.result() for f in self._futures)
+        if self.ntime is None:
+            length = len(self._index)
+            for name in ['time', *self._aux, *self._variables]:
+                self.root[name].resize(length, *self.root[name].shape[1:])
+        zarr.consolidate_metadata(self.path)
+        logger.debug(f"write {self.fields} fields into {self.path}")
+
+
+class CSVStreamWriter(object):
+    """Append table results into a csv file one by one as they arrive, header is written once
+
+    Columns are taken from the first table, later tables are aligned to them (missing columns are empty).
+    Columns new in a later table are appended, the written file is rewritten once with empty values in them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self.columns = None
+        if os.path.exists(path):
+            os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        logger.debug(f"write {self.rows} rows into {self.path}")
+
+    def _extend(self, columns: list):
+        """append columns to header and rows already written"""
+        self.columns.extend(columns)
+        if not os.path.exists(self.path):
+            return
+        tmp = f"{self.path}.tmp{os.getpid()}"
+        with open(self.path, newline='') as src, open(tmp, 'w', newline='') as dst:
+            reader, writer = csv.reader(src), csv.writer(dst)
+            writer.writerow(next(reader) + [str(c) for c in columns])
+            for row in reader:
+                writer.writerow(row + [''] * len(columns))
+        os.replace(tmp, self.path)
+        logger.debug(f"add columns {columns} into {self.path}")
+
+    def write(self, data: Union[pd.DataFrame, xr.DataArray]):
+        if isinstance(data, xr.DataArray):
+            data = data.to_dataframe()
+        if not isinstance(data, pd.DataFrame):
+            raise NotImplementedError(f"csv stream writer only support DataFrame, got {type(data)}")
+        if self.columns is None:
+            self.columns = list(data.columns)
+        elif list(data.columns) != self.columns:
+            extra = [c for c in data.columns if c not in self.columns]
+            if extra:
+                self._extend(extra)
+            data = data.reindex(columns=self.columns)
+        data.to_csv(self.path, mode='a', header=self.rows == 0)
+        self.rows += len(data)
+
+
+def open_writer(path: str, **kwargs) -> Union[NetCDFStreamWriter, ZarrStreamWriter, CSVStreamWriter,
+                                               ArrowStreamWriter]:
+    """open stream writer by extension of output file
+
+    Parameters
+    ----------
+    path: str
+        output file, .nc/.nc4, .zarr, .csv/.txt or .parquet/.arrow
+    kwargs:
+        other parameters passed into NetCDFStreamWriter or ZarrStreamWriter, `partition` (date or station)
+        for ArrowStreamWriter
+
+    Returns
+    -------
+    (NetCDFStreamWriter, ZarrStreamWriter, CSVStreamWriter, ArrowStreamWriter): stream writer
+    """
+    _, file_extension = os.path.splitext(path.rstrip('/'))
+    partition = kwargs.pop('partition', None)
+    if file_extension in ('.nc', '.nc4'):
+        kwargs.pop('threads', None)
+        return NetCDFStreamWriter(path, **kwargs)
+    elif file_extension == '.zarr':
+        return ZarrStreamWriter(path, **kwargs)
+    elif file_extension in ('.txt', '.csv'):
+        return CSVStreamWriter(path)
+    elif file_extension in ('.parquet', '.arrow'):
+        return ArrowStreamWriter(path, format=file_extension[1:], partition=partition)
+    raise NotImplementedError("Only support nc, nc4, zarr, txt, csv, parquet, arrow extentsion.")
@@ -22,6 +22,14 @@ install_requires = [
     "netCDF4",
 ]
 
+extras_require = {
+    "regrid": ["scipy"],
+    "lazy": ["dask"],
+    "zarr": ["zarr<3", "numcodecs"],
+    "arrow": ["pyarrow"],
+    "sparse": ["sparse"],
+}
+
 classifiers = [
     "Development Status :: 4 - Beta",
     "Intended Audience :: Science/Research/Operation",
@@ -39,13 +47,17 @@ setup(
     author_email="wqshen91@163.com",
     python_requires=">=3.8",
     install_requires=install_requires,
+    extras_require=extras_require,
     packages=find_packages(),
     long_description=open('README.rst', 'r', encoding='utf8').read(),
     url='https://github.com/zjobsdev/PyDaas',
     entry_points={
         'console_scripts': [
             'daas_dump=pydaas.daas_dump:_main',
-        ]
+        ],
+        'xarray.backends': [
+            'pydaas=pydaas.backend:DaasBackendEntrypoint',
+        ],
     },
     include_package_data=True,
     zip_safe=False,